@@ -0,0 +1,185 @@
+"""
+Admission control for the heavy analysis endpoints.
+
+Every analysis holds a request thread for as long as it decodes, and with
+nothing bounding them a burst of uploads leaves no thread for anything else
+(including /health). AdmissionController limits how many analyses run at
+once per endpoint and in total, plus the total estimated cost (seconds of
+video) in flight across endpoints. Requests beyond that wait in a bounded
+FIFO queue for at most max_wait_sec; when the queue is full or the wait runs
+out they are rejected with AdmissionRejected, which carries a Retry-After
+estimate from the recent service times.
+
+A request is always admitted when nothing else is running, however large its
+estimated cost, so an oversized video is slow rather than impossible.
+"""
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Weight of the newest sample in the per-endpoint service time average.
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """The endpoint is saturated; retry after `retry_after` seconds."""
+
+    def __init__(self, endpoint, reason, retry_after):
+        super().__init__(f"{endpoint} saturated ({reason}), retry after {retry_after}s")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("endpoint", "cost")
+
+    def __init__(self, endpoint, cost):
+        self.endpoint = endpoint
+        self.cost = cost
+
+
+class AdmissionController:
+    """Per-endpoint and total concurrency limits, a shared in-flight cost budget and a bounded wait queue.
+
+    limits maps endpoint -> max concurrent analyses; endpoints not in it are
+    admitted without limit. max_active (0 = no limit) caps the analyses
+    running across all limited endpoints and max_cost (0 = no limit) the
+    summed cost. Waiters of one endpoint are served in FIFO order; a waiter
+    never holds up another endpoint.
+    """
+
+    def __init__(self, limits, max_active=0, max_cost=0.0, max_queue=0, max_wait_sec=10.0,
+                 default_retry_after=5):
+        self.limits = dict(limits)
+        self.max_active = int(max_active)
+        self.max_cost = float(max_cost)
+        self.max_queue = int(max_queue)
+        self.max_wait_sec = float(max_wait_sec)
+        self.default_retry_after = int(default_retry_after)
+        self._cond = threading.Condition()
+        self._active = Counter()
+        self._active_cost = 0.0
+        self._queue = deque()
+        self._service_sec = {}
+        self._admitted = Counter()
+        self._rejected = Counter()
+
+    @contextmanager
+    def admit(self, endpoint, cost=1.0):
+        """Block until the analysis may run (or raise AdmissionRejected); yields the seconds spent waiting."""
+        waited = self._acquire(endpoint, cost)
+        start = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._release(endpoint, cost, time.monotonic() - start)
+
+    @contextmanager
+    def try_admit(self, endpoint, cost=1.0):
+        """Admit the analysis only if it can start right away; yields whether it did.
+
+        Never waits, never overtakes a queued request of the same endpoint and
+        isn't counted as a rejection when it can't start.
+        """
+        started = self._try_start(endpoint, cost)
+        start = time.monotonic()
+        try:
+            yield started
+        finally:
+            if started:
+                self._release(endpoint, cost, time.monotonic() - start)
+
+    def _try_start(self, endpoint, cost):
+        if endpoint not in self.limits:
+            return True
+        with self._cond:
+            if self._first_waiter(endpoint) is None and self._can_run(endpoint, cost):
+                self._start(endpoint, cost)
+                return True
+            return False
+
+    def _can_run(self, endpoint, cost):
+        if self._active[endpoint] >= self.limits[endpoint]:
+            return False
+        if self.max_active and sum(self._active.values()) >= self.max_active:
+            return False
+        return not self.max_cost or not self._active_cost or self._active_cost + cost <= self.max_cost
+
+    def _first_waiter(self, endpoint):
+        for waiter in self._queue:
+            if waiter.endpoint == endpoint:
+                return waiter
+        return None
+
+    def _acquire(self, endpoint, cost):
+        if endpoint not in self.limits:
+            return 0.0
+        with self._cond:
+            if self._first_waiter(endpoint) is None and self._can_run(endpoint, cost):
+                self._start(endpoint, cost)
+                return 0.0
+            if len(self._queue) >= self.max_queue:
+                self._reject(endpoint, "queue_full")
+            waiter = _Waiter(endpoint, cost)
+            self._queue.append(waiter)
+            start = time.monotonic()
+            deadline = start + self.max_wait_sec
+            try:
+                while not (self._first_waiter(endpoint) is waiter and self._can_run(endpoint, cost)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(endpoint, "timeout")
+                    self._cond.wait(remaining)
+            finally:
+                self._queue.remove(waiter)
+                # The next waiter of this endpoint may be runnable now.
+                self._cond.notify_all()
+            self._start(endpoint, cost)
+            return time.monotonic() - start
+
+    def _start(self, endpoint, cost):
+        self._active[endpoint] += 1
+        self._active_cost += cost
+        self._admitted[endpoint] += 1
+
+    def _reject(self, endpoint, reason):
+        self._rejected[(endpoint, reason)] += 1
+        raise AdmissionRejected(endpoint, reason, self._retry_after(endpoint))
+
+    def _release(self, endpoint, cost, service_sec):
+        if endpoint not in self.limits:
+            return
+        with self._cond:
+            self._active[endpoint] -= 1
+            self._active_cost = max(0.0, self._active_cost - cost)
+            prev = self._service_sec.get(endpoint)
+            self._service_sec[endpoint] = service_sec if prev is None else (
+                prev + SERVICE_TIME_ALPHA * (service_sec - prev))
+            self._cond.notify_all()
+
+    def _retry_after(self, endpoint):
+        """Seconds until the queue ahead of a new request would likely have drained."""
+        service = self._service_sec.get(endpoint)
+        if service is None:
+            return self.default_retry_after
+        queued = sum(1 for w in self._queue if w.endpoint == endpoint)
+        return max(1, int(math.ceil(service * (queued + 1) / self.limits[endpoint])))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limits": dict(self.limits),
+                "max_active": self.max_active,
+                "active": {e: self._active[e] for e in self.limits},
+                "active_cost": round(self._active_cost, 1),
+                "max_cost": self.max_cost,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "max_wait_sec": self.max_wait_sec,
+                "mean_service_sec": {e: round(s, 3) for e, s in self._service_sec.items()},
+                "admitted": dict(self._admitted),
+                "rejected": {f"{e}:{r}": n for (e, r), n in self._rejected.items()},
+            }
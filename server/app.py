@@ -1,20 +1,55 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import cv2
 import os
 import numpy as np
-from datetime import datetime
 import requests
 import base64
+import hashlib
 import json
-import tempfile
+import queue
+import threading
+import time
 import traceback
-import tensorflow as tf
-from PIL import Image
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from admission import AdmissionController, AdmissionRejected
+from camera_sessions import CameraSessionStore
+import frame_sampler
+from frame_sampler import (FrameTransform, KeyframeSampler, fast_scan_report, interval_for_fps, make_sampler,
+                           parse_roi, sample_weights)
+from inference_backends import make_backend
+from inference_scheduler import InferenceScheduler
+from job_queue import JobQueue, JobQueueFull
+import metrics
+import mp4_probe
+from model_manager import ModelManager
+from motion_pool import FrameDiffer, MotionGate
+from motion_stats import MotionSummary, RunningStats
+from motion_stream import MotionStreamStore, StreamLimitReached
+from pipeline import Pipeline
+from preprocessing import Preprocessor
+from result_cache import ResultCache, hash_stream, make_key
+from video_ingest import SPILL_DIR, IngestRequest, detach_upload, upload_path
 
 app = Flask(__name__)
+# Uploads are parsed straight into memfd/unnamed temp files (see video_ingest.py)
+app.request_class = IngestRequest
 CORS(app)
 
+# ------------------ WORKER STARTUP ------------------
+# With APP_PRELOAD=1 (set by gunicorn.conf.py when preload_app is on) this
+# module is imported once in the gunicorn master and the workers are forked
+# from it, sharing the imported code and data copy-on-write. Threads and the
+# TF/OpenCV runtimes don't survive a fork, so import must not start any:
+# loading the model and re-queueing jobs are left to init_worker(), which
+# gunicorn.conf.py calls in every worker after the fork.
+APP_PRELOAD = os.environ.get("APP_PRELOAD", "0") == "1"
+# OpenCV worker threads per process (0 = OpenCV's default).
+OPENCV_THREADS = int(os.environ.get("OPENCV_THREADS", "0"))
+
 # ------------------ POSITION CLASSIFIER MODEL SETUP ------------------
 # Paths (relative to server/)
 BASE_DIR = os.path.dirname(__file__)
@@ -22,144 +57,413 @@ MODEL_DIR = os.path.join(BASE_DIR, "models", "saved_model_export")
 CLASSES_PATH = os.path.join(BASE_DIR, "models", "classes.json")
 CFG_PATH = os.path.join(BASE_DIR, "models", "preprocess_config.json")
 
-# Load model and metadata at import time
-tf_model = None
-serving_fn = None
-CLASSES = []
-CFG = {}
-
-# Try to load the position classifier model
-try:
-    if os.path.exists(MODEL_DIR):
-        print("Loading TF SavedModel from", MODEL_DIR)
-        tf_model = tf.saved_model.load(MODEL_DIR)
-        try:
-            serving_fn = tf_model.signatures.get("serving_default", None)
-            print("serving_default signature:", bool(serving_fn))
-        except Exception:
-            serving_fn = None
-
-    if os.path.exists(CLASSES_PATH):
-        with open(CLASSES_PATH, "r") as f:
-            CLASSES = json.load(f)
-        print(f"Loaded {len(CLASSES)} classes")
-
-    if os.path.exists(CFG_PATH):
-        with open(CFG_PATH, "r") as f:
-            CFG = json.load(f)
-        print("Loaded preprocessing config")
-        
-    if tf_model and CLASSES and CFG:
-        print("✅ Position Classifier Model loaded successfully!")
-    else:
-        print("⚠️ Position Classifier Model not fully loaded - using fallback analysis")
-        
-except Exception as e:
-    print(f"❌ Error loading Position Classifier Model: {e}")
-    print("⚠️ Will use fallback simple analysis")
+# Inference backend: "savedmodel" (TF SavedModel, default), "tflite" (a
+# model produced by convert_tflite.py, run by the TFLite interpreter) or
+# "stub" (no model; INFER_STUB_MS_PER_FRAME of simulated work per frame).
+INFER_BACKEND = os.environ.get("INFER_BACKEND", "savedmodel")
+MODEL_TFLITE_PATH = os.environ.get(
+    "MODEL_TFLITE_PATH", os.path.join(BASE_DIR, "models", "position_classifier.tflite"))
+INFER_TFLITE_THREADS = int(os.environ.get("INFER_TFLITE_THREADS", str(os.cpu_count() or 1)))
+INFER_TFLITE_XNNPACK = os.environ.get("INFER_TFLITE_XNNPACK", "1") == "1"
+# TensorFlow thread pools for the SavedModel backend (0 = one thread per core).
+INFER_TF_INTRA_THREADS = int(os.environ.get("INFER_TF_INTRA_THREADS", "0"))
+INFER_TF_INTER_THREADS = int(os.environ.get("INFER_TF_INTER_THREADS", "0"))
+INFER_STUB_MS_PER_FRAME = float(os.environ.get("INFER_STUB_MS_PER_FRAME", "2"))
+
+# Frames per serving_fn call. The last partial batch is zero-padded up to this
+# size so the signature always sees the same [N, H, W, C] shape.
+INFER_BATCH_SIZE = max(1, int(os.environ.get("INFER_BATCH_SIZE", "16")))
+INFER_SCHEDULER_MAX_BATCH = max(1, int(os.environ.get("INFER_SCHEDULER_MAX_BATCH", "32")))
+
+# Optional fixed batch-size buckets, e.g. "1,4,16,32": every model call is
+# padded to the smallest bucket that fits (larger batches are split), so a
+# compiled model only ever sees these shapes. Empty keeps padding to
+# INFER_BATCH_SIZE / INFER_SCHEDULER_MAX_BATCH.
+INFER_BUCKETS = sorted(set(max(1, int(n)) for n in os.environ.get("INFER_BUCKETS", "").split(",") if n.strip()))
+# Merged scheduler batches vary in size, so without INFER_BUCKETS they are
+# padded to the smallest of these (capped at INFER_SCHEDULER_MAX_BATCH)
+# instead of always to INFER_SCHEDULER_MAX_BATCH.
+INFER_SCHEDULER_BUCKETS = INFER_BUCKETS or sorted(set(
+    min(max(1, int(n)), INFER_SCHEDULER_MAX_BATCH)
+    for n in os.environ.get("INFER_SCHEDULER_BUCKETS", "1,4,8,16,32").split(",") if n.strip()
+) | {INFER_SCHEDULER_MAX_BATCH})
+# INFER_JIT_COMPILE=1 compiles the SavedModel call with XLA (one program per
+# bucket); INFER_PRECISION=bfloat16 opts into bf16 on CPUs that support it.
+INFER_JIT_COMPILE = os.environ.get("INFER_JIT_COMPILE", "0") == "1"
+INFER_PRECISION = os.environ.get("INFER_PRECISION", "float32")
+# INFER_BUCKET_STATS=1 reports model-call latency per bucket in /health.
+INFER_BUCKET_STATS = os.environ.get("INFER_BUCKET_STATS", "0") == "1"
+
+# The backend is imported and the model loaded by MODEL (see
+# model_manager.py): in the background by default, MODEL_LOAD=lazy defers it
+# to the first request that needs it, MODEL_LOAD=eager loads at import.
+# Warm-up covers every batch size we send to the model.
+MODEL = ModelManager(
+    MODEL_DIR, CLASSES_PATH, CFG_PATH,
+    warmup_batch_sizes=[int(n) for n in os.environ.get(
+        "MODEL_WARMUP_BATCH_SIZES",
+        ",".join(map(str, INFER_BUCKETS or sorted(set([INFER_BATCH_SIZE] + INFER_SCHEDULER_BUCKETS))))).split(",") if n],
+    load_mode=os.environ.get("MODEL_LOAD", "background"),
+    backend=make_backend(INFER_BACKEND, MODEL_DIR, MODEL_TFLITE_PATH, INFER_TFLITE_THREADS,
+                         jit_compile=INFER_JIT_COMPILE, precision=INFER_PRECISION,
+                         classes_path=CLASSES_PATH,
+                         stub_ms_per_frame=INFER_STUB_MS_PER_FRAME,
+                         tf_intra_op_threads=INFER_TF_INTRA_THREADS,
+                         tf_inter_op_threads=INFER_TF_INTER_THREADS,
+                         tflite_xnnpack=INFER_TFLITE_XNNPACK),
+    latency_stats=INFER_BUCKET_STATS,
+)
+CLASSES = MODEL.classes
+CFG = MODEL.cfg
+if not MODEL.available:
+    print("⚠️ Position Classifier Model not fully loaded - using fallback analysis")
+
+# How long an admitted request waits for a model load that is still in
+# progress before it gets 503 with Retry-After: MODEL_RETRY_AFTER_SEC.
+# Async jobs run off the request thread and wait up to MODEL_JOB_WAIT_SEC.
+MODEL_WAIT_SEC = float(os.environ.get("MODEL_WAIT_SEC", "2"))
+MODEL_RETRY_AFTER_SEC = int(os.environ.get("MODEL_RETRY_AFTER_SEC", "5"))
+MODEL_JOB_WAIT_SEC = float(os.environ.get("MODEL_JOB_WAIT_SEC", "60"))
+
+class ModelLoading(Exception):
+    """The classifier is still loading; the request should be retried later."""
+
+def model_ready(timeout=None):
+    """True if the classifier can be used, waiting up to `timeout` for an in-progress load.
+
+    False if the model is unavailable or failed to load; raises ModelLoading
+    if the load is still running when the wait ends.
+    """
+    if not MODEL.available:
+        return False
+    if MODEL.ensure_loaded(timeout):
+        return True
+    if MODEL.available:
+        raise ModelLoading(MODEL.state)
+    return False
+
+def model_loading_response():
+    response = jsonify({"error": "Position classifier model is loading, try again later",
+                        "retry_after_sec": MODEL_RETRY_AFTER_SEC})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(MODEL_RETRY_AFTER_SEC)
+    return response
+
+# Built once from CFG; see preprocessing.py
+PREPROCESSOR = Preprocessor(CFG)
 
 def preprocess_frame_bgr(frame_bgr):
-    """Take a BGR cv2 frame -> return batched NHWC float32 suitable for the TF model."""
-    # Convert to RGB
-    frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-    img = Image.fromarray(frame_rgb)
-    # resize then center-crop
-    resize = CFG.get("resize", 260)
-    crop = CFG.get("crop", 260)
-    img = img.resize((resize, resize))
-    left = (resize - crop) // 2
-    top  = (resize - crop) // 2
-    img = img.crop((left, top, left+crop, top+crop))
-    arr = np.array(img).astype(np.float32)
-    if CFG.get("to_scale", True):
-        arr = arr / 255.0
-    mean = np.array(CFG.get("mean", [0.485,0.456,0.406])).reshape(1,1,3)
-    std  = np.array(CFG.get("std",  [0.229,0.224,0.225])).reshape(1,1,3)
-    arr = (arr - mean) / std
-    batched = np.expand_dims(arr, axis=0).astype(np.float32)  # [1, H, W, C]
-    return batched
+    """Take a BGR cv2 frame -> return batched NHWC float32 suitable for the TF model.
+
+    The result is a view of this thread's reusable buffer and is overwritten by
+    the next preprocessing call on the same thread.
+    """
+    return PREPROCESSOR.preprocess_batch([frame_bgr])
 
 def run_model_on_batch(batched_np):
-    """Run the saved model and return the numpy outputs (1, num_classes)."""
+    """Run the saved model and return the numpy outputs (N, num_classes)."""
     try:
-        if serving_fn is not None:
-            # find serving input key name (robust)
-            try:
-                sig_inputs = list(serving_fn.structured_input_signature[1].keys())
-                in_key = sig_inputs[0] if len(sig_inputs) else None
-                if in_key:
-                    out = serving_fn(**{in_key: tf.constant(batched_np)})
-                else:
-                    out = serving_fn(tf.constant(batched_np))
-            except Exception:
-                out = serving_fn(tf.constant(batched_np))
-            # take first returned tensor
-            out_vals = list(out.values())[0].numpy()
-        else:
-            # fallback: call model directly if possible
-            out_vals = tf_model(tf.constant(batched_np)).numpy()
-        return out_vals
+        start = time.perf_counter()
+        out = MODEL.run(batched_np)
+        metrics.observe_inference(MODEL.backend.name, len(batched_np), time.perf_counter() - start)
+        return out
     except Exception:
         traceback.print_exc()
         raise
 
-UPLOAD_FOLDER = "uploads"
+def softmax_batch(logits):
+    """Row-wise softmax over a [N, num_classes] logits array."""
+    logits = np.asarray(logits, dtype=np.float32)
+    exps = np.exp(logits - np.max(logits, axis=1, keepdims=True))
+    return exps / exps.sum(axis=1, keepdims=True)
+
+def padded_batch_size(n, batch_size, buckets=None):
+    """Rows an n-row batch is padded to: the smallest bucket that fits, else batch_size.
+
+    `buckets` defaults to INFER_BUCKETS.
+    """
+    for bucket in (INFER_BUCKETS if buckets is None else buckets):
+        if bucket >= n:
+            return bucket
+    return max(n, batch_size)
+
+def run_model_padded(batched_np, batch_size, buckets=None):
+    """Zero-pad a [n, H, W, C] batch (see padded_batch_size), run the model, return the n real outputs."""
+    buckets = INFER_BUCKETS if buckets is None else buckets
+    n = len(batched_np)
+    if buckets and n > buckets[-1]:
+        step = buckets[-1]
+        return np.concatenate([run_model_padded(batched_np[i:i + step], batch_size, buckets)
+                               for i in range(0, n, step)])
+    size = padded_batch_size(n, batch_size, buckets)
+    if n < size:
+        padded = np.zeros((size,) + batched_np.shape[1:], dtype=np.float32)
+        padded[:n] = batched_np
+        batched_np = padded
+    return run_model_on_batch(batched_np)[:n]
+
+# ------------------ CROSS-REQUEST MICRO-BATCHING ------------------
+# Concurrent requests queue their batches in one scheduler that merges them
+# into a single model call (see inference_scheduler.py). INFER_SCHEDULER=0
+# makes every request call the model directly.
+INFER_SCHEDULER_MAX_WAIT_MS = float(os.environ.get("INFER_SCHEDULER_MAX_WAIT_MS", "5"))
+INFER_SCHEDULER = None
+if os.environ.get("INFER_SCHEDULER", "1") == "1":
+    INFER_SCHEDULER = InferenceScheduler(
+        lambda merged: run_model_padded(merged, INFER_SCHEDULER_MAX_BATCH, INFER_SCHEDULER_BUCKETS),
+        max_batch_size=INFER_SCHEDULER_MAX_BATCH,
+        max_wait_ms=INFER_SCHEDULER_MAX_WAIT_MS,
+    )
+
+# Depth of the bounded queues between the decode, preprocess and infer stages.
+PIPELINE_QUEUE_SIZE = max(1, int(os.environ.get("PIPELINE_QUEUE_SIZE", "4")))
+
+# INFER_GATE=1 lets analyze_with_model skip the model for frames that changed
+# by at most INFER_GATE_THRESHOLD (changed-pixel ratio) since the last
+# classified frame, reusing its probabilities; INFER_GATE_MAX_REUSE forces a
+# fresh inference after that many reuses in a row (0 = never).
+INFER_GATE = os.environ.get("INFER_GATE", "0") == "1"
+INFER_GATE_THRESHOLD = float(os.environ.get("INFER_GATE_THRESHOLD", "0.005"))
+INFER_GATE_MAX_REUSE = int(os.environ.get("INFER_GATE_MAX_REUSE", "0"))
+
+def predict_frames(frames, batch_size=None, timings=None, gate=None):
+    """Classify an iterable of BGR frames, INFER_BATCH_SIZE frames per model call.
+
+    Decoding (iterating `frames`), preprocessing and inference run as separate
+    pipeline stages so they overlap. If `timings` is a dict it receives the
+    per-stage timing report. With a MotionGate, frames it lets through are
+    classified and every other frame gets the probabilities of the last
+    classified frame before it.
+
+    Returns a [num_frames, num_classes] float32 array of class probabilities for
+    the frames that could be processed (possibly empty).
+    """
+    batch_size = batch_size or INFER_BATCH_SIZE
+    # One entry per input frame when gating: True if it goes to the model.
+    inferred = []
+
+    def gate_stage(frames):
+        for frame in frames:
+            needed = gate.needs_inference(frame)
+            inferred.append(needed)
+            if needed:
+                yield frame
+
+    def preprocess_stage(frames):
+        batch = None
+        filled = 0
+        for frame in frames:
+            if batch is None:
+                batch = PREPROCESSOR.acquire_batch(batch_size)
+            try:
+                PREPROCESSOR.preprocess_into(frame, batch[filled])
+            except Exception as e:
+                print("frame preprocess error:", e)
+                continue
+            filled += 1
+            if filled == batch_size:
+                yield batch, filled
+                batch, filled = None, 0
+        if batch is not None:
+            if filled:
+                yield batch, filled
+            else:
+                PREPROCESSOR.release_batch(batch)
+
+    def infer_stage(batches):
+        for batch, n in batches:
+            try:
+                if INFER_SCHEDULER is not None:
+                    out_vals = INFER_SCHEDULER.run(batch[:n])  # [n, num_classes]
+                elif INFER_BUCKETS:
+                    out_vals = run_model_padded(batch[:n], batch_size)
+                else:
+                    batch[n:] = 0.0  # pad the tail of a partial batch
+                    out_vals = run_model_on_batch(batch)[:n]
+                yield softmax_batch(out_vals)
+            except Exception as e:
+                print("batch predict error:", e)
+            finally:
+                PREPROCESSOR.release_batch(batch)
+
+    stages = [("preprocess", preprocess_stage), ("infer", infer_stage)]
+    if gate is not None:
+        stages.insert(0, ("gate", gate_stage))
+    pipeline = Pipeline(frames, stages, queue_size=PIPELINE_QUEUE_SIZE)
+    session = INFER_SCHEDULER.session() if INFER_SCHEDULER is not None else nullcontext()
+    with session:
+        collected = list(pipeline)
+    if timings is not None:
+        timings.update(pipeline.timings())
+
+    if not collected:
+        return np.zeros((0, len(CLASSES)), dtype=np.float32)
+    probs = np.concatenate(collected, axis=0)
+    if gate is not None and inferred and len(probs) == sum(inferred):
+        # Row i of the result is the latest classified frame at or before frame i.
+        probs = probs[np.cumsum(inferred) - 1]
+    return probs
+
+UPLOAD_FOLDER = SPILL_DIR
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Hugging Face API configuration
 HF_API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium"
 HF_TOKEN = "hf_xxx"  # You'll need to get a free token from huggingface.co
 
-def analyze_video_simple(video_path):
+# ------------------ RESULT CACHE ------------------
+# Re-uploads of the same clip are answered from a content-addressed cache
+# (see result_cache.py). RESULT_CACHE=0 disables it; RESULT_CACHE_DIR adds
+# an on-disk tier shared by all workers on the host.
+# Bump ANALYZER_VERSION whenever an analyzer's output changes for the same input;
+# settings that change it are in analysis_settings().
+ANALYZER_VERSION = "3"
+RESULT_CACHE = None
+if os.environ.get("RESULT_CACHE", "1") == "1":
+    RESULT_CACHE = ResultCache(
+        max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        disk_dir=os.environ.get("RESULT_CACHE_DIR") or None,
+        ttl_sec=float(os.environ.get("RESULT_CACHE_TTL_SEC", str(24 * 3600))),
+    )
+
+def analysis_settings():
+    """Every setting that can change an analysis result for the same upload."""
+    return {
+        "model": [INFER_BACKEND, INFER_PRECISION, INFER_JIT_COMPILE, CLASSES, CFG],
+        "infer_gate": [INFER_GATE, INFER_GATE_THRESHOLD, INFER_GATE_MAX_REUSE],
+        "sampler": [frame_sampler.SAMPLER_ADAPTIVE, frame_sampler.SAMPLER_FRAME_BUDGET,
+                    frame_sampler.ADAPTIVE_MAX_FACTOR, frame_sampler.ADAPTIVE_CHANGE_THRESHOLD,
+                    frame_sampler.SEEK_MIN_GAP, frame_sampler.KEYFRAME_PREROLL],
+        "frames": [ANALYZE_MAX_SIDE],
+        "motion": [MOTION_TIME_BUDGET_SEC, MOTION_RESERVOIR_SIZE, MOTION_HISTOGRAM_BINS],
+    }
+
+def model_version():
+    """Fingerprint of the analyzers: ANALYZER_VERSION, analysis_settings() and the classifier files."""
+    h = hashlib.sha256(json.dumps([ANALYZER_VERSION, analysis_settings()], sort_keys=True).encode("utf-8"))
+    model_file = MODEL_TFLITE_PATH if INFER_BACKEND == "tflite" else os.path.join(MODEL_DIR, "saved_model.pb")
+    if os.path.exists(model_file):
+        st = os.stat(model_file)
+        h.update(f"{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def result_cache_key(upload, endpoint, method, roi=None, fast_scan=False):
+    """Cache key for an uploaded FileStorage, or None when caching is off."""
+    if RESULT_CACHE is None:
+        return None
+    if roi is not None:
+        method = f"{method}@roi={','.join(f'{v:g}' for v in roi)}"
+    if fast_scan:
+        method = f"{method}@fast_scan"
+    return make_key(hash_stream(upload.stream), endpoint, method, model_version())
+
+def cached_result(cache_key):
+    return RESULT_CACHE.get(cache_key) if cache_key else None
+
+def cache_result(cache_key, result):
+    """Store a successful analysis result.
+
+    A result cut short by MOTION_TIME_BUDGET_SEC isn't cached: it depends on
+    how busy the server was, and a retry may get the whole video analyzed.
+    """
+    if cache_key and result is not None and "error" not in result and not result.get("truncated"):
+        RESULT_CACHE.put(cache_key, result)
+
+def cache_hit_response(result):
+    response = jsonify(result)
+    response.headers["X-Result-Cache"] = "hit"
+    return response
+
+def report_progress(sampler, progress, indices=None):
+    """Yield the sampler's frames, calling progress(frames_done, frames_total) before each.
+
+    If `indices` is a list, the frame index of every sample is appended to it.
+    """
+    total = sampler.expected_samples()
+    for done, (idx, frame) in enumerate(sampler):
+        if progress is not None:
+            progress(done, total)
+        if indices is not None:
+            indices.append(idx)
+        yield frame
+
+def mean_probabilities(probs, sampler, indices):
+    """Per-class mean over the sampled frames, weighted by the frames each sample stands for
+    when the sampler is adaptive (unevenly spaced samples)."""
+    weights = sample_weights(sampler, indices)
+    if weights is None or len(weights) != len(probs):
+        return probs.mean(axis=0).tolist()
+    return np.average(probs, axis=0, weights=weights).tolist()
+
+# analyze_video_simple shrinks frames so their longest side is at most
+# ANALYZE_MAX_SIDE pixels (0 = full resolution) before anything else; the
+# blur kernel and movement threshold below are tuned for 640x480 and are
+# scaled with the frame.
+ANALYZE_MAX_SIDE = int(os.environ.get("ANALYZE_MAX_SIDE", "640"))
+MOVEMENT_MIN_PIXELS = 1000
+
+def analyze_video_simple(video_path, roi=None):
     """Simple video analysis using basic computer vision techniques"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         return None
     
     frame_count = 0
-    total_frames = 0
-    movement_detected = 0
     
-    # Simple motion detection
-    prev_frame = None
+    # Simple motion detection: blur + frame difference, counted by FrameDiffer
+    # (in worker processes when MOTION_PROCESSES > 0)
+    differ = None
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    # Process every 10th frame for speed (or adaptively around it, see frame_sampler.py),
+    # cropped to the region of interest and downscaled right after decoding.
+    # Where the adaptive sampler skips further it takes a pair of frames 10
+    # apart, and only those pairs are compared.
+    transform = FrameTransform(roi, max_side=ANALYZE_MAX_SIDE or None)
+    sampler = make_sampler(cap, 10, transform=transform, video_path=video_path, pair_step=10)
+    # Weight of each consecutive pair of samples, in units of the 10-frame
+    # stride: the frames since the previous counted pair (always 1 for a
+    # fixed stride), None for pairs that are not 10 frames apart
+    gaps = []
+    prev_idx = None
+    pair_end = None
+    try:
+        for idx, frame in sampler:
+            frame_count += 1
+            if prev_idx is not None:
+                if not sampler.uneven:
+                    gaps.append(1)
+                elif idx - prev_idx == 10:
+                    gaps.append((idx - pair_end) / 10 if pair_end is not None else 1)
+                    pair_end = idx
+                else:
+                    gaps.append(None)
+            prev_idx = idx
             
-        total_frames += 1
-        
-        # Process every 10th frame for speed
-        if total_frames % 10 != 0:
-            continue
+            # Convert to grayscale for motion detection
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if differ is None:
+                blur_ksize = max(3, int(round(21 * transform.scale)) | 1)
+                differ = FrameDiffer(gray.shape, blur_ksize=blur_ksize, threshold=25)
+            differ.push(gray)
             
-        frame_count += 1
-        
-        # Convert to grayscale for motion detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-        
-        if prev_frame is not None:
-            # Calculate frame difference
-            frame_delta = cv2.absdiff(prev_frame, gray)
-            thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
-            
-            # Count non-zero pixels (movement)
-            movement_pixels = np.count_nonzero(thresh)
-            if movement_pixels > 1000:  # Threshold for movement
-                movement_detected += 1
-        
-        prev_frame = gray
-        
-        # Limit analysis to first 300 frames (~10 seconds at 30fps)
-        if frame_count >= 30:
-            break
+            # Limit analysis to first 300 frames (~10 seconds at 30fps)
+            if frame_count >= 30:
+                break
+    finally:
+        cap.release()
+        movement_counts = differ.finish() if differ is not None else []
+    total_frames = sampler.frames_seen
+    metrics.observe_analysis("analyze", "simple_analysis", sampler, frame_count)
     
-    cap.release()
+    # Threshold for movement: more than 1000 changed pixels (at the source resolution)
+    min_pixels = MOVEMENT_MIN_PIXELS * transform.scale ** 2
+    movement_detected = sum(gap for pixels, gap in zip(movement_counts, gaps)
+                            if gap is not None and pixels > min_pixels)
     
     # Simple workout type detection based on movement patterns
-    movement_ratio = movement_detected / max(frame_count, 1)
+    # (sum(gaps) + 1 is the frame count for a fixed stride)
+    counted = [gap for gap in gaps if gap is not None]
+    movement_ratio = movement_detected / max(sum(counted) + 1 if counted else frame_count, 1)
     
     if movement_ratio > 0.7:
         workout_type = "high_intensity"
@@ -176,42 +480,122 @@ def analyze_video_simple(video_path):
         "estimated_reps": estimated_reps,
         "movement_score": round(movement_ratio * 100, 1),
         "frames_analyzed": frame_count,
-        "duration_sec": round(total_frames / 30, 2)
+        "duration_sec": round(total_frames / 30, 2),
+        "decode_stats": sampler.stats()
     }
 
+# ------------------ METRICS ------------------
+# Prometheus histograms for the analysis endpoints (see metrics.py), served
+# at GET /metrics. Endpoints set g.analysis_method for the request label.
+METRIC_ENDPOINTS = ("analyze", "predict_video", "detect_motion")
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request_metrics(response):
+    if request.endpoint in METRIC_ENDPOINTS:
+        cache = "hit" if response.headers.get("X-Result-Cache") == "hit" else "miss"
+        metrics.observe_request(request.endpoint, g.get("analysis_method", "none"), response.status_code,
+                                cache, time.perf_counter() - g.request_start)
+    return response
+
+def get_upload(field):
+    """request.files[field] (or None), recording the upload size and parse time."""
+    start = time.perf_counter()
+    upload = request.files.get(field)
+    if upload is not None:
+        metrics.observe_upload(request.endpoint, request.content_length or 0, time.perf_counter() - start)
+    return upload
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+# ------------------ ADMISSION CONTROL ------------------
+# The analysis in /analyze, /detect_motion and /predict_video (and the clips
+# of a batch request, see stream_batch) runs inside ADMISSION (see
+# admission.py): at most ADMISSION_<ENDPOINT>_LIMIT analyses per endpoint,
+# ADMISSION_MAX_ACTIVE in total and ADMISSION_MAX_COST_SEC seconds of video
+# in flight. Up to
+# ADMISSION_MAX_QUEUE more wait for ADMISSION_MAX_WAIT_SEC; anything beyond
+# that gets 429 with Retry-After. The defaults keep one of the default 4
+# gunicorn threads free for /health and the other light routes, which never
+# go through admission, and neither do cache hits and async job submissions.
+# The cost of an upload is its duration from the MP4 header, or else its
+# size at ADMISSION_BYTES_PER_SEC. ADMISSION=0 admits everything.
+ADMISSION_ENDPOINTS = ("analyze", "detect_motion", "predict_video")
+ADMISSION_BYTES_PER_SEC = float(os.environ.get("ADMISSION_BYTES_PER_SEC", str(512 * 1024)))
+ADMISSION = AdmissionController(
+    {endpoint: int(os.environ.get(f"ADMISSION_{endpoint.upper()}_LIMIT", "2")) for endpoint in ADMISSION_ENDPOINTS}
+    if os.environ.get("ADMISSION", "1") == "1" else {},
+    max_active=int(os.environ.get("ADMISSION_MAX_ACTIVE", "2")),
+    max_cost=float(os.environ.get("ADMISSION_MAX_COST_SEC", "600")),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "1")),
+    max_wait_sec=float(os.environ.get("ADMISSION_MAX_WAIT_SEC", "10")),
+)
+
+def upload_cost(upload):
+    """Estimated analysis cost of an upload, in seconds of video."""
+    duration = mp4_probe.duration_sec(upload.stream)
+    if duration is not None:
+        return duration
+    stream = upload.stream
+    pos = stream.tell()
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(pos)
+    return size / ADMISSION_BYTES_PER_SEC
+
+@contextmanager
+def admitted(endpoint, *uploads):
+    """Run the block once ADMISSION lets an analysis of `uploads` in; raises AdmissionRejected."""
+    with ADMISSION.admit(endpoint, sum(upload_cost(upload) for upload in uploads)) as waited:
+        metrics.observe_admission(endpoint, waited)
+        yield
+
+def busy_error(e):
+    """Response body for an AdmissionRejected, counting the rejection."""
+    metrics.count_rejection(e.endpoint, e.reason)
+    return {"error": "Server busy, try again later", "retry_after_sec": e.retry_after}
+
+def busy_response(e):
+    response = jsonify(busy_error(e))
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
 @app.route("/analyze", methods=["POST"])
 def analyze():
     try:
-        if "video" not in request.files:
+        g.analysis_method = "simple_analysis"
+        video_file = get_upload("video")
+        if video_file is None:
             return jsonify({"error": "No video uploaded"}), 400
         
-        video_file = request.files["video"]
-        
         # Validate file type
         if not video_file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
             return jsonify({"error": "Invalid video format. Please upload MP4, AVI, MOV, MKV, or WebM"}), 400
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"workout_{timestamp}_{video_file.filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        
         try:
-            video_file.save(filepath)
-        except Exception as e:
-            return jsonify({"error": f"Failed to save video: {str(e)}"}), 500
+            roi = request_roi()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Analyze video using simple computer vision
-        results = analyze_video_simple(filepath)
+        cache_key = result_cache_key(video_file, "analyze", "simple_analysis", roi)
+        results = cached_result(cache_key)
+        cache_hit = results is not None
         
         if results is None:
-            return jsonify({"error": "Failed to analyze video"}), 500
-        
-        # Clean up uploaded file
-        try:
-            os.remove(filepath)
-        except:
-            pass
+            # Analyze video using simple computer vision
+            with admitted("analyze", video_file), upload_path(video_file) as filepath:
+                results = analyze_video_simple(filepath, roi=roi)
+            
+            if results is None:
+                return jsonify({"error": "Failed to analyze video"}), 500
+            
+            cache_result(cache_key, results)
         
         # Format response
         response = {
@@ -233,11 +617,16 @@ def analyze():
             ],
             "frames_analyzed": results["frames_analyzed"],
             "workout_type": results["workout_type"],
-            "duration_sec": results["duration_sec"]
+            "duration_sec": results["duration_sec"],
+            "decode_stats": results["decode_stats"]
         }
         
+        if cache_hit:
+            return cache_hit_response(response)
         return jsonify(response)
         
+    except AdmissionRejected as e:
+        return busy_response(e)
     except Exception as e:
         print(f"Error in analyze endpoint: {str(e)}")
         return jsonify({"error": f"Failed to analyze workout: {str(e)}"}), 500
@@ -249,61 +638,86 @@ def predict_video():
     Accepts multipart/form-data with field 'file' (video).
     Returns JSON: {label, score, all_scores}
     """
-    if not tf_model or not CLASSES or not CFG:
+    g.analysis_method = "position_classifier"
+    # Only a load that can't succeed is refused here; one still in progress is
+    # waited for inside the admitted slot.
+    if not MODEL.available:
         return jsonify({"error": "Position classifier model not available"}), 503
         
-    if "file" not in request.files:
+    f = get_upload("file")
+    if f is None:
         return jsonify({"error": "no file provided"}), 400
+    try:
+        roi = request_roi()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fast_scan = wants_fast_scan()
+    cache_key = result_cache_key(f, "predict_video", "position_classifier", roi, fast_scan)
+    cached = cached_result(cache_key)
+    if cached is not None:
+        return cache_hit_response(cached)
+
+    if wants_async():
+        return submit_job("predict_video", f, cache_key, {"roi": roi, "fast_scan": fast_scan})
+
+    try:
+        with admitted("predict_video", f):
+            if not model_ready(MODEL_WAIT_SEC):
+                return jsonify({"error": "Position classifier model not available"}), 503
+            with upload_path(f) as video_path:
+                response = predict_video_file(video_path, roi=roi, fast_scan=fast_scan)
+    except AdmissionRejected as e:
+        return busy_response(e)
+    except ModelLoading:
+        return model_loading_response()
+    if "error" in response:
+        return jsonify(response), 400
+    cache_result(cache_key, response)
+    return jsonify(response)
 
-    f = request.files["file"]
-    # Save to temp file
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-    f.save(tmp.name)
-    tmp_path = tmp.name
+def predict_video_file(video_path, progress=None, roi=None, fast_scan=False, endpoint="predict_video"):
+    """Run the position classifier over a video file; returns the /predict_video response.
 
-    cap = cv2.VideoCapture(tmp_path)
+    With fast_scan every sample is decoded from the keyframe before it (see
+    frame_sampler.KeyframeSampler); the response lists the samples' timestamps.
+    Metrics are recorded under `endpoint`.
+    """
+    cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
-        os.unlink(tmp_path)
-        return jsonify({"error": "cannot open video"}), 400
+        return {"error": "cannot open video"}
 
     # sample settings (tune for speed/accuracy)
     fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
     sample_fps = 1  # sample 1 frame per second (change if needed)
-    frame_interval = max(1, int(round(fps / sample_fps)))
-
-    collected_probs = []
-    idx = 0
-    success = True
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-        if idx % frame_interval == 0:
-            try:
-                batched = preprocess_frame_bgr(frame)  # [1,H,W,C]
-                out_vals = run_model_on_batch(batched)  # [1, num_classes]
-                logits = out_vals[0]
-                exps = np.exp(logits - np.max(logits))
-                probs = exps / exps.sum()
-                collected_probs.append(probs)
-            except Exception as e:
-                print("frame predict error:", e)
-        idx += 1
+    interval = interval_for_fps(fps, sample_fps)
+    # Preprocessing resizes to the model input itself, so only crop here
+    transform = FrameTransform(roi) if roi is not None else None
+    sampler = make_sampler(cap, interval, min_interval=max(1, interval // 2), transform=transform,
+                           fast_scan=fast_scan, video_path=video_path)
 
-    cap.release()
-    os.unlink(tmp_path)
+    timings = {}
+    indices = []
+    try:
+        collected_probs = predict_frames(report_progress(sampler, progress, indices), timings=timings)
+    finally:
+        cap.release()
+    metrics.observe_analysis(endpoint, "position_classifier", sampler, len(collected_probs), timings)
 
     if len(collected_probs) == 0:
-        return jsonify({"error": "no frames processed"}), 400
+        return {"error": "no frames processed"}
 
-    mean_probs = np.mean(np.stack(collected_probs, axis=0), axis=0).tolist()
+    mean_probs = mean_probabilities(collected_probs, sampler, indices)
     top_idx = int(np.argmax(mean_probs))
     response = {
         "label": CLASSES[top_idx],
         "score": float(mean_probs[top_idx]),
-        "all_scores": mean_probs
+        "all_scores": mean_probs,
+        "decode_stats": sampler.stats(),
+        "pipeline_timing": timings
     }
-    return jsonify(response)
+    if fast_scan:
+        response["fast_scan"] = fast_scan_report(sampler)
+    return response
 
 @app.route("/detect_motion", methods=["POST"])
 def detect_motion():
@@ -314,47 +728,68 @@ def detect_motion():
     Returns JSON with motion analysis results.
     """
     try:
-        if "video" not in request.files:
+        video_file = get_upload("video")
+        if video_file is None:
             return jsonify({"error": "No video uploaded"}), 400
         
-        video_file = request.files["video"]
-        
         # Validate file type
         if not video_file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
             return jsonify({"error": "Invalid video format. Please upload MP4, AVI, MOV, MKV, or WebM"}), 400
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"cctv_{timestamp}_{video_file.filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        
         try:
-            video_file.save(filepath)
-        except Exception as e:
-            return jsonify({"error": f"Failed to save video: {str(e)}"}), 500
+            roi = request_roi()
+            camera_id = request_camera_id()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        fast_scan = wants_fast_scan()
         
-        # Try position classifier first, fallback to simple analysis
-        if tf_model and CLASSES and CFG:
-            # Use the position classifier model
-            result = analyze_with_model(filepath)
-        else:
-            # Fallback to simple motion detection
-            result = analyze_motion_simple(filepath)
+        # Whether the model will be used is decided without waiting for it to
+        # load; a load in progress is waited for inside the admitted slot.
+        use_model = MODEL.available
+        method = "position_classifier" if use_model else "improved_motion_detection"
+        g.analysis_method = method
+        if use_model:
+            camera_id = None
+        # A camera session's result depends on its earlier segments
+        cache_key = (result_cache_key(video_file, "detect_motion", method, roi, fast_scan)
+                     if camera_id is None else None)
+        cached = cached_result(cache_key)
+        if cached is not None:
+            return cache_hit_response(cached)
         
-        # Clean up uploaded file
-        try:
-            os.remove(filepath)
-        except:
-            pass
+        if wants_async():
+            return submit_job("detect_motion", video_file, cache_key,
+                              {"method": method, "roi": roi, "camera_id": camera_id, "fast_scan": fast_scan})
+        
+        # Try position classifier first, fallback to simple analysis
+        with admitted("detect_motion", video_file), upload_path(video_file) as filepath:
+            if use_model and not model_ready(MODEL_WAIT_SEC):
+                # The load failed while this request waited
+                use_model, cache_key = False, None
+                g.analysis_method = "improved_motion_detection"
+            if use_model:
+                # Use the position classifier model
+                result = analyze_with_model(filepath, roi=roi, fast_scan=fast_scan)
+            elif camera_id is not None:
+                # Next segment of a camera session
+                result = analyze_motion_segment(filepath, camera_id, roi=roi, fast_scan=fast_scan)
+            else:
+                # Fallback to simple motion detection
+                result = analyze_motion_simple(filepath, roi=roi, fast_scan=fast_scan)
         
+        cache_result(cache_key, result)
         return jsonify(result)
         
+    except AdmissionRejected as e:
+        return busy_response(e)
+    except ModelLoading:
+        return model_loading_response()
     except Exception as e:
         print(f"Error in detect_motion endpoint: {str(e)}")
         return jsonify({"error": f"Failed to analyze motion: {str(e)}"}), 500
 
-def analyze_with_model(video_path):
-    """Analyze video using the position classifier model"""
+def analyze_with_model(video_path, progress=None, roi=None, fast_scan=False, endpoint="detect_motion"):
+    """Analyze video using the position classifier model (decoding from keyframes only with fast_scan)"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         return {"error": "Cannot open video file"}
@@ -362,37 +797,27 @@ def analyze_with_model(video_path):
     # Sample settings for CCTV analysis
     fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
     sample_fps = 0.5  # Sample every 2 seconds for CCTV
-    frame_interval = max(1, int(round(fps / sample_fps)))
+    interval = interval_for_fps(fps, sample_fps)
+    transform = FrameTransform(roi) if roi is not None else None
+    sampler = make_sampler(cap, interval, min_interval=max(1, interval // 2), transform=transform,
+                           fast_scan=fast_scan, video_path=video_path)
     
-    collected_probs = []
-    frame_count = 0
-    idx = 0
-    
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-            
-        if idx % frame_interval == 0:
-            try:
-                batched = preprocess_frame_bgr(frame)
-                out_vals = run_model_on_batch(batched)
-                logits = out_vals[0]
-                exps = np.exp(logits - np.max(logits))
-                probs = exps / exps.sum()
-                collected_probs.append(probs)
-                frame_count += 1
-            except Exception as e:
-                print("Frame prediction error:", e)
-        idx += 1
-    
-    cap.release()
+    timings = {}
+    indices = []
+    gate = MotionGate(INFER_GATE_THRESHOLD, INFER_GATE_MAX_REUSE) if INFER_GATE else None
+    try:
+        collected_probs = predict_frames(report_progress(sampler, progress, indices), timings=timings,
+                                         gate=gate)
+    finally:
+        cap.release()
+    frame_count = len(collected_probs)
+    metrics.observe_analysis(endpoint, "position_classifier", sampler, frame_count, timings)
     
-    if len(collected_probs) == 0:
+    if frame_count == 0:
         return {"error": "No frames processed"}
     
     # Calculate average probabilities
-    mean_probs = np.mean(np.stack(collected_probs, axis=0), axis=0).tolist()
+    mean_probs = mean_probabilities(collected_probs, sampler, indices)
     top_idx = int(np.argmax(mean_probs))
     
     # Create detailed response
@@ -404,84 +829,32 @@ def analyze_with_model(video_path):
         },
         "analysis_method": "position_classifier",
         "frames_analyzed": frame_count,
-        "duration_sec": round(idx / fps, 2)
+        "duration_sec": round(sampler.frames_seen / fps, 2),
+        "decode_stats": sampler.stats(),
+        "pipeline_timing": timings
     }
+    if gate is not None:
+        response["inference_gate"] = gate.stats()
+    if fast_scan:
+        response["fast_scan"] = fast_scan_report(sampler)
     
     return response
 
-def analyze_motion_simple(video_path):
-    """Improved fallback simple motion analysis for CCTV"""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return {"error": "Cannot open video file"}
-    
-    frame_count = 0
-    total_frames = 0
-    movement_scores = []
-    prev_frame = None
-    
-    # Get video properties
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    total_video_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    print(f"Video FPS: {fps}, Total frames: {total_video_frames}")
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        total_frames += 1
-        
-        # Process every 3rd frame for better analysis
-        if total_frames % 3 != 0:
-            continue
-            
-        frame_count += 1
-        
-        # Convert to grayscale and resize for faster processing
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.resize(gray, (320, 240))  # Resize for faster processing
-        gray = cv2.GaussianBlur(gray, (15, 15), 0)
-        
-        if prev_frame is not None:
-            # Calculate frame difference
-            frame_delta = cv2.absdiff(prev_frame, gray)
-            
-            # Use adaptive threshold for better motion detection
-            thresh = cv2.threshold(frame_delta, 20, 255, cv2.THRESH_BINARY)[1]
-            
-            # Count non-zero pixels (movement)
-            movement_pixels = np.count_nonzero(thresh)
-            total_pixels = thresh.shape[0] * thresh.shape[1]
-            movement_ratio = movement_pixels / total_pixels
-            
-            movement_scores.append(movement_ratio)
-            
-            print(f"Frame {frame_count}: Movement ratio: {movement_ratio:.4f}")
-        
-        prev_frame = gray
-        
-        # Limit analysis to first 10 seconds or 100 frames
-        if frame_count >= 100 or total_frames >= fps * 10:
-            break
-    
-    cap.release()
-    
-    if len(movement_scores) == 0:
-        return {"error": "No frames could be processed"}
-    
-    # Calculate statistics
-    avg_movement = np.mean(movement_scores)
-    max_movement = np.max(movement_scores)
-    min_movement = np.min(movement_scores)
-    movement_variance = np.var(movement_scores)
-    
-    print(f"Movement stats - Avg: {avg_movement:.4f}, Max: {max_movement:.4f}, Min: {min_movement:.4f}, Var: {movement_variance:.4f}")
-    
-    # Improved activity detection logic based on movement patterns
-    print(f"Movement analysis: avg={avg_movement:.4f}, variance={movement_variance:.6f}, max={max_movement:.4f}")
-    
+# analyze_motion_simple covers the whole video unless it runs out of
+# MOTION_TIME_BUDGET_SEC (wall clock; 0 = no limit). Besides mean/variance/
+# min/max it can report percentiles from a MOTION_RESERVOIR_SIZE sample and a
+# MOTION_HISTOGRAM_BINS-bin histogram of the movement ratios (0 disables).
+MOTION_TIME_BUDGET_SEC = float(os.environ.get("MOTION_TIME_BUDGET_SEC", "60"))
+MOTION_RESERVOIR_SIZE = int(os.environ.get("MOTION_RESERVOIR_SIZE", "1024"))
+MOTION_HISTOGRAM_BINS = int(os.environ.get("MOTION_HISTOGRAM_BINS", "0"))
+
+def classify_motion(avg_movement, max_movement, min_movement, movement_variance):
+    """Activity guess from motion statistics (per-frame changed-pixel ratios).
+
+    Returns the activity fields of a motion response: detected_activity,
+    confidence, all_activities, movement_score, movement_stats and
+    detection_reason.
+    """
     # More sophisticated detection logic with laptop use consideration
     # Check for laptop use pattern (low movement with occasional small bursts)
     is_laptop_use = (avg_movement < 0.015 and 
@@ -553,15 +926,12 @@ def analyze_motion_simple(video_path):
     total_score = sum(base_scores)
     normalized_scores = [score / total_score for score in base_scores]
     
-    response = {
+    return {
         "detected_activity": detected_activity,
         "confidence": confidence,
         "all_activities": {
             activities[i]: normalized_scores[i] for i in range(len(activities))
         },
-        "analysis_method": "improved_motion_detection",
-        "frames_analyzed": frame_count,
-        "duration_sec": round(total_frames / fps, 2),
         "movement_score": round(avg_movement * 100, 1),
         "movement_stats": {
             "average": round(avg_movement, 4),
@@ -575,9 +945,585 @@ def analyze_motion_simple(video_path):
             "variance_level": "low" if movement_variance < 0.0002 else "moderate" if movement_variance < 0.0008 else "high"
         }
     }
+
+# ------------------ CAMERA SESSIONS ------------------
+# /detect_motion with a camera_id (form field or query parameter) continues
+# that camera's session (see camera_sessions.py) on the motion-detection
+# path: the segment is compared against the previous segment's last frame,
+# optionally fed to a persistent MOG2 background model (CAMERA_SESSION_MOG2=1),
+# and added to the camera's running statistics. Such results depend on the
+# earlier segments, so they bypass the result cache. The classifier path
+# ignores camera_id.
+CAMERA_ID_MAX_LENGTH = 128
+CAMERA_SESSIONS = CameraSessionStore(
+    max_sessions=int(os.environ.get("CAMERA_SESSIONS_MAX", "256")),
+    ttl_sec=float(os.environ.get("CAMERA_SESSION_TTL_SEC", "600")),
+    max_bytes=int(os.environ.get("CAMERA_SESSIONS_MAX_BYTES", str(64 * 1024 * 1024))),
+    frame_size=(320, 240),
+    background_model=os.environ.get("CAMERA_SESSION_MOG2", "0") == "1",
+)
+
+def request_camera_id():
+    """camera_id form field or query parameter, or None; raises ValueError if malformed."""
+    camera_id = request.form.get("camera_id") or request.args.get("camera_id")
+    if camera_id is not None and len(camera_id) > CAMERA_ID_MAX_LENGTH:
+        raise ValueError(f"camera_id longer than {CAMERA_ID_MAX_LENGTH} characters")
+    return camera_id or None
+
+def analyze_motion_segment(video_path, camera_id, progress=None, roi=None, fast_scan=False,
+                           endpoint="detect_motion"):
+    """analyze_motion_simple as the next segment of camera_id's session."""
+    with CAMERA_SESSIONS.checkout(camera_id) as session:
+        return analyze_motion_simple(video_path, progress=progress, roi=roi, session=session,
+                                     fast_scan=fast_scan, endpoint=endpoint)
+
+def analyze_motion_simple(video_path, progress=None, roi=None, session=None, fast_scan=False,
+                          endpoint="detect_motion"):
+    """Improved fallback simple motion analysis for CCTV
+
+    With a CameraSession (held locked by the caller) the video is analyzed as
+    the continuation of the camera's previous segments. With fast_scan only a
+    pair of frames 3 apart is compared after every keyframe.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return {"error": "Cannot open video file"}
+    
+    frame_count = 0
+    
+    # Get video properties
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_video_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    
+    print(f"Video FPS: {fps}, Total frames: {total_video_frames}")
+    
+    # Per-frame movement ratios go straight into constant-memory statistics
+    # (see motion_stats.py), so the whole video can be analyzed
+    total_pixels = 320 * 240
+    summary = MotionSummary(reservoir_size=MOTION_RESERVOIR_SIZE, histogram_bins=MOTION_HISTOGRAM_BINS)
+    
+    # Weight of each frame pair, in units of the 3-frame stride: always 1
+    # unless the sampler is adaptive, where only pairs 3 frames apart are
+    # counted, each standing for the frames since the previous counted pair;
+    # None for pairs that are not counted
+    pair_weights = deque()
+    
+    def record(movement_counts):
+        for movement_pixels in movement_counts:
+            ratio, weight = movement_pixels / total_pixels, pair_weights.popleft()
+            if weight is None:
+                continue
+            summary.push(ratio, weight)
+            if session is not None:
+                session.stats.push(ratio, weight)
+    
+    # Blur + frame difference + threshold, counted by FrameDiffer
+    # (in worker processes when MOTION_PROCESSES > 0)
+    differ = FrameDiffer((240, 320), blur_ksize=15, threshold=20, sink=record)
+    
+    # Process every 3rd frame for better analysis (or adaptively around it),
+    # cropped to the region of interest and resized to 320x240 right after
+    # decoding, so the color conversion only sees the small frame. Wherever
+    # the adaptive sampler skips further, and after every keyframe in a fast
+    # scan, it takes a pair of frames 3 apart instead and only the pairs are
+    # compared, so the thresholds keep their meaning.
+    sampler = make_sampler(cap, 3, transform=FrameTransform(roi, size=(320, 240)),
+                           fast_scan=fast_scan, video_path=video_path, pair_step=3)
+    pairs = isinstance(sampler, KeyframeSampler)
+    
+    # A camera session starts from the previous segment's last frame, so the
+    # first pair spans the boundary between the segments
+    continued = session is not None and session.begin_segment(roi)
+    if continued and not pairs:
+        differ.push(session.last_gray)
+    background = session.background if session is not None else None
+    foreground = RunningStats()
+    gray = None
+    
+    expected = sampler.expected_samples()
+    deadline = time.perf_counter() + MOTION_TIME_BUDGET_SEC if MOTION_TIME_BUDGET_SEC > 0 else None
+    truncated = False
+    prev_idx = None
+    pair_end = None
+    try:
+        for idx, frame in sampler:
+            frame_count += 1
+            if pairs:
+                # Every second sample ends a pair; the gap before it is skipped
+                if frame_count % 2 == 0:
+                    pair_weights.append(1)
+                elif prev_idx is not None:
+                    pair_weights.append(None)
+            elif prev_idx is not None:
+                if not sampler.uneven:
+                    pair_weights.append(1)
+                elif idx - prev_idx == 3:
+                    pair_weights.append((idx - pair_end) / 3 if pair_end is not None else 1)
+                    pair_end = idx
+                else:
+                    pair_weights.append(None)
+            elif continued:
+                pair_weights.append(1)
+            prev_idx = idx
+            if progress is not None:
+                progress(frame_count, expected)
+            
+            # Convert to grayscale
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            differ.push(gray)
+            if background is not None:
+                foreground_ratio = cv2.countNonZero(background.apply(gray)) / total_pixels
+                foreground.push(foreground_ratio)
+                session.foreground.push(foreground_ratio)
+            
+            # Stop when the time budget is spent; the rest of the video is skipped
+            if deadline is not None and time.perf_counter() >= deadline:
+                truncated = True
+                break
+    finally:
+        cap.release()
+        differ.finish()
+        if session is not None and gray is not None:
+            session.last_gray = gray
+            session.frames += frame_count
+    total_frames = sampler.frames_seen
+    metrics.observe_analysis(endpoint, "improved_motion_detection", sampler, frame_count)
+    
+    stats = summary.stats
+    if stats.count == 0:
+        return {"error": "No frames could be processed"}
+    
+    # Calculate statistics
+    avg_movement = stats.mean
+    max_movement = stats.max
+    min_movement = stats.min
+    movement_variance = stats.variance
+    
+    print(f"Movement stats - Avg: {avg_movement:.4f}, Max: {max_movement:.4f}, Min: {min_movement:.4f}, Var: {movement_variance:.4f}")
+    
+    # Improved activity detection logic based on movement patterns
+    print(f"Movement analysis: avg={avg_movement:.4f}, variance={movement_variance:.6f}, max={max_movement:.4f}")
+    
+    response = classify_motion(avg_movement, max_movement, min_movement, movement_variance)
+    response["movement_stats"].update(summary.extra())
+    response.update({
+        "analysis_method": "improved_motion_detection",
+        "frames_analyzed": frame_count,
+        "duration_sec": round(total_frames / fps, 2),
+        "decode_stats": sampler.stats(),
+        "truncated": truncated,
+    })
+    if fast_scan:
+        response["fast_scan"] = fast_scan_report(sampler)
+    if background is not None:
+        response["foreground_stats"] = foreground.as_dict()
+    if session is not None:
+        response["camera_session"] = camera_session_summary(session, continued)
     
     return response
 
+def camera_session_summary(session, continued):
+    """Session counters plus the activity over all of the camera's segments so far."""
+    summary = session.info()
+    summary["continued"] = continued
+    stats = session.stats
+    if stats.count:
+        summary.update(classify_motion(stats.mean, stats.max, stats.min, stats.variance))
+    if session.background is not None:
+        summary["foreground_stats"] = session.foreground.as_dict()
+    return summary
+
+# ------------------ BATCH ENDPOINTS ------------------
+# POST /detect_motion_batch and /predict_video_batch take many clips in one
+# multipart request (repeated `videos` / `files` fields). Up to
+# BATCH_WORKERS clips are decoded and analyzed at once; each opens its own
+# session on the inference scheduler, so sampled frames from all of them are
+# merged into shared model batches. Results are streamed back as NDJSON, one
+# line per clip in the order they finish:
+#   {"index": i, "filename": ..., "result": {...}}   (the single-file response)
+# followed by a final {"done": true, "files": n, "errors": k} line.
+# A batch is admitted once, under the single-file endpoint's limits, before
+# streaming starts (429 if rejected), and that slot analyzes its clips one
+# after another. Up to BATCH_WORKERS - 1 more clips run alongside, each in a
+# slot of its own that is only taken when ADMISSION has one free right away,
+# so a batch never runs more analyses than the limits allow and never queues
+# behind (or rejects) its own clips.
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", "64"))
+BATCH_WORKERS = max(1, int(os.environ.get("BATCH_WORKERS", "4")))
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+def batch_uploads(*fields):
+    """All uploads under any of `fields`, recording the request size and parse time.
+
+    The uploads are detached from the request (see video_ingest.detach_upload),
+    since the streamed response body runs after Flask has closed the request;
+    callers own them from then on and must close_uploads() them on any
+    return that doesn't hand them to stream_batch.
+    """
+    start = time.perf_counter()
+    uploads = []
+    try:
+        for field in fields:
+            uploads.extend(detach_upload(f) for f in request.files.getlist(field) if f and f.filename)
+    except Exception:
+        close_uploads(uploads)
+        raise
+    if uploads:
+        metrics.observe_upload(request.endpoint, request.content_length or 0, time.perf_counter() - start)
+    return uploads
+
+def close_uploads(uploads):
+    for upload in uploads:
+        upload.close()
+
+def stream_batch(endpoint, method, uploads, analyze_file, admit_as, needs_model=False):
+    """NDJSON response analyzing every upload with analyze_file(upload) -> (result, cache_hit).
+
+    The batch holds one ADMISSION slot of `admit_as` (costing its largest
+    upload) until the response is closed, and runs more uploads at once only
+    in slots ADMISSION has free (see above). With needs_model, a model load
+    still in progress is waited for inside the batch's slot (503 if it
+    doesn't finish in time).
+    """
+    costs = [upload_cost(upload) for upload in uploads]
+    admission = ExitStack()
+    try:
+        metrics.observe_admission(admit_as, admission.enter_context(ADMISSION.admit(admit_as, max(costs))))
+        if needs_model and not model_ready(MODEL_WAIT_SEC):
+            admission.close()
+            close_uploads(uploads)
+            return jsonify({"error": "Position classifier model not available"}), 503
+    except AdmissionRejected as e:
+        close_uploads(uploads)
+        return busy_response(e)
+    except ModelLoading:
+        admission.close()
+        close_uploads(uploads)
+        return model_loading_response()
+
+    def one(index, upload):
+        try:
+            if not upload.filename.lower().endswith(VIDEO_EXTENSIONS):
+                result, cache = {"error": "Invalid video format"}, "miss"
+            else:
+                result, cache_hit = analyze_file(upload)
+                cache = "hit" if cache_hit else "miss"
+        except Exception as e:
+            traceback.print_exc()
+            result, cache = {"error": f"Failed to analyze video: {str(e)}"}, "miss"
+        return {"index": index, "filename": upload.filename, "cache": cache, "result": result}
+
+    pending = deque(enumerate(uploads))
+    pending_lock = threading.Lock()
+    lines = queue.Queue()
+    stop = threading.Event()
+
+    def run_in_batch_slot():
+        while not stop.is_set():
+            with pending_lock:
+                if not pending:
+                    return
+                item = pending.popleft()
+            lines.put(one(*item))
+
+    def run_in_free_slots():
+        while not stop.is_set():
+            slot = ExitStack()
+            with pending_lock:
+                if not pending:
+                    return
+                # Taking the clip and its slot together leaves nothing behind
+                # for the batch's own slot to miss
+                if not slot.enter_context(ADMISSION.try_admit(admit_as, costs[pending[0][0]])):
+                    slot.close()
+                    return
+                item = pending.popleft()
+            with slot:
+                lines.put(one(*item))
+
+    def generate():
+        start = time.perf_counter()
+        errors = 0
+        workers = min(BATCH_WORKERS, len(uploads))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        pool.submit(run_in_batch_slot)
+        for _ in range(workers - 1):
+            pool.submit(run_in_free_slots)
+        try:
+            for _ in uploads:
+                line = lines.get()
+                errors += "error" in line["result"]
+                yield json.dumps(line) + "\n"
+            yield json.dumps({"done": True, "files": len(uploads), "errors": errors}) + "\n"
+        finally:
+            # A client that disconnects early stops the clips not yet started.
+            stop.set()
+            pool.shutdown(wait=True)
+            close_uploads(uploads)
+            # after_request only sees the headers of a streamed response
+            metrics.observe_request(endpoint, method, 200, "miss", time.perf_counter() - start)
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # Runs after the body (or instead of it, if the client went away before it started)
+    response.call_on_close(lambda: close_uploads(uploads))
+    response.call_on_close(admission.close)
+    return response
+
+@app.route("/detect_motion_batch", methods=["POST"])
+def detect_motion_batch():
+    """
+    /detect_motion for many videos at once (repeated multipart field 'videos').
+    Streams one NDJSON line per video with the /detect_motion response as "result".
+    """
+    try:
+        roi = request_roi()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fast_scan = wants_fast_scan()
+    uploads = batch_uploads("videos", "video")
+    if not uploads:
+        return jsonify({"error": "No videos uploaded"}), 400
+    if len(uploads) > BATCH_MAX_FILES:
+        close_uploads(uploads)
+        return jsonify({"error": f"At most {BATCH_MAX_FILES} videos per batch"}), 400
+
+    use_model = MODEL.available
+    method = "position_classifier" if use_model else "improved_motion_detection"
+    g.analysis_method = method
+
+    def analyze_file(upload):
+        cache_key = result_cache_key(upload, "detect_motion", method, roi, fast_scan)
+        cached = cached_result(cache_key)
+        if cached is not None:
+            return cached, True
+        with upload_path(upload) as filepath:
+            if use_model:
+                result = analyze_with_model(filepath, roi=roi, fast_scan=fast_scan, endpoint="detect_motion_batch")
+            else:
+                result = analyze_motion_simple(filepath, roi=roi, fast_scan=fast_scan,
+                                               endpoint="detect_motion_batch")
+        cache_result(cache_key, result)
+        return result, False
+
+    return stream_batch("detect_motion_batch", method, uploads, analyze_file, "detect_motion",
+                        needs_model=use_model)
+
+@app.route("/predict_video_batch", methods=["POST"])
+def predict_video_batch():
+    """
+    /predict_video for many videos at once (repeated multipart field 'files').
+    Streams one NDJSON line per video with the /predict_video response as "result".
+    """
+    g.analysis_method = "position_classifier"
+    if not MODEL.available:
+        return jsonify({"error": "Position classifier model not available"}), 503
+    try:
+        roi = request_roi()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fast_scan = wants_fast_scan()
+    uploads = batch_uploads("files", "file")
+    if not uploads:
+        return jsonify({"error": "no files provided"}), 400
+    if len(uploads) > BATCH_MAX_FILES:
+        close_uploads(uploads)
+        return jsonify({"error": f"At most {BATCH_MAX_FILES} files per batch"}), 400
+
+    def analyze_file(upload):
+        cache_key = result_cache_key(upload, "predict_video", "position_classifier", roi, fast_scan)
+        cached = cached_result(cache_key)
+        if cached is not None:
+            return cached, True
+        with upload_path(upload) as video_path:
+            result = predict_video_file(video_path, roi=roi, fast_scan=fast_scan, endpoint="predict_video_batch")
+        cache_result(cache_key, result)
+        return result, False
+
+    return stream_batch("predict_video_batch", "position_classifier", uploads, analyze_file, "predict_video",
+                        needs_model=True)
+
+# ------------------ LIVE MOTION STREAMS ------------------
+# Cameras open a stream, then POST MJPEG footage to it (chunked uploads are
+# fine); each frame is analyzed once, as it arrives, against the one 3 frames
+# earlier, with the same settings as analyze_motion_simple (see
+# motion_stream.py). Every MOTION_STREAM_UPDATE_FRAMES frame differences an
+# activity update is emitted. Streams live in this process unless
+# MOTION_STREAM_DIR is set (gunicorn.conf.py sets it when running several
+# workers), in which case every worker on the host shares them.
+STREAM_READ_BYTES = 64 * 1024
+MOTION_STREAMS = MotionStreamStore(
+    max_streams=int(os.environ.get("MOTION_STREAM_MAX", "64")),
+    idle_ttl_sec=float(os.environ.get("MOTION_STREAM_IDLE_TTL_SEC", "300")),
+    state_dir=os.environ.get("MOTION_STREAM_DIR") or None,
+    frame_size=(320, 240),
+    blur_ksize=15,
+    threshold=20,
+    frame_gap=3,
+    update_every=int(os.environ.get("MOTION_STREAM_UPDATE_FRAMES", "30")),
+    max_frame_bytes=int(os.environ.get("MOTION_STREAM_MAX_FRAME_BYTES", str(4 * 1024 * 1024))),
+)
+
+def motion_stream_summary(stream):
+    """Stream counters plus the activity over everything received so far."""
+    summary = stream.info()
+    summary["analysis_method"] = "improved_motion_detection"
+    stats = stream.stats
+    if stats.count:
+        summary.update(classify_motion(stats.mean, stats.max, stats.min, stats.variance))
+    return summary
+
+@app.route("/detect_motion_stream", methods=["POST"])
+def open_motion_stream():
+    """Open a live stream; returns its stream_id. An optional `roi` ("x,y,w,h" fractions) applies to all its frames."""
+    try:
+        roi = parse_roi(request.args.get("roi") or (request.get_json(silent=True) or {}).get("roi"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        stream = MOTION_STREAMS.create(roi=roi)
+    except StreamLimitReached as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "stream_id": stream.stream_id,
+        "update_every": stream.update_every,
+        "roi": list(roi) if roi else None,
+        "idle_ttl_sec": MOTION_STREAMS.idle_ttl_sec,
+    }), 201
+
+@app.route("/detect_motion_stream/<stream_id>", methods=["POST"])
+def feed_motion_stream(stream_id):
+    """
+    Feed MJPEG frames (concatenated JPEGs or multipart/x-mixed-replace) to a stream.
+    Returns the activity updates produced by this request and the running summary.
+    """
+    updates = []
+    with MOTION_STREAMS.checkout(stream_id) as stream:
+        if stream is None:
+            return jsonify({"error": "unknown or expired stream"}), 404
+        while True:
+            chunk = request.stream.read(STREAM_READ_BYTES)
+            if not chunk:
+                break
+            for update in stream.feed(chunk):
+                window = update["window"]
+                update.update(classify_motion(window["mean"], window["max"], window["min"], window["variance"]))
+                updates.append(update)
+        summary = motion_stream_summary(stream)
+    summary["updates"] = updates
+    return jsonify(summary)
+
+@app.route("/detect_motion_stream/<stream_id>", methods=["GET"])
+def get_motion_stream(stream_id):
+    with MOTION_STREAMS.checkout(stream_id, save=False) as stream:
+        if stream is None:
+            return jsonify({"error": "unknown or expired stream"}), 404
+        return jsonify(motion_stream_summary(stream))
+
+@app.route("/detect_motion_stream/<stream_id>", methods=["DELETE"])
+def close_motion_stream(stream_id):
+    """Close a stream and return its final summary."""
+    stream = MOTION_STREAMS.close(stream_id)
+    if stream is None:
+        return jsonify({"error": "unknown or expired stream"}), 404
+    with stream.lock:
+        return jsonify(motion_stream_summary(stream))
+
+# ------------------ ASYNC JOBS ------------------
+# POST /detect_motion?async=1 and /predict_video?async=1 return a job ID at
+# once; the analysis runs on a bounded pool and is polled via GET /jobs/<id>
+# (see job_queue.py).
+def require_model_for_job():
+    """Wait up to MODEL_JOB_WAIT_SEC for the classifier; raises (failing the job) if it isn't ready."""
+    try:
+        ready = model_ready(MODEL_JOB_WAIT_SEC)
+    except ModelLoading:
+        raise RuntimeError(f"Position classifier model still loading after {MODEL_JOB_WAIT_SEC:g}s")
+    if not ready:
+        raise RuntimeError("Position classifier model not available")
+
+def _run_detect_motion_job(video_path, params, progress):
+    roi = parse_roi(params.get("roi"))
+    fast_scan = bool(params.get("fast_scan"))
+    if params.get("method") == "position_classifier":
+        require_model_for_job()
+        result = analyze_with_model(video_path, progress=progress, roi=roi, fast_scan=fast_scan,
+                                    endpoint="detect_motion_job")
+    elif params.get("camera_id"):
+        result = analyze_motion_segment(video_path, params["camera_id"], progress=progress, roi=roi,
+                                        fast_scan=fast_scan, endpoint="detect_motion_job")
+    else:
+        result = analyze_motion_simple(video_path, progress=progress, roi=roi, fast_scan=fast_scan,
+                                       endpoint="detect_motion_job")
+    cache_result(params.get("cache_key"), result)
+    return result
+
+def _run_predict_video_job(video_path, params, progress):
+    require_model_for_job()
+    result = predict_video_file(video_path, progress=progress, roi=parse_roi(params.get("roi")),
+                                fast_scan=bool(params.get("fast_scan")), endpoint="predict_video_job")
+    cache_result(params.get("cache_key"), result)
+    return result
+
+JOB_QUEUE = JobQueue(
+    os.environ.get("JOB_DIR", "jobs"),
+    handlers={
+        "detect_motion": _run_detect_motion_job,
+        "predict_video": _run_predict_video_job,
+    },
+    max_workers=int(os.environ.get("JOB_WORKERS", "2")),
+    max_pending=int(os.environ.get("JOB_MAX_PENDING", "16")),
+    ttl_sec=float(os.environ.get("JOB_TTL_SEC", str(24 * 3600))),
+    heartbeat_interval=float(os.environ.get("JOB_HEARTBEAT_SEC", "10")),
+    stale_after=float(os.environ.get("JOB_STALE_SEC", "60")),
+    # A camera's segments continue each other's session, in upload order
+    serial_key=lambda kind, params: params.get("camera_id"),
+)
+
+
+def init_worker():
+    """Per-process startup: at import, or once in each forked worker with APP_PRELOAD."""
+    # (Re)creates OpenCV's thread pool in this process.
+    cv2.setNumThreads(OPENCV_THREADS if OPENCV_THREADS > 0 else -1)
+    JOB_QUEUE.recover()
+    MODEL.start()
+
+if not APP_PRELOAD:
+    init_worker()
+
+def request_roi():
+    """Region of interest from the `roi` form field or query parameter ("x,y,w,h" fractions), or None."""
+    return parse_roi(request.form.get("roi") or request.args.get("roi"))
+
+def wants_async():
+    value = request.args.get("async") or request.form.get("async") or ""
+    return value.lower() in ("1", "true", "yes")
+
+def wants_fast_scan():
+    """`fast_scan` form field or query parameter: decode from keyframes only (see frame_sampler.KeyframeSampler)."""
+    value = request.args.get("fast_scan") or request.form.get("fast_scan") or ""
+    return value.lower() in ("1", "true", "yes")
+
+def submit_job(kind, upload, cache_key, params=None):
+    """Queue an uploaded video for background analysis; returns a 202 response."""
+    params = dict(params or {}, cache_key=cache_key)
+    try:
+        job_id = JOB_QUEUE.submit(kind, upload.stream, params)
+    except JobQueueFull:
+        return jsonify({"error": "Too many analysis jobs pending, try again later"}), 503
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}"
+    }), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Status, progress and (once done) result of an async analysis job."""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
 @app.route("/test_motion", methods=["GET"])
 def test_motion():
     """Test endpoint to simulate different motion detection scenarios"""
@@ -662,7 +1608,12 @@ def test_motion():
 
 @app.route("/health", methods=["GET"])
 def health_check():
-    model_status = "Available" if (tf_model and CLASSES and CFG) else "Not Available"
+    if MODEL.state == "ready":
+        model_status = "Available"
+    elif MODEL.available:
+        model_status = "Loading"
+    else:
+        model_status = "Not Available"
     return jsonify({
         "status": "healthy", 
         "message": "Workout Analyzer API is running",
@@ -670,10 +1621,22 @@ def health_check():
             "simple_analysis": "Available",
             "position_classifier": model_status
         },
+        "model": MODEL.status(),
+        "inference_scheduler": INFER_SCHEDULER.stats() if INFER_SCHEDULER is not None else "disabled",
+        "result_cache": RESULT_CACHE.stats() if RESULT_CACHE is not None else "disabled",
+        "jobs": JOB_QUEUE.stats(),
+        "motion_streams": MOTION_STREAMS.stats(),
+        "admission": ADMISSION.stats(),
+        "camera_sessions": CAMERA_SESSIONS.stats(),
         "endpoints": {
             "/analyze": "Simple computer vision analysis",
             "/predict_video": "Position classifier model inference",
             "/detect_motion": "CCTV motion detection (sleeping, drinking, eating, idle)",
+            "/detect_motion_batch": "/detect_motion for many videos, streamed back as NDJSON",
+            "/predict_video_batch": "/predict_video for many videos, streamed back as NDJSON",
+            "/jobs/<id>": "Status and result of an async analysis (POST with ?async=1)",
+            "/detect_motion_stream": "Live MJPEG motion detection (POST to open, POST frames to /<id>, DELETE to close)",
+            "/metrics": "Prometheus metrics",
             "/test_motion": "Test motion detection scenarios (use ?scenario=sleeping|drinking|eating|idle)"
         }
     })
@@ -683,7 +1646,7 @@ if __name__ == "__main__":
     print("📹 Available endpoints:")
     print("   /analyze - Simple computer vision analysis")
     print("   /detect_motion - CCTV motion detection (sleeping, drinking, eating, idle)")
-    if tf_model and CLASSES and CFG:
+    if MODEL.available:
         print("   /predict_video - Position classifier model inference")
         print("✅ All analysis methods available!")
     else:
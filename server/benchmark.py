@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmarks for the analysis hot paths.
+
+Generates deterministic synthetic videos (see synthetic_video.py) per
+resolution / length / motion profile and times each stage separately,
+without a running server:
+
+  decode                 FrameSampler over every frame
+  preprocess_frame_bgr   one frame -> model input
+  run_model_on_batch     one INFER_BATCH_SIZE batch (skipped without a model)
+  analyze_video_simple   the /analyze analysis
+  analyze_motion_simple  the /detect_motion fallback analysis
+
+Results are written as JSON. With --baseline, medians are compared against a
+previous run and the script exits 1 if any stage got slower than
+--threshold (fractional, default 0.10).
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --output bench_new.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Keep the app's side effects (cache, job queue, model load) out of the timings.
+os.environ.setdefault("RESULT_CACHE", "0")
+os.environ.setdefault("MODEL_LOAD", "eager")
+os.environ.setdefault("JOB_DIR", os.path.join(tempfile.gettempdir(), "symbiont-bench-jobs"))
+
+import app  # noqa: E402
+from frame_sampler import FrameSampler  # noqa: E402
+from synthetic_video import MOTION_PROFILES, clip_path  # noqa: E402
+
+DEFAULT_RESOLUTIONS = "320x240,640x480,1280x720"
+DEFAULT_DURATIONS = "3,10"
+DEFAULT_PROFILES = "static,slow,fast"
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times (after one untimed warm-up run); return timings in ms."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        fn()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+    }
+
+
+def decode_all(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        return sum(1 for _ in FrameSampler(cap, 1))
+    finally:
+        cap.release()
+
+
+def first_frames(path, n):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    try:
+        for _, frame in FrameSampler(cap, 1):
+            frames.append(frame)
+            if len(frames) == n:
+                break
+    finally:
+        cap.release()
+    return frames
+
+
+def bench_video(path, repeat, with_model):
+    frames = first_frames(path, app.INFER_BATCH_SIZE)
+    results = {
+        "decode": timed(lambda: decode_all(path), repeat),
+        "preprocess_frame_bgr": timed(lambda: app.preprocess_frame_bgr(frames[0]), repeat * 10),
+        "analyze_video_simple": timed(lambda: app.analyze_video_simple(path), repeat),
+        "analyze_motion_simple": timed(lambda: app.analyze_motion_simple(path), repeat),
+    }
+    results["decode"]["frames"] = decode_all(path)
+    if with_model:
+        batch = np.ascontiguousarray(app.PREPROCESSOR.preprocess_batch(frames))
+        results["run_model_on_batch"] = timed(lambda: app.run_model_padded(batch, app.INFER_BATCH_SIZE), repeat)
+        results["run_model_on_batch"]["batch_size"] = app.INFER_BATCH_SIZE
+    return results
+
+
+def compare(current, baseline, threshold):
+    """(case, stage, baseline_ms, current_ms, change) for every stage slower than threshold."""
+    regressions = []
+    for case, stages in current["results"].items():
+        for stage, result in stages.items():
+            before = baseline.get("results", {}).get(case, {}).get(stage)
+            if not before:
+                continue
+            change = result["median_ms"] / before["median_ms"] - 1.0 if before["median_ms"] else 0.0
+            if change > threshold:
+                regressions.append((case, stage, before["median_ms"], result["median_ms"], change))
+    return regressions
+
+
+def parse_resolutions(text):
+    return [tuple(int(v) for v in item.lower().split("x")) for item in text.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="comma-separated WIDTHxHEIGHT")
+    parser.add_argument("--durations", default=DEFAULT_DURATIONS, help="comma-separated clip lengths in seconds")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILES,
+                        help=f"comma-separated motion profiles ({', '.join(MOTION_PROFILES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--video-dir", default=os.path.join(tempfile.gettempdir(), "symbiont-bench-videos"),
+                        help="where synthetic clips are generated (reused when present)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed fractional slowdown of a stage median vs the baseline")
+    args = parser.parse_args(argv)
+
+    with_model = app.model_ready(app.MODEL_WAIT_SEC)
+    if not with_model:
+        print("⚠️ Model not available - skipping run_model_on_batch")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "model": app.MODEL.status(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    profiles = [p for p in args.profiles.split(",") if p]
+    durations = [float(d) for d in args.durations.split(",") if d]
+    for width, height in parse_resolutions(args.resolutions):
+        for seconds in durations:
+            for profile in profiles:
+                case = f"{width}x{height}_{seconds:g}s_{profile}"
+                path = clip_path(args.video_dir, width, height, seconds, profile)
+                print(f"⏱️  {case}")
+                results = bench_video(path, args.repeat, with_model)
+                report["results"][case] = results
+                for stage, result in results.items():
+                    print(f"   {stage:24s} median {result['median_ms']:10.3f} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+    if not regressions:
+        print(f"✅ No stage regressed more than {args.threshold:.0%} vs {args.baseline}")
+        return 0
+    print(f"❌ {len(regressions)} stage(s) regressed more than {args.threshold:.0%} vs {args.baseline}:")
+    for case, stage, before, after, change in regressions:
+        print(f"   {case} {stage}: {before:.3f} ms -> {after:.3f} ms (+{change:.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
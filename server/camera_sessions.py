@@ -0,0 +1,178 @@
+"""
+Per-camera motion state carried across consecutive uploads.
+
+CCTV clients upload back-to-back segments from the same camera. A
+CameraSession keeps what the motion analysis would otherwise rebuild from
+scratch for every segment:
+
+- the last sampled frame (grayscale, downscaled), so the first frame of the
+  next segment is compared with it and the difference across the segment
+  boundary is counted;
+- optionally a cv2 MOG2 background model, which needs a few hundred frames
+  to learn the scene and so is only useful when it outlives one segment;
+- running motion statistics (motion_stats.RunningStats) over all segments.
+
+CameraSessionStore keeps the sessions in LRU order and drops the least
+recently used ones past max_sessions or max_bytes (each session's footprint is
+estimated from its frame size), and any idle for longer than ttl_sec. The
+most recently used session is never evicted for size, so one that alone
+exceeds max_bytes still keeps its state between uploads. A session checked
+out for a segment is never evicted at all, so a second segment of the same
+camera waits for it rather than starting a fresh session alongside it.
+State lives in the worker process that analyzed the segment; a segment that
+lands on another worker, or after its session was evicted, simply starts
+cold.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from motion_stats import RunningStats
+
+# MOG2 keeps, per pixel and Gaussian, a weight, a variance and one mean per
+# channel (float32), plus the per-pixel mode count.
+MOG2_MIXTURES = 5
+
+
+class CameraSession:
+    """Motion state of one camera between segments. Use it through CameraSessionStore.checkout."""
+
+    def __init__(self, camera_id, frame_size, background_model=False):
+        self.camera_id = camera_id
+        self.frame_size = tuple(frame_size)  # (width, height)
+        self.background_model = background_model
+        self.lock = threading.Lock()
+        self.users = 0  # checkouts holding or waiting for lock (see CameraSessionStore.checkout)
+        self.created = time.time()
+        self.last_seen = self.created
+        self.roi = None
+        self.segments = 0
+        self.frames = 0
+        self.last_gray = None
+        self.stats = RunningStats()
+        self.foreground = RunningStats()
+        self.background = None
+        self._reset_scene()
+
+    def _reset_scene(self):
+        self.last_gray = None
+        if self.background_model:
+            self.background = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+            self.background.setNMixtures(MOG2_MIXTURES)
+
+    def begin_segment(self, roi=None):
+        """Start analyzing a new segment; a changed region of interest restarts the scene state.
+
+        Returns True when the segment continues from the previous one's last frame.
+        """
+        if roi != self.roi:
+            self.roi = roi
+            self._reset_scene()
+        self.segments += 1
+        self.last_seen = time.time()
+        return self.last_gray is not None
+
+    def nbytes(self):
+        """Estimated memory held by the session."""
+        pixels = self.frame_size[0] * self.frame_size[1]
+        size = pixels
+        if self.background_model:
+            size += pixels * (MOG2_MIXTURES * 3 * 4 + 1)
+        return size
+
+    def info(self):
+        return {
+            "camera_id": self.camera_id,
+            "segments": self.segments,
+            "frames": self.frames,
+            "age_sec": round(time.time() - self.created, 1),
+            "background_model": self.background_model,
+        }
+
+
+class CameraSessionStore:
+    """CameraSessions by camera ID with LRU, idle-TTL and memory-cap eviction."""
+
+    def __init__(self, max_sessions, ttl_sec, max_bytes, frame_size=(320, 240), background_model=False):
+        self.max_sessions = max_sessions
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.frame_size = tuple(frame_size)
+        self.background_model = background_model
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evicted = 0
+        self._expired = 0
+
+    def _drop(self, camera_id):
+        session = self._sessions.pop(camera_id)
+        self._bytes -= session.nbytes()
+
+    def _evict(self):
+        """Drop expired sessions, then least recently used ones until within the caps.
+
+        The most recently used session (the one get() just handed out) and
+        checked-out sessions always stay, even if that exceeds the caps.
+        """
+        cutoff = time.time() - self.ttl_sec
+        idle = [cid for cid, s in list(self._sessions.items())[:-1] if not s.users]
+        for camera_id in [cid for cid in idle if self._sessions[cid].last_seen < cutoff]:
+            self._drop(camera_id)
+            self._expired += 1
+        for camera_id in [cid for cid in idle if cid in self._sessions]:
+            if len(self._sessions) <= self.max_sessions and self._bytes <= self.max_bytes:
+                break
+            self._drop(camera_id)
+            self._evicted += 1
+
+    def get(self, camera_id):
+        """The session for camera_id, created if needed, marked most recently used."""
+        with self._lock:
+            return self._get(camera_id)
+
+    def _get(self, camera_id):
+        session = self._sessions.get(camera_id)
+        if session is None:
+            session = CameraSession(camera_id, self.frame_size, self.background_model)
+            self._sessions[camera_id] = session
+            self._bytes += session.nbytes()
+        else:
+            self._sessions.move_to_end(camera_id)
+        session.last_seen = time.time()
+        self._evict()
+        return session
+
+    @contextmanager
+    def checkout(self, camera_id):
+        """The session for camera_id (see get), locked for the block and never evicted meanwhile."""
+        with self._lock:
+            session = self._get(camera_id)
+            session.users += 1
+        try:
+            with session.lock:
+                yield session
+        finally:
+            with self._lock:
+                session.users -= 1
+                session.last_seen = time.time()
+
+    def stats(self):
+        with self._lock:
+            self._evict()
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "evicted": self._evicted,
+                "expired": self._expired,
+            }
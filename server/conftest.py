@@ -0,0 +1,8 @@
+"""pytest setup: import app with the stub model backend, no background load and a scratch job dir."""
+import os
+import tempfile
+
+os.environ.setdefault("INFER_BACKEND", "stub")
+os.environ.setdefault("INFER_STUB_MS_PER_FRAME", "0")
+os.environ.setdefault("MODEL_LOAD", "lazy")
+os.environ.setdefault("JOB_DIR", tempfile.mkdtemp(prefix="symbiont-jobs-"))
@@ -0,0 +1,142 @@
+"""
+Convert the position classifier SavedModel to TFLite (optionally quantized).
+
+    python convert_tflite.py --quantize int8 --calibration-video uploads/pushup.mp4
+
+--quantize:
+  none     float32 model
+  dynamic  dynamic-range quantization (int8 weights, float activations)
+  int8     full-integer quantization of weights and activations, calibrated
+           on frames from --calibration-video; model input/output stay
+           float32 so callers don't change
+
+After converting, the script runs both models on sampled frames and prints
+an accuracy report as JSON (top-1 agreement, max/mean absolute probability
+delta). It exits non-zero when agreement is below --min-agreement, so a bad
+conversion can't silently replace the served model. Serve the result with
+INFER_BACKEND=tflite (and MODEL_TFLITE_PATH if not written to the default
+path).
+"""
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from frame_sampler import FrameSampler
+from inference_backends import SavedModelBackend, TFLiteBackend
+from preprocessing import Preprocessor
+
+BASE_DIR = os.path.dirname(__file__)
+
+
+def load_frames(video_path, max_frames):
+    """Up to max_frames BGR frames spread evenly over the video."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"cannot open calibration video: {video_path}")
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        interval = max(1, total // max_frames) if total > 0 else 1
+        frames = []
+        for _, frame in FrameSampler(cap, interval):
+            frames.append(frame)
+            if len(frames) >= max_frames:
+                break
+        return frames
+    finally:
+        cap.release()
+
+
+def convert(saved_model_dir, quantize, calibration):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        def representative_dataset():
+            for x in calibration:
+                yield [x[None, ...]]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def softmax(logits):
+    z = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def compare(reference, candidate, batch, batch_size=16):
+    """Top-1 agreement and probability deltas of candidate vs reference."""
+    ref_out, cand_out = [], []
+    for i in range(0, len(batch), batch_size):
+        chunk = np.ascontiguousarray(batch[i:i + batch_size])
+        ref_out.append(reference.run(chunk))
+        cand_out.append(candidate.run(chunk))
+    ref = softmax(np.concatenate(ref_out).astype(np.float32))
+    cand = softmax(np.concatenate(cand_out).astype(np.float32))
+    delta = np.abs(ref - cand)
+    return {
+        "frames": int(len(batch)),
+        "top1_agreement": round(float(np.mean(ref.argmax(axis=1) == cand.argmax(axis=1))), 4),
+        "max_abs_prob_delta": round(float(delta.max()), 4),
+        "mean_abs_prob_delta": round(float(delta.mean()), 6),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saved-model", default=os.path.join(BASE_DIR, "models", "saved_model_export"))
+    parser.add_argument("--config", default=os.path.join(BASE_DIR, "models", "preprocess_config.json"))
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "models", "position_classifier.tflite"))
+    parser.add_argument("--quantize", choices=("none", "dynamic", "int8"), default="int8")
+    parser.add_argument("--calibration-video", default=os.path.join(BASE_DIR, "uploads", "pushup.mp4"))
+    parser.add_argument("--frames", type=int, default=200,
+                        help="frames sampled for calibration and the accuracy report")
+    parser.add_argument("--min-agreement", type=float, default=0.97,
+                        help="fail when top-1 agreement with the SavedModel is below this")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        cfg = json.load(f)
+    frames = load_frames(args.calibration_video, args.frames)
+    if not frames:
+        raise SystemExit("no frames decoded from calibration video")
+    preprocessor = Preprocessor(cfg)
+    batch = preprocessor.preprocess_batch(
+        frames, out=np.empty((len(frames),) + preprocessor.output_shape, dtype=np.float32))
+    print(f"Calibrating on {len(frames)} frames from {args.calibration_video}")
+
+    tflite_model = convert(args.saved_model, args.quantize, batch)
+    tmp = args.output + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(tflite_model)
+
+    reference = SavedModelBackend(args.saved_model)
+    reference.load()
+    candidate = TFLiteBackend(tmp, num_threads=os.cpu_count())
+    candidate.load()
+    report = compare(reference, candidate, batch)
+    report.update({
+        "quantize": args.quantize,
+        "output": args.output,
+        "size_bytes": len(tflite_model),
+        "min_agreement": args.min_agreement,
+        "passed": report["top1_agreement"] >= args.min_agreement,
+    })
+    print(json.dumps(report, indent=2))
+    if not report["passed"]:
+        os.remove(tmp)
+        print("❌ Converted model disagrees with the SavedModel too often; not written")
+        return 1
+    os.replace(tmp, args.output)
+    print(f"✅ Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
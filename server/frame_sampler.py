@@ -0,0 +1,656 @@
+"""
+Frame sampling shared by the video analyzers in app.py.
+
+The analyzers only look at every Nth frame, so there is no point in converting
+the frames in between to BGR arrays. FrameSampler walks a cv2.VideoCapture and
+only retrieves the frames that are actually sampled:
+
+- "grab": skipped frames are grab()-ed (demuxed and decoded, but never
+  retrieved/converted), sampled frames are read().
+- "seek": for long gaps the sampler jumps straight to the next sampled frame
+  with CAP_PROP_POS_FRAMES. The backend restarts decoding at a keyframe
+  before the target (see KEYFRAME_PREROLL), so this only pays off when
+  keyframes are at most a gap apart.
+- "read": plain sequential cap.read() of every frame (old behaviour).
+
+"auto" picks "seek" when the gap is long enough, the keyframe index (from the
+MP4 sync sample table, see mp4_probe.py) shows keyframes at most a gap apart,
+and the container reports a frame count and honours a seek; "grab" otherwise.
+
+With SAMPLER_ADAPTIVE=1, make_sampler() returns an AdaptiveFrameSampler
+instead, which varies the stride with a cheap low-resolution motion score:
+sparse on static footage, dense around changes, within SAMPLER_FRAME_BUDGET
+samples per video (0 = no budget).
+
+For fast scans of long recordings, make_sampler(..., fast_scan=True) returns
+a KeyframeSampler, which only decodes from keyframes (found in the MP4 sync
+sample table, see mp4_probe.py) to a fixed short distance after them, so
+each sample costs a keyframe and a short run-in rather than the frames
+between samples.
+
+All samplers take an optional FrameTransform, applied to every sampled frame
+right after it is decoded: crop to a region of interest, then shrink. The
+analyzers only ever see the smaller frame, so color conversion, blurring and
+differencing cost drop with the pixels removed. OpenCV's VideoCapture has no
+way to ask the decoder itself for a smaller picture, so for video files this
+is the earliest point; JPEG frames (motion_stream.py) are decoded at reduced
+scale with IMREAD_REDUCED_*.
+"""
+import bisect
+import os
+import time
+
+import cv2
+
+import mp4_probe
+
+# Minimum gap (in frames) between samples before "auto" tries seeking.
+# Seeking restarts decoding at the previous keyframe, so for short gaps
+# grabbing through them is cheaper.
+SEEK_MIN_GAP = int(os.environ.get("SAMPLER_SEEK_MIN_GAP", "60"))
+
+SAMPLER_MODES = ("auto", "seek", "grab", "read")
+
+SAMPLER_ADAPTIVE = os.environ.get("SAMPLER_ADAPTIVE", "0") == "1"
+SAMPLER_FRAME_BUDGET = int(os.environ.get("SAMPLER_FRAME_BUDGET", "0"))
+# Sparsest adaptive stride, as a multiple of the analyzer's fixed stride.
+ADAPTIVE_MAX_FACTOR = int(os.environ.get("SAMPLER_ADAPTIVE_MAX_FACTOR", "8"))
+# Fraction of thumbnail pixels that must change (by more than
+# ADAPTIVE_PIXEL_DELTA grey levels) between samples to count as activity.
+ADAPTIVE_CHANGE_THRESHOLD = float(os.environ.get("SAMPLER_CHANGE_THRESHOLD", "0.002"))
+ADAPTIVE_PIXEL_DELTA = 20
+ADAPTIVE_THUMB_SIZE = (64, 48)
+
+# OpenCV's FFmpeg backend seeks to the keyframe at or before (target - 16) and
+# decodes forward from there, so a seek straight to a keyframe decodes most of
+# the previous GOP. Seeking to keyframe + KEYFRAME_PREROLL instead starts
+# decoding at the keyframe itself. 0 for backends that seek exactly.
+# The samplers also use it to count the frames a seek decodes.
+KEYFRAME_PREROLL = int(os.environ.get("SAMPLER_KEYFRAME_PREROLL", "16"))
+
+
+def parse_roi(value):
+    """Region of interest "x,y,w,h" (fractions of the frame, 0..1) or a 4-sequence -> tuple, None if empty.
+
+    Raises ValueError for anything that is not a non-empty box inside the frame.
+    """
+    if value is None or value == "":
+        return None
+    parts = value.split(",") if isinstance(value, str) else list(value)
+    if len(parts) != 4:
+        raise ValueError("roi must be x,y,w,h")
+    x, y, w, h = (float(v) for v in parts)
+    if not (0 <= x < 1 and 0 <= y < 1 and w > 0 and h > 0 and x + w <= 1 + 1e-6 and y + h <= 1 + 1e-6):
+        raise ValueError("roi must be x,y,w,h fractions of the frame with x+w <= 1 and y+h <= 1")
+    return (x, y, w, h)
+
+
+class FrameTransform:
+    """Crop to `roi` (see parse_roi), then resize to exactly `size` (w, h) or shrink to fit within max_side.
+
+    Shrinking uses INTER_AREA; max_side never enlarges. `scale` is the linear
+    factor from the cropped source to the output (1.0 until the first frame),
+    so callers can scale pixel-count thresholds by scale ** 2 and kernel sizes
+    by scale. The crop and size are worked out again whenever the incoming
+    frame size changes.
+    """
+
+    def __init__(self, roi=None, size=None, max_side=None):
+        self.roi = roi
+        self.size = tuple(size) if size else None
+        self.max_side = int(max_side) if max_side else None
+        self.scale = 1.0
+        self.source_size = None  # (w, h) of the decoded frames
+        self.output_size = None
+        self._crop = None
+        self._resize = None
+        self._interpolation = cv2.INTER_AREA
+
+    def _setup(self, frame):
+        h, w = frame.shape[:2]
+        self.source_size = (w, h)
+        self._crop = self._resize = None
+        self.scale = 1.0
+        if self.roi is not None:
+            x, y, rw, rh = self.roi
+            x0, y0 = int(round(x * w)), int(round(y * h))
+            x1, y1 = min(w, max(x0 + 1, int(round((x + rw) * w)))), min(h, max(y0 + 1, int(round((y + rh) * h))))
+            self._crop = (slice(y0, y1), slice(x0, x1))
+            w, h = x1 - x0, y1 - y0
+        out = (w, h)
+        if self.size is not None:
+            out = self.size
+        elif self.max_side and max(w, h) > self.max_side:
+            factor = self.max_side / max(w, h)
+            out = (max(1, int(round(w * factor))), max(1, int(round(h * factor))))
+        if out != (w, h):
+            self._resize = out
+            self.scale = (out[0] * out[1] / (w * h)) ** 0.5
+            shrinking = out[0] <= w and out[1] <= h
+            self._interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+        self.output_size = out
+
+    def apply(self, frame):
+        if self.source_size != (frame.shape[1], frame.shape[0]):
+            self._setup(frame)
+        if self._crop is not None:
+            frame = frame[self._crop]
+        if self._resize is not None:
+            frame = cv2.resize(frame, self._resize, interpolation=self._interpolation)
+        return frame
+
+    def stats(self):
+        return {"roi": list(self.roi) if self.roi else None,
+                "source_size": list(self.source_size) if self.source_size else None,
+                "output_size": list(self.output_size) if self.output_size else None}
+
+
+def median_gop(keyframes, frame_count):
+    """Median distance in frames between consecutive keyframes (the last one runs to frame_count)."""
+    gaps = sorted(b - a for a, b in zip(keyframes, keyframes[1:] + [max(frame_count, keyframes[-1] + 1)]))
+    return gaps[len(gaps) // 2]
+
+
+def interval_for_fps(video_fps, sample_fps):
+    """Number of source frames between samples for a target sampling rate."""
+    return max(1, int(round(video_fps / sample_fps)))
+
+
+class FrameSampler:
+    """Yield (frame_index, frame) for every `frame_interval`-th frame of `cap`.
+
+    After (or during) iteration the counters describe the work done:
+    frames_decoded    frames the decoder decoded: read, grabbed, or decoded
+                      by the backend on its way to a seek target
+    frames_retrieved  frames retrieved into BGR arrays
+    frames_skipped    frames never decoded (jumped over by seeking)
+    frames_seen       index just past the last frame visited; equals the
+                      number of frames in the video once iteration reaches
+                      the end
+    decode_sec        time spent in the capture's read/grab/seek calls
+
+    `keyframes` (sorted frame indices, e.g. from video_keyframes) lets "auto"
+    tell whether seeking saves decoding, and lets the counters include what a
+    seek decodes. Yielded frames have gone through `transform` (a
+    FrameTransform) if given.
+    """
+
+    def __init__(self, cap, frame_interval, mode="auto", transform=None, keyframes=None):
+        if mode not in SAMPLER_MODES:
+            raise ValueError(f"unknown sampler mode: {mode}")
+        self.cap = cap
+        self.frame_interval = max(1, int(frame_interval))
+        self.requested_mode = mode
+        self.mode = None
+        self.keyframes = keyframes or None
+        self.frames_decoded = 0
+        self.frames_retrieved = 0
+        self.frames_skipped = 0
+        self.frames_seen = 0
+        self.decode_sec = 0.0
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.transform = transform
+        # Why make_sampler(..., fast_scan=True) returned this sampler instead of a KeyframeSampler
+        self.fast_scan_fallback = None
+
+    def _choose_mode(self):
+        mode = self.requested_mode
+        if mode == "auto":
+            seek = (self.frame_interval >= SEEK_MIN_GAP and self.keyframes is not None
+                    and median_gop(self.keyframes, self.frame_count) <= self.frame_interval)
+            mode = "seek" if seek else "grab"
+        if mode == "seek" and self.frame_count <= 0:
+            mode = "grab"
+        return mode
+
+    def __iter__(self):
+        self.mode = self._choose_mode()
+        if self.mode == "seek":
+            frames = self._iter_seek()
+        else:
+            frames = self._iter_sequential(grab_only=self.mode == "grab")
+        if self.transform is None:
+            yield from frames
+        else:
+            for idx, frame in frames:
+                yield idx, self.transform.apply(frame)
+
+    def _read(self):
+        start = time.perf_counter()
+        ok, frame = self.cap.read()
+        self.decode_sec += time.perf_counter() - start
+        if ok:
+            self.frames_decoded += 1
+            self.frames_retrieved += 1
+        return ok, frame
+
+    def _grab(self):
+        start = time.perf_counter()
+        ok = self.cap.grab()
+        self.decode_sec += time.perf_counter() - start
+        if ok:
+            self.frames_decoded += 1
+        return ok
+
+    def _seek_start(self, target):
+        """First frame the backend decodes when seeking to `target` (see KEYFRAME_PREROLL)."""
+        anchor = max(target - KEYFRAME_PREROLL, 0)
+        if self.keyframes is None:
+            return anchor
+        i = bisect.bisect_right(self.keyframes, anchor)
+        return self.keyframes[i - 1] if i else 0
+
+    def _seek_saves(self, target):
+        """True if seeking to `target` decodes fewer frames than grabbing up to it."""
+        return self.keyframes is not None and target - self._seek_start(target) < target - self.frames_seen
+
+    def _seek(self, target):
+        """Seek so the next read returns frame `target`; returns the frame the capture landed on.
+
+        A landing at or before the target counts the frames the backend
+        decoded to get there and the ones it jumped over; callers handle the
+        rest (grab up to the target, or give up on seeking).
+        """
+        start = time.perf_counter()
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        landed = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        self.decode_sec += time.perf_counter() - start
+        if 0 <= landed <= target:
+            first = min(self._seek_start(landed), landed)
+            self.frames_decoded += landed - first
+            self.frames_skipped += max(0, first - self.frames_seen)
+            self.frames_seen = landed
+        return landed
+
+    def _iter_sequential(self, grab_only=True, start=None):
+        idx = self.frames_seen if start is None else start
+        while True:
+            if idx % self.frame_interval == 0 or not grab_only:
+                ok, frame = self._read()
+                if not ok:
+                    break
+                self.frames_seen = idx + 1
+                if idx % self.frame_interval == 0:
+                    yield idx, frame
+            else:
+                if not self._grab():
+                    break
+                self.frames_seen = idx + 1
+            idx += 1
+
+    def _iter_seek(self):
+        target = 0
+        while target < self.frame_count:
+            if target != self.frames_seen:
+                landed = self._seek(target)
+                if not 0 <= landed <= target:
+                    # The container can't seek reliably: carry on from
+                    # wherever we are by grabbing sequentially.
+                    self.mode = "grab"
+                    self.frames_skipped += max(0, landed - self.frames_seen)
+                    yield from self._iter_sequential(grab_only=True, start=max(landed, 0))
+                    return
+                # Inexact seeks land on an earlier frame; grab up to the target.
+                while self.frames_seen < target and self._grab():
+                    self.frames_seen += 1
+                if self.frames_seen < target:
+                    break
+            ok, frame = self._read()
+            if not ok:
+                break
+            self.frames_seen = target + 1
+            yield target, frame
+            target += self.frame_interval
+        else:
+            # Reached the end by seeking: account for the tail we never visited.
+            self.frames_skipped += max(0, self.frame_count - self.frames_seen)
+            self.frames_seen = max(self.frames_seen, self.frame_count)
+
+    @property
+    def uneven(self):
+        """True if the samples are unevenly spaced (see sample_weights)."""
+        return self.mode in ("adaptive", "keyframe")
+
+    def expected_samples(self):
+        """Number of frames iteration will yield, or None if the frame count is unknown."""
+        if self.frame_count <= 0:
+            return None
+        return (self.frame_count + self.frame_interval - 1) // self.frame_interval
+
+    def stats(self):
+        """Counters for inclusion in an analysis response."""
+        stats = {
+            "sampler_mode": self.mode or self.requested_mode,
+            "frame_interval": self.frame_interval,
+            "frames_decoded": self.frames_decoded,
+            "frames_retrieved": self.frames_retrieved,
+            "frames_skipped": self.frames_skipped,
+        }
+        if self.transform is not None:
+            stats.update(self.transform.stats())
+        return stats
+
+
+class AdaptiveFrameSampler(FrameSampler):
+    """Change-driven variant of FrameSampler.
+
+    Starts at the base stride and, after each sample, compares a tiny
+    grayscale thumbnail with the previous sample's. When the fraction of
+    changed thumbnail pixels (the motion score) is above change_threshold, or
+    moved by more than it since the last sample, the stride drops straight to
+    min_interval; while the scene stays quiet it doubles up towards
+    max_interval. Static footage is thus sampled sparsely and bursts of
+    activity densely, and short clips get about the fixed-stride samples.
+
+    With a frame_budget (and a known frame count) the stride never gets so
+    small that the remaining frames would need more than the remaining budget.
+
+    Samples are unevenly spaced, so consumers that average over samples
+    should weight each by the span of frames it stands for (see
+    sample_weights).
+
+    With pair_step, every sample further apart than pair_step from the next
+    is followed by the frame pair_step after it (not a sample itself: it
+    doesn't steer the stride or count towards the budget), so frame
+    differences can always be taken over the same short gap however sparse
+    the sampling gets. The stride never drops below pair_step.
+    """
+
+    def __init__(self, cap, base_interval, min_interval=None, max_interval=None, frame_budget=0,
+                 change_threshold=None, transform=None, keyframes=None, pair_step=0):
+        super().__init__(cap, base_interval, mode="grab", transform=transform, keyframes=keyframes)
+        self.pair_step = max(0, int(pair_step))
+        self.min_interval = max(1, self.pair_step, int(min_interval or base_interval))
+        self.max_interval = max(self.min_interval, int(max_interval or base_interval * ADAPTIVE_MAX_FACTOR))
+        self.frame_budget = max(0, int(frame_budget))
+        self.change_threshold = ADAPTIVE_CHANGE_THRESHOLD if change_threshold is None else change_threshold
+        self.samples = 0
+        self.densified = 0
+        self._can_seek = self.frame_count > 0
+
+    def __iter__(self):
+        self.mode = "adaptive"
+        interval = min(max(self.frame_interval, self.min_interval), self.max_interval)
+        prev_thumb = None
+        prev_score = None
+        while not (self.frame_budget and self.samples >= self.frame_budget):
+            ok, frame = self._read()
+            if not ok:
+                break
+            idx = self.frames_seen
+            self.frames_seen = idx + 1
+            self.samples += 1
+            if self.transform is not None:
+                frame = self.transform.apply(frame)
+
+            thumb = cv2.cvtColor(cv2.resize(frame, ADAPTIVE_THUMB_SIZE, interpolation=cv2.INTER_AREA),
+                                 cv2.COLOR_BGR2GRAY)
+            if prev_thumb is not None:
+                changed_pixels = cv2.countNonZero(
+                    cv2.threshold(cv2.absdiff(thumb, prev_thumb), ADAPTIVE_PIXEL_DELTA, 255, cv2.THRESH_BINARY)[1])
+                score = changed_pixels / thumb.size
+                changed = prev_score is not None and abs(score - prev_score) > self.change_threshold
+                if score > self.change_threshold or changed:
+                    if interval > self.min_interval:
+                        self.densified += 1
+                    interval = self.min_interval
+                else:
+                    interval = min(interval * 2, self.max_interval)
+                prev_score = score
+            prev_thumb = thumb
+            interval = max(interval, self._budget_interval(idx + 1))
+
+            yield idx, frame
+            if self.pair_step and interval > self.pair_step:
+                partner = idx + self.pair_step
+                if not self._skip_to(partner):
+                    break
+                ok, frame = self._read()
+                if not ok:
+                    break
+                self.frames_seen = partner + 1
+                if self.transform is not None:
+                    frame = self.transform.apply(frame)
+                yield partner, frame
+            if not self._skip_to(idx + interval):
+                break
+
+    def _budget_interval(self, next_pos):
+        """Smallest stride that keeps the rest of the video within the frame budget."""
+        if not self.frame_budget or self.frame_count <= 0:
+            return 1
+        remaining = self.frame_budget - self.samples
+        if remaining <= 0:
+            return 1
+        return max(1, -(-(self.frame_count - next_pos) // remaining))
+
+    def _skip_to(self, target):
+        """Position the capture so the next read returns frame `target`; False at end of video."""
+        gap = target - self.frames_seen
+        if target >= self.frame_count > 0 and gap >= SEEK_MIN_GAP:
+            self.frames_skipped += max(0, self.frame_count - self.frames_seen)
+            self.frames_seen = max(self.frames_seen, self.frame_count)
+            return False
+        if gap >= SEEK_MIN_GAP and self._can_seek and self._seek_saves(target):
+            landed = self._seek(target)
+            if 0 <= landed <= target:
+                # Inexact seeks land on an earlier frame; grab up to the target.
+                while self.frames_seen < target and self._grab():
+                    self.frames_seen += 1
+                return self.frames_seen == target
+            # Unreliable seeking: stay sequential from wherever we landed.
+            self._can_seek = False
+            if landed < 0:
+                return False
+            self.frames_skipped += landed - self.frames_seen
+            self.frames_seen = landed
+            return True
+        while self.frames_seen < target:
+            if not self._grab():
+                return False
+            self.frames_seen += 1
+        return True
+
+    def expected_samples(self):
+        """Upper bound on the number of samples, or None if the frame count is unknown."""
+        if self.frame_count <= 0:
+            return self.frame_budget or None
+        step = min(self.min_interval, self.pair_step) if self.pair_step else self.min_interval
+        bound = (self.frame_count + step - 1) // step
+        return min(bound, self.frame_budget * (2 if self.pair_step else 1)) if self.frame_budget else bound
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "frame_budget": self.frame_budget,
+            "densified": self.densified,
+        })
+        if self.pair_step:
+            stats["pair_step"] = self.pair_step
+        return stats
+
+
+class KeyframeSampler(FrameSampler):
+    """Fast-scan variant of FrameSampler: every sample is decoded starting at a keyframe.
+
+    OpenCV can't hand out a keyframe alone after a seek (see KEYFRAME_PREROLL),
+    so the sample points are the frames KEYFRAME_PREROLL past each keyframe
+    (frame 0 for the first one): seeking to such a point starts decoding at
+    the keyframe, so a sample costs KEYFRAME_PREROLL + 1 decoded frames however
+    long the GOP is. The samples are P/B-frames close after keyframes, not the
+    keyframes themselves. For every frame_interval-th frame the nearest sample
+    point is taken (each at most once), so when keyframes are further apart
+    than frame_interval every keyframe is sampled and the samples are simply
+    sparser than asked for; points that grabbing reaches with less decoding
+    than a seek are grabbed through instead. frames_decoded counts every
+    decoded frame, the run-in after each keyframe included.
+
+    With pair_step, every sample point is followed by the frame pair_step
+    after it, so frame differences span the same short gap as in a full scan.
+
+    `timestamps` holds the presentation time (seconds) the capture reports for
+    every sample. Build it with make_sampler(..., fast_scan=True), which falls
+    back to the regular samplers where a keyframe scan doesn't fit the video.
+    """
+
+    def __init__(self, cap, frame_interval, keyframes, pair_step=0, transform=None):
+        super().__init__(cap, frame_interval, mode="seek", transform=transform, keyframes=keyframes)
+        self.preroll = KEYFRAME_PREROLL
+        self.pair_step = max(0, int(pair_step))
+        self.timestamps = []
+        self.seeks = 0
+        self._can_seek = True
+        self._positions = self._plan()
+
+    def _plan(self):
+        """Sample points to visit, ascending: the one nearest to every frame_interval-th frame."""
+        last = self.frame_count - 1 - self.pair_step
+        points = sorted({k + self.preroll if k > 0 else 0 for k in self.keyframes})
+        points = [p for p in points if p <= last]
+        positions = []
+        if not points:
+            return positions
+        for target in range(0, self.frame_count, self.frame_interval):
+            i = bisect.bisect_left(points, target)
+            nearest = min(points[max(i - 1, 0):i + 1], key=lambda p: abs(p - target))
+            if not positions or nearest > positions[-1] + self.pair_step:
+                positions.append(nearest)
+        return positions
+
+    def __iter__(self):
+        self.mode = "keyframe"
+        for idx, frame in self._iter_positions():
+            self.timestamps.append(self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+            yield idx, (frame if self.transform is None else self.transform.apply(frame))
+
+    def _iter_positions(self):
+        for position in self._positions:
+            if position < self.frames_seen:
+                continue
+            if self._can_seek and self._seek_saves(position):
+                landed = self._seek(position)
+                self.seeks += 1
+                if landed < 0:
+                    return
+                if landed > position:
+                    # Unreliable seeking: grab through the rest from wherever we landed.
+                    self._can_seek = False
+                    self.frames_skipped += landed - self.frames_seen
+                    self.frames_seen = landed
+                    continue
+            for target in (position, position + self.pair_step) if self.pair_step else (position,):
+                frame = self._read_at(target)
+                if frame is None:
+                    return
+                yield target, frame
+        # Account for the tail after the last sample, which was never visited.
+        self.frames_skipped += max(0, self.frame_count - self.frames_seen)
+        self.frames_seen = max(self.frames_seen, self.frame_count)
+
+    def _read_at(self, target):
+        """Grab up to frame `target` (inexact seeks land before it) and read it; None at the end."""
+        while self.frames_seen < target and self._grab():
+            self.frames_seen += 1
+        if self.frames_seen < target:
+            return None
+        ok, frame = self._read()
+        if not ok:
+            return None
+        self.frames_seen = target + 1
+        return frame
+
+    def expected_samples(self):
+        return len(self._positions) * (2 if self.pair_step else 1)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "keyframes": len(self.keyframes),
+            "keyframe_preroll": self.preroll,
+            "pair_step": self.pair_step,
+            "seeks": self.seeks,
+        })
+        return stats
+
+    def scan_report(self):
+        """Fast-scan summary for an analysis response: what was sampled and when."""
+        return {
+            "sampler": "keyframe",
+            "keyframe_preroll": self.preroll,
+            "pair_step": self.pair_step,
+            "samples": len(self.timestamps),
+            "frames_decoded": self.frames_decoded,
+            "timestamps_sec": [round(t, 3) for t in self.timestamps],
+        }
+
+
+def video_keyframes(video_path):
+    """Keyframe indices of the video file at video_path (see mp4_probe.keyframe_indices), or None."""
+    try:
+        with open(video_path, "rb") as f:
+            return mp4_probe.keyframe_indices(f)
+    except OSError:
+        return None
+
+
+def keyframe_sampler(cap, frame_interval, keyframes, pair_step=0, transform=None):
+    """(KeyframeSampler, None) over `keyframes`, or (None, reason) where a keyframe scan doesn't fit.
+
+    An all-intra stream doesn't fit (a regular sampler decodes it just as
+    cheaply), nor does a video without a keyframe index. GOPs longer than
+    frame_interval do: every keyframe is sampled (see KeyframeSampler).
+    """
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    if frame_count <= 0:
+        return None, "unknown_frame_count"
+    if not keyframes:
+        return None, "no_keyframe_index"
+    gop = median_gop(keyframes, frame_count)
+    if gop <= 1:
+        return None, "all_intra"
+    return KeyframeSampler(cap, frame_interval, keyframes, pair_step=pair_step, transform=transform), None
+
+
+def make_sampler(cap, frame_interval, min_interval=None, transform=None, fast_scan=False, video_path=None,
+                 pair_step=0):
+    """FrameSampler at a fixed frame_interval, or an AdaptiveFrameSampler around it with SAMPLER_ADAPTIVE=1.
+
+    min_interval is the densest stride the adaptive sampler may use (default
+    frame_interval); it sparsifies up to ADAPTIVE_MAX_FACTOR x frame_interval.
+    video_path (the file cap reads) provides the keyframe index the samplers
+    use to decide when seeking pays off. With fast_scan, a KeyframeSampler
+    if one fits the video; otherwise the regular sampler, with the reason in
+    its fast_scan_fallback. pair_step is passed to the KeyframeSampler and the
+    AdaptiveFrameSampler (see there); evenly spaced samples need none.
+    """
+    keyframes = video_keyframes(video_path) if video_path else None
+    fallback = None
+    if fast_scan:
+        sampler, fallback = keyframe_sampler(cap, frame_interval, keyframes, pair_step, transform)
+        if sampler is not None:
+            return sampler
+    if not SAMPLER_ADAPTIVE:
+        sampler = FrameSampler(cap, frame_interval, transform=transform, keyframes=keyframes)
+    else:
+        sampler = AdaptiveFrameSampler(cap, frame_interval, min_interval=min_interval,
+                                       frame_budget=SAMPLER_FRAME_BUDGET, transform=transform,
+                                       keyframes=keyframes, pair_step=pair_step)
+    sampler.fast_scan_fallback = fallback
+    return sampler
+
+
+def fast_scan_report(sampler):
+    """The fast_scan block of an analysis response: the sampler that ran, and why if it isn't the keyframe scan."""
+    if isinstance(sampler, KeyframeSampler):
+        return sampler.scan_report()
+    return {"sampler": sampler.mode, "fallback": sampler.fast_scan_fallback}
+
+
+def sample_weights(sampler, indices):
+    """Frames each sample stands for (gap to the next sample), or None for evenly spaced samplers."""
+    if not sampler.uneven or not indices:
+        return None
+    ends = list(indices[1:]) + [max(sampler.frames_seen, indices[-1] + 1)]
+    return [end - start for start, end in zip(indices, ends)]
@@ -0,0 +1,80 @@
+"""
+Gunicorn settings for the API server:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers and threads can be overridden with GUNICORN_WORKERS / GUNICORN_THREADS.
+
+Multi-process serving: with preload_app (GUNICORN_PRELOAD=1, the default)
+app.py is imported once in the master, and the workers are forked from it and
+share the imported code and data copy-on-write. The Python heap is moved to
+gc's permanent generation before forking (gc.freeze) so collections in the
+workers don't write to, and thereby copy, those pages. Everything that can't
+cross a fork (the model, its thread pools, OpenCV's thread pool, the job
+runner) is started per worker by app.init_worker() from post_fork.
+
+Model weights: TensorFlow can't be used in a process that was forked after
+its runtime started, so each worker loads the SavedModel itself and holds a
+private copy. The TFLite backend (INFER_BACKEND=tflite, see
+convert_tflite.py) memory-maps its model file, so all workers read the
+weights from the same page-cache pages; with INFER_TFLITE_XNNPACK=0 they
+also skip XNNPACK's per-process repacked copy.
+
+Unless set explicitly, the CPU cores are divided between the workers for
+INFER_TFLITE_THREADS, INFER_TF_INTRA_THREADS and OPENCV_THREADS.
+
+Measure what a worker really costs with worker_memory.py, which reports RSS
+and PSS (shared pages divided among the processes sharing them) per process:
+
+    python worker_memory.py --workers 4 --preload both
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+# Read by app.py at import (in the master when preloading).
+if preload_app:
+    os.environ["APP_PRELOAD"] = "1"
+_threads_per_worker = str(max(1, (os.cpu_count() or 1) // max(1, workers)))
+for _name in ("INFER_TFLITE_THREADS", "INFER_TF_INTRA_THREADS", "OPENCV_THREADS"):
+    os.environ.setdefault(_name, _threads_per_worker)
+
+# Live motion streams (see motion_stream.py) are kept in memory by the worker
+# that opened them; with several workers they are shared through this
+# directory instead, since the chunks of one stream can reach any worker.
+if workers > 1:
+    os.environ.setdefault("MOTION_STREAM_DIR", os.path.join(tempfile.gettempdir(), "symbiont-motion-streams"))
+
+# Prometheus multiprocess mode (see metrics.py): set before any worker imports
+# prometheus_client, so every worker writes its samples to this directory.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "symbiont-prometheus"))
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be merged into this one.
+    multiproc_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before any worker is forked.
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import app
+        app.init_worker()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,296 @@
+"""
+Inference backends for the position classifier.
+
+ModelManager (model_manager.py) owns the model lifecycle and delegates the
+actual loading and execution to one of these, chosen with INFER_BACKEND:
+
+- "savedmodel": the exported TF SavedModel through its serving_default
+  signature (full TensorFlow). Optionally wrapped in an XLA-compiled
+  tf.function (jit_compile), and optionally run in bfloat16 through
+  TensorFlow's oneDNN auto mixed precision on CPUs with native bf16.
+- "tflite": a .tflite flatbuffer produced by convert_tflite.py (optionally
+  dynamic-range or int8 quantized), run by the TFLite interpreter. The
+  default op resolver applies the XNNPACK delegate to float and quantized
+  ops on CPU; INFER_TFLITE_THREADS sets its thread count. The standalone
+  tflite_runtime package is used when installed, so a worker doesn't have
+  to import full TensorFlow.
+- "stub": no model at all; deterministic pseudo-logits after a configurable
+  delay per frame. For load tests and benchmarks on machines without the
+  exported model.
+
+Every backend exposes load(), run(batch) -> [N, num_classes] and describe().
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+BACKENDS = ("savedmodel", "tflite", "stub")
+PRECISIONS = ("float32", "bfloat16")
+# /proc/cpuinfo flags that mean the CPU computes in bfloat16 natively.
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+
+def cpu_supports_bfloat16():
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = set(re.findall(r"\w+", f.read()))
+    except OSError:
+        return False
+    return any(flag in flags for flag in BF16_CPU_FLAGS)
+
+
+class SavedModelBackend:
+    """TF SavedModel via its serving_default signature.
+
+    jit_compile wraps the call in tf.function(jit_compile=True), so each
+    distinct batch shape is compiled once by XLA; callers should pad batches
+    to a few fixed sizes. precision="bfloat16" turns on oneDNN auto mixed
+    precision when the CPU supports it and stays float32 otherwise.
+    intra_op_threads / inter_op_threads size TensorFlow's thread pools (0 =
+    TensorFlow's default of one thread per core), e.g. to split the cores
+    between several server processes.
+    """
+
+    name = "savedmodel"
+
+    def __init__(self, model_dir, jit_compile=False, precision="float32", intra_op_threads=0,
+                 inter_op_threads=0):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown precision: {precision}")
+        self.model_dir = model_dir
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.jit_compile = jit_compile
+        self.precision = precision
+        self.effective_precision = "float32"
+        self._tf = None
+        self._model = None
+        self._serving_fn = None
+        self._in_key = None
+        self._out_key = None
+        self._call = None
+
+    @property
+    def model_path(self):
+        return self.model_dir
+
+    def exists(self):
+        return os.path.exists(self.model_dir)
+
+    def load(self):
+        import tensorflow as tf
+        self._tf = tf
+        # Only possible before the TF runtime starts, i.e. before the first op.
+        if self.intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(self.intra_op_threads)
+        if self.inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+        if self.precision == "bfloat16":
+            self._enable_bfloat16()
+        print("Loading TF SavedModel from", self.model_dir)
+        self._model = tf.saved_model.load(self.model_dir)
+        self._resolve_signature()
+        self._call = self._forward
+        if self.jit_compile:
+            self._call = tf.function(self._forward, jit_compile=True)
+
+    def _enable_bfloat16(self):
+        if not cpu_supports_bfloat16():
+            print("⚠️ bfloat16 requested but this CPU has no native bf16 support; using float32")
+            return
+        # Grappler rewrites eligible ops of every graph it optimizes (including
+        # the loaded signature) to bfloat16; inputs and outputs stay float32.
+        self._tf.config.optimizer.set_experimental_options({"auto_mixed_precision_onednn_bfloat16": True})
+        self.effective_precision = "bfloat16"
+
+    def _resolve_signature(self):
+        try:
+            self._serving_fn = self._model.signatures.get("serving_default", None)
+        except Exception:
+            self._serving_fn = None
+        print("serving_default signature:", bool(self._serving_fn))
+        if self._serving_fn is None:
+            return
+        try:
+            sig_inputs = list(self._serving_fn.structured_input_signature[1].keys())
+            self._in_key = sig_inputs[0] if sig_inputs else None
+        except Exception:
+            self._in_key = None
+        try:
+            outputs = self._serving_fn.structured_outputs
+            self._out_key = list(outputs.keys())[0] if isinstance(outputs, dict) and outputs else None
+        except Exception:
+            self._out_key = None
+
+    def _forward(self, x):
+        if self._serving_fn is not None:
+            out = self._serving_fn(**{self._in_key: x}) if self._in_key else self._serving_fn(x)
+            if isinstance(out, dict):
+                out = out[self._out_key] if self._out_key else list(out.values())[0]
+            return out
+        # fallback: call model directly if possible
+        return self._model(x)
+
+    def run(self, batched_np):
+        return self._call(self._tf.constant(batched_np)).numpy()
+
+    def describe(self):
+        return {
+            "backend": self.name,
+            "input_key": self._in_key,
+            "output_key": self._out_key,
+            "jit_compile": self.jit_compile,
+            "precision": self.effective_precision,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+        }
+
+
+def _tflite_interpreter_class():
+    """(Interpreter, OpResolverType) from tflite_runtime, else from full TensorFlow."""
+    try:
+        from tflite_runtime.interpreter import Interpreter, OpResolverType
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+        OpResolverType = tf.lite.experimental.OpResolverType
+    return Interpreter, OpResolverType
+
+
+class TFLiteBackend:
+    """TFLite interpreter (XNNPACK on CPU) for a float or quantized .tflite model.
+
+    The interpreter memory-maps the .tflite file, so the weights of every
+    process serving the same file are the same page-cache pages. XNNPACK
+    repacks float weights into memory of its own, once per process;
+    xnnpack=False runs the built-in kernels on the mapped weights instead,
+    trading speed for memory that does not grow with the number of workers.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None, xnnpack=True):
+        self._model_path = model_path
+        self.num_threads = num_threads
+        self.xnnpack = xnnpack
+        self._interpreter = None
+        self._input = None
+        self._output = None
+        self._batch_shape = None
+        # One interpreter, one set of tensors: calls must not interleave.
+        self._lock = threading.Lock()
+
+    @property
+    def model_path(self):
+        return self._model_path
+
+    def exists(self):
+        return os.path.exists(self._model_path)
+
+    def load(self):
+        Interpreter, OpResolverType = _tflite_interpreter_class()
+        print("Loading TFLite model from", self._model_path)
+        kwargs = {}
+        if not self.xnnpack:
+            kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self._interpreter = Interpreter(model_path=self._model_path, num_threads=self.num_threads, **kwargs)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_shape = tuple(self._input["shape"])
+
+    def _resize(self, shape):
+        if shape != self._batch_shape:
+            self._interpreter.resize_tensor_input(self._input["index"], list(shape))
+            self._interpreter.allocate_tensors()
+            self._input = self._interpreter.get_input_details()[0]
+            self._output = self._interpreter.get_output_details()[0]
+            self._batch_shape = shape
+
+    @staticmethod
+    def _quantize(x, details):
+        scale, zero_point = details["quantization"]
+        if not scale:
+            return x.astype(details["dtype"])
+        info = np.iinfo(details["dtype"])
+        q = np.round(x / scale + zero_point)
+        return np.clip(q, info.min, info.max).astype(details["dtype"])
+
+    @staticmethod
+    def _dequantize(y, details):
+        scale, zero_point = details["quantization"]
+        if not scale:
+            return y.astype(np.float32)
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def run(self, batched_np):
+        with self._lock:
+            self._resize(tuple(batched_np.shape))
+            x = batched_np
+            if self._input["dtype"] != np.float32:
+                x = self._quantize(x, self._input)
+            self._interpreter.set_tensor(self._input["index"], x)
+            self._interpreter.invoke()
+            y = self._interpreter.get_tensor(self._output["index"])
+            if self._output["dtype"] != np.float32:
+                y = self._dequantize(y, self._output)
+            return y
+
+    def describe(self):
+        info = {"backend": self.name, "model_path": self._model_path, "num_threads": self.num_threads,
+                "xnnpack": self.xnnpack}
+        if self._input is not None:
+            info["input_dtype"] = np.dtype(self._input["dtype"]).name
+            info["output_dtype"] = np.dtype(self._output["dtype"]).name
+        return info
+
+
+class StubBackend:
+    """Stand-in model: one logit per class in classes_path, derived from the input, after a fixed delay per frame."""
+
+    name = "stub"
+
+    def __init__(self, classes_path, ms_per_frame=0.0):
+        self.classes_path = classes_path
+        self.ms_per_frame = ms_per_frame
+        self.num_classes = 0
+
+    @property
+    def model_path(self):
+        return self.classes_path
+
+    def exists(self):
+        return os.path.exists(self.classes_path)
+
+    def load(self):
+        with open(self.classes_path, "r") as f:
+            self.num_classes = max(1, len(json.load(f)))
+        print(f"Using stub model ({self.num_classes} classes, {self.ms_per_frame} ms/frame)")
+
+    def run(self, batched_np):
+        n = len(batched_np)
+        if self.ms_per_frame:
+            time.sleep(n * self.ms_per_frame / 1000.0)
+        means = batched_np.reshape(n, -1).mean(axis=1, dtype=np.float32)
+        return np.cos(means[:, None] * np.arange(1, self.num_classes + 1, dtype=np.float32))
+
+    def describe(self):
+        return {"backend": self.name, "ms_per_frame": self.ms_per_frame}
+
+
+def make_backend(name, saved_model_dir, tflite_path, tflite_threads=None, jit_compile=False,
+                 precision="float32", classes_path=None, stub_ms_per_frame=0.0, tf_intra_op_threads=0,
+                 tf_inter_op_threads=0, tflite_xnnpack=True):
+    """Backend instance for an INFER_BACKEND value."""
+    if name == "savedmodel":
+        return SavedModelBackend(saved_model_dir, jit_compile=jit_compile, precision=precision,
+                                 intra_op_threads=tf_intra_op_threads, inter_op_threads=tf_inter_op_threads)
+    if name == "tflite":
+        return TFLiteBackend(tflite_path, num_threads=tflite_threads, xnnpack=tflite_xnnpack)
+    if name == "stub":
+        return StubBackend(classes_path, ms_per_frame=stub_ms_per_frame)
+    raise ValueError(f"unknown inference backend: {name} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,192 @@
+"""
+Cross-request micro-batching in front of the position classifier.
+
+Each analysis request preprocesses its own frames, but under a threaded
+gunicorn worker several requests call the model at the same time with small
+batches. InferenceScheduler queues those batches, merges them into one model
+call and hands every caller back its own slice of the output through a
+concurrent.futures.Future.
+
+A merged batch is flushed when any of these is true:
+- it has reached max_batch_size rows,
+- the oldest queued batch has waited max_wait_ms,
+- every caller currently inside a session() has something queued, so waiting
+  longer could not add more rows.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ("batch", "future", "enqueued")
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class InferenceScheduler:
+    """Merge concurrent inference calls into batches of up to max_batch_size rows.
+
+    run_fn takes a [M, ...] array and returns a [M, ...] array of outputs.
+    """
+
+    def __init__(self, run_fn, max_batch_size=32, max_wait_ms=5.0):
+        self.run_fn = run_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._thread = None
+        self._stopped = False
+
+        self._batches = 0
+        self._rows = 0
+        self._requests = 0
+        self._completed = 0
+        self._max_queue_depth = 0
+        self._wait_total = 0.0
+        self._batch_sizes = Counter()
+        self._flush_reasons = Counter()
+
+    # ------------------ caller side ------------------
+
+    @contextmanager
+    def session(self):
+        """Mark the calling request as in flight for the duration of the block.
+
+        The scheduler stops waiting for more work as soon as every in-flight
+        session has a batch queued, so a lone request is not delayed.
+        """
+        with self._lock:
+            self._active += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def submit(self, batch):
+        """Queue a [n, ...] batch; returns a Future resolving to its [n, ...] outputs."""
+        if self._stopped:
+            raise RuntimeError("inference scheduler is closed")
+        self._ensure_started()
+        req = _Request(np.array(batch, dtype=np.float32, copy=True))
+        self._queue.put(req)
+        with self._lock:
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return req.future
+
+    def run(self, batch):
+        """Blocking submit()."""
+        return self.submit(batch).result()
+
+    def close(self):
+        self._stopped = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    # ------------------ worker side ------------------
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name="inference-scheduler", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        carry = None
+        while True:
+            first = carry if carry is not None else self._queue.get()
+            carry = None
+            if first is None:
+                return
+            pending = [first]
+            rows = len(first.batch)
+            deadline = first.enqueued + self.max_wait
+            reason = "max_wait"
+            while True:
+                if rows >= self.max_batch_size:
+                    reason = "max_batch"
+                    break
+                with self._lock:
+                    active = self._active
+                if active and len(pending) >= active:
+                    reason = "all_callers"
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    req = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if req is None:
+                    self._stopped = True
+                    break
+                if rows + len(req.batch) > self.max_batch_size:
+                    # Doesn't fit: it starts the next merged batch.
+                    carry = req
+                    reason = "max_batch"
+                    break
+                pending.append(req)
+                rows += len(req.batch)
+            self._execute(pending, rows, reason)
+            if self._stopped and carry is None and self._queue.empty():
+                return
+
+    def _execute(self, pending, rows, reason):
+        now = time.monotonic()
+        merged = pending[0].batch if len(pending) == 1 else np.concatenate(
+            [req.batch for req in pending], axis=0)
+        try:
+            out = self.run_fn(merged)
+        except Exception as e:
+            for req in pending:
+                req.future.set_exception(e)
+        else:
+            offset = 0
+            for req in pending:
+                n = len(req.batch)
+                req.future.set_result(out[offset:offset + n])
+                offset += n
+        with self._lock:
+            self._batches += 1
+            self._rows += rows
+            self._batch_sizes[rows] += 1
+            self._flush_reasons[reason] += 1
+            self._completed += len(pending)
+            self._wait_total += sum(now - req.enqueued for req in pending)
+
+    # ------------------ stats ------------------
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "in_flight_sessions": self._active,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "batches": self._batches,
+                "rows": self._rows,
+                "mean_batch_size": round(self._rows / self._batches, 2) if self._batches else 0.0,
+                "mean_queue_wait_ms": round(1000.0 * self._wait_total / self._completed, 3) if self._completed else 0.0,
+                "batch_sizes": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "flush_reasons": dict(self._flush_reasons),
+            }
@@ -0,0 +1,390 @@
+"""
+Asynchronous analysis jobs.
+
+Long videos are analyzed off the request thread: the endpoint copies the
+upload into JOB_DIR, records a job in SQLite and returns its ID straight away.
+A bounded thread pool runs the analysis, updating progress as it goes, and
+GET /jobs/<id> reads the job back. Jobs that share a serial key (e.g. the
+segments of one camera) run one after another in the order they were
+submitted, without holding a pool thread while they wait.
+
+The SQLite database runs in WAL mode so readers (status polls) never block
+the writer, and every worker process on the host can share it. A job is
+claimed by the process that runs it, under a token unique to that process
+(pid plus a random suffix, so a reused PID never looks like the old owner),
+and the owner refreshes the job's heartbeat while it runs. On startup, jobs
+left queued, or running with a stale heartbeat or a dead owner PID, are
+picked up again, so a worker restart doesn't lose them.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    video_path TEXT,
+    owner_pid INTEGER,
+    owner_token TEXT,
+    heartbeat_at REAL,
+    frames_processed INTEGER NOT NULL DEFAULT 0,
+    frames_total INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+# Columns added after the first schema; created on databases that predate them.
+_ADDED_COLUMNS = (("owner_token", "TEXT"), ("heartbeat_at", "REAL"))
+
+
+class JobQueueFull(Exception):
+    """Raised when max_pending jobs are already queued or running in this process."""
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite (WAL) persistence for jobs."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED_COLUMNS:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    @contextmanager
+    def _connect(self):
+        """Connection whose block runs as one transaction; closed afterwards."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, job_id, kind, params, video_path=None, status="queued", result=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, video_path, result, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, status, json.dumps(params), video_path,
+                 json.dumps(result) if result is not None else None, now, now))
+
+    def claim(self, job_id, pid, token):
+        """Atomically move a queued job to running; False if someone else got it."""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status='running', owner_pid=?, owner_token=?, heartbeat_at=?, updated_at=? "
+                "WHERE id=? AND status='queued'", (pid, token, now, now, job_id))
+            return cur.rowcount == 1
+
+    def heartbeat(self, token):
+        """Mark every job running under `token` as still alive."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at=? WHERE status='running' AND owner_token=?",
+                         (time.time(), token))
+
+    def progress(self, job_id, processed, total):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET frames_processed=?, frames_total=?, updated_at=? WHERE id=?",
+                (processed, total, time.time(), job_id))
+
+    def finish(self, job_id, result=None, error=None, token=None):
+        """Record the outcome; with `token`, only if the job is still owned by it (not re-queued).
+
+        Returns False if the job was not updated.
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status=?, result=?, error=?, updated_at=?, "
+                "frames_processed=COALESCE(CASE WHEN ? IS NULL THEN frames_total END, frames_processed) "
+                "WHERE id=? AND (? IS NULL OR owner_token=?)",
+                ("failed" if error else "done",
+                 json.dumps(result) if result is not None else None,
+                 error, time.time(), error, job_id, token, token))
+            return cur.rowcount == 1
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def requeue_orphans(self, stale_after):
+        """Reset running jobs whose owner is gone; return all queued job rows.
+
+        An owner is gone if its PID no longer exists or its heartbeat is older
+        than `stale_after` seconds (the PID may have been reused).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, owner_pid, COALESCE(heartbeat_at, updated_at) AS beat "
+                "FROM jobs WHERE status='running'").fetchall()
+            for row in rows:
+                if not _pid_alive(row["owner_pid"]) or now - row["beat"] > stale_after:
+                    conn.execute(
+                        "UPDATE jobs SET status='queued', owner_pid=NULL, owner_token=NULL, updated_at=? "
+                        "WHERE id=? AND status='running'", (now, row["id"]))
+            return [dict(r) for r in conn.execute(
+                "SELECT * FROM jobs WHERE status='queued' ORDER BY created_at").fetchall()]
+
+    def expired(self, older_than):
+        """Finished jobs last updated before `older_than` (epoch seconds)."""
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(
+                "SELECT id, video_path FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (older_than,)).fetchall()]
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+
+
+class JobQueue:
+    """Run analysis jobs on a bounded thread pool.
+
+    handlers maps a job kind to fn(video_path, params, progress) -> result dict,
+    where progress(frames_processed, frames_total) may be called at any rate.
+    serial_key(kind, params) -> key or None: jobs with the same key run one
+    at a time, in submission order (in this process). Running jobs get a heartbeat every heartbeat_interval seconds; a running
+    job whose heartbeat is older than stale_after is re-queued by recover().
+    """
+
+    def __init__(self, job_dir, handlers, max_workers=2, max_pending=16,
+                 ttl_sec=24 * 3600, progress_interval=0.5,
+                 heartbeat_interval=10.0, stale_after=60.0, serial_key=None):
+        self.job_dir = job_dir
+        self.video_dir = os.path.join(job_dir, "videos")
+        os.makedirs(self.video_dir, exist_ok=True)
+        self.store = JobStore(os.path.join(job_dir, "jobs.sqlite3"))
+        self.handlers = handlers
+        self.max_pending = max_pending
+        self.ttl_sec = ttl_sec
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._token = None
+        self._token_pid = None
+        self._running = 0
+        self._heartbeat_thread = None
+        self.serial_key = serial_key
+        # serial key -> job IDs waiting behind the one of that key being run
+        self._serial = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sweep = 0.0
+
+    # ------------------ submission ------------------
+
+    def submit(self, kind, upload_stream, params=None, suffix=".mp4"):
+        """Persist the upload and queue a job for it; returns the job ID."""
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs already pending")
+            self._pending += 1
+        job_id = uuid.uuid4().hex
+        video_path = os.path.join(self.video_dir, job_id + suffix)
+        try:
+            upload_stream.seek(0)
+            with open(video_path, "wb") as out:
+                shutil.copyfileobj(upload_stream, out, 1 << 20)
+            self.store.create(job_id, kind, params or {}, video_path)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            self._remove_file(video_path)
+            raise
+        self._dispatch(job_id, kind, params or {})
+        self._maybe_sweep()
+        return job_id
+
+    def recover(self):
+        """Re-queue jobs that were interrupted by a worker restart."""
+        recovered = 0
+        for row in self.store.requeue_orphans(self.stale_after):
+            if not row["video_path"] or not os.path.exists(row["video_path"]):
+                self.store.finish(row["id"], error="upload lost before the job could run")
+                continue
+            with self._lock:
+                self._pending += 1
+            self._dispatch(row["id"], row["kind"], json.loads(row["params"]))
+            recovered += 1
+        if recovered:
+            print(f"Re-queued {recovered} interrupted analysis job(s)")
+        return recovered
+
+    # ------------------ lookup ------------------
+
+    def get(self, job_id):
+        """Public view of a job, or None."""
+        row = self.store.get(job_id)
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": {
+                "frames_processed": row["frames_processed"],
+                "frames_total": row["frames_total"],
+            },
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending}
+
+    # ------------------ execution ------------------
+
+    def _dispatch(self, job_id, kind, params):
+        """Hand a job to the pool, or queue it behind a running job with the same serial key."""
+        key = self.serial_key(kind, params) if self.serial_key else None
+        if key is not None:
+            with self._lock:
+                waiting = self._serial.get(key)
+                if waiting is not None:
+                    waiting.append(job_id)
+                    return
+                self._serial[key] = deque()
+        self._executor.submit(self._run, job_id, key)
+
+    def _dispatch_next(self, key):
+        """Start the next job waiting on `key`, if any."""
+        with self._lock:
+            waiting = self._serial[key]
+            if not waiting:
+                del self._serial[key]
+                return
+            job_id = waiting.popleft()
+        self._executor.submit(self._run, job_id, key)
+
+    def _owner_token(self):
+        """This process's owner token; a forked worker gets its own."""
+        with self._lock:
+            if self._token_pid != os.getpid():
+                self._token_pid = os.getpid()
+                self._token = f"{self._token_pid}-{uuid.uuid4().hex}"
+                self._running = 0
+                self._heartbeat_thread = None
+            return self._token
+
+    def _heartbeat_loop(self, token):
+        """Refresh the heartbeat of this process's running jobs until none are left."""
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                if self._running == 0:
+                    self._heartbeat_thread = None
+                    return
+            try:
+                self.store.heartbeat(token)
+            except sqlite3.Error:
+                traceback.print_exc()
+
+    def _run(self, job_id, key=None):
+        try:
+            token = self._owner_token()
+            if not self.store.claim(job_id, os.getpid(), token):
+                return
+            with self._lock:
+                self._running += 1
+                if self._heartbeat_thread is None:
+                    self._heartbeat_thread = threading.Thread(
+                        target=self._heartbeat_loop, args=(token,), name="job-heartbeat", daemon=True)
+                    self._heartbeat_thread.start()
+            try:
+                self._execute(job_id, token)
+            finally:
+                with self._lock:
+                    self._running -= 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+            if key is not None:
+                self._dispatch_next(key)
+
+    def _execute(self, job_id, token):
+        row = self.store.get(job_id)
+        last = [0.0]
+
+        def progress(processed, total):
+            now = time.monotonic()
+            if now - last[0] >= self.progress_interval:
+                last[0] = now
+                self.store.progress(job_id, processed, total)
+
+        try:
+            result = self.handlers[row["kind"]](row["video_path"], json.loads(row["params"]), progress)
+            if result is None or "error" in result:
+                finished = self.store.finish(job_id, result=result,
+                                             error=(result or {}).get("error", "analysis failed"), token=token)
+            else:
+                finished = self.store.finish(job_id, result=result, token=token)
+        except Exception as e:
+            traceback.print_exc()
+            finished = self.store.finish(job_id, error=str(e), token=token)
+        # A job re-queued under us belongs to its new owner, upload included.
+        if finished:
+            self._remove_file(row["video_path"])
+
+    # ------------------ housekeeping ------------------
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            if path:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _maybe_sweep(self):
+        """Drop finished jobs older than ttl_sec, at most once a minute."""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        for row in self.store.expired(now - self.ttl_sec):
+            self._remove_file(row["video_path"])
+            self.store.delete(row["id"])
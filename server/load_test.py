@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Concurrent end-to-end load test for the upload endpoints.
+
+Drives /analyze, /detect_motion and /predict_video with synthetic clips
+(see synthetic_video.py) from a pool of client threads, either
+
+  --target inprocess   through Flask's test client inside this process
+  --target gunicorn    against a gunicorn started locally for the run
+                       (--workers / --threads, as in the Dockerfile)
+  --target URL         against a server that is already running
+
+and reports throughput, p50/p95/p99 latency and error rate (overall and per
+endpoint) and the peak RSS of the server process tree. When
+models/saved_model_export is missing the stub backend (INFER_BACKEND=stub,
+INFER_STUB_MS_PER_FRAME of simulated work per frame) stands in for the model.
+
+    python load_test.py --concurrency 8 --requests 200
+    python load_test.py --target gunicorn --workers 2 --threads 4 --mix analyze=1,detect_motion=3
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from synthetic_video import MOTION_PROFILES, clip_path
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Upload form field of each endpoint.
+ENDPOINTS = {"analyze": "video", "detect_motion": "video", "predict_video": "file"}
+RSS_SAMPLE_SEC = 0.2
+
+
+# ------------------ clients ------------------
+
+class InProcessClient:
+    """Flask test client against app.py imported into this process."""
+
+    def __init__(self):
+        import app
+        self.app = app.app
+
+    def post(self, endpoint, field, path):
+        client = self.app.test_client()
+        with open(path, "rb") as f:
+            response = client.post(f"/{endpoint}", data={field: (f, os.path.basename(path))},
+                                   content_type="multipart/form-data")
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HTTPClient:
+    """requests against a running server; one session per client thread."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    def post(self, endpoint, field, path):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        with open(path, "rb") as f:
+            response = session.post(f"{self.base_url}/{endpoint}",
+                                    files={field: (os.path.basename(path), f, "video/mp4")}, timeout=600)
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class GunicornClient(HTTPClient):
+    """Starts `gunicorn -c gunicorn.conf.py app:app` on a local port and targets it."""
+
+    def __init__(self, workers, threads, port, startup_timeout):
+        super().__init__(f"http://127.0.0.1:{port}")
+        # Through the environment, so gunicorn.conf.py sizes the per-worker thread pools for them.
+        env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:app",
+             "--timeout", "600"],
+            cwd=BASE_DIR, env=env)
+        deadline = time.time() + startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"gunicorn exited with code {self.process.returncode}")
+            try:
+                if requests.get(f"{self.base_url}/health", timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        self.close()
+        raise SystemExit(f"gunicorn did not become healthy within {startup_timeout}s")
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# ------------------ memory ------------------
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def child_pids(pid):
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def tree_rss_bytes(pid):
+    """Summed RSS of pid and all of its descendants."""
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        total += _rss_bytes(p)
+        stack.extend(child_pids(p))
+    return total
+
+
+class RSSMonitor:
+    """Samples the RSS of a process tree on a thread and keeps the peak."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, tree_rss_bytes(self.pid))
+            if self._stop.wait(RSS_SAMPLE_SEC):
+                return
+
+
+# ------------------ load ------------------
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint in --mix: {name} (expected {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_clips(text):
+    """"640x480:5,1280x720:10" -> [(640, 480, 5.0), (1280, 720, 10.0)]"""
+    clips = []
+    for item in text.split(","):
+        if not item:
+            continue
+        size, _, seconds = item.partition(":")
+        width, height = (int(v) for v in size.lower().split("x"))
+        clips.append((width, height, float(seconds or 5)))
+    return clips
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "mean_ms": round(float(ms.mean()), 1),
+    }
+
+
+def summarize(samples, wall):
+    """samples: [(endpoint, latency_sec, status or None)]"""
+    errors = [s for s in samples if s[2] is None or s[2] >= 400]
+    statuses = {}
+    for _, _, status in samples:
+        key = str(status) if status is not None else "exception"
+        statuses[key] = statuses.get(key, 0) + 1
+    summary = {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else None,
+        "error_rate": round(len(errors) / len(samples), 4) if samples else None,
+        "statuses": statuses,
+    }
+    summary.update(percentiles([latency for _, latency, _ in samples]))
+    return summary
+
+
+def run_load(client, plan, concurrency):
+    samples = []
+    lock = threading.Lock()
+
+    def one(job):
+        endpoint, path = job
+        start = time.perf_counter()
+        try:
+            status = client.post(endpoint, ENDPOINTS[endpoint], path)
+        except Exception as e:
+            print(f"❌ {endpoint}: {e}")
+            status = None
+        with lock:
+            samples.append((endpoint, time.perf_counter() - start, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, plan))
+    return samples, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="inprocess", help="inprocess, gunicorn or a server URL")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads")
+    parser.add_argument("--requests", type=int, default=40, help="total requests")
+    parser.add_argument("--mix", default="analyze=1,detect_motion=1,predict_video=1",
+                        help="endpoint weights, e.g. analyze=1,detect_motion=2")
+    parser.add_argument("--clips", default="640x480:5",
+                        help="comma-separated WIDTHxHEIGHT:SECONDS clips, picked at random per request")
+    parser.add_argument("--profile", default="slow", choices=sorted(MOTION_PROFILES))
+    parser.add_argument("--seed", type=int, default=0, help="seed for the request order")
+    parser.add_argument("--video-dir", default=os.path.join(tempfile.gettempdir(), "symbiont-bench-videos"))
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers (--target gunicorn)")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads (--target gunicorn)")
+    parser.add_argument("--port", type=int, default=8099, help="gunicorn port (--target gunicorn)")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--stub-model", choices=("auto", "always", "never"), default="auto",
+                        help="use the stub backend (auto: when the SavedModel is missing)")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache on")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    # Applies to the in-process app and is inherited by gunicorn.
+    if not args.cache:
+        os.environ["RESULT_CACHE"] = "0"
+    os.environ.setdefault("MODEL_LOAD", "eager")
+    os.environ.setdefault("JOB_DIR", os.path.join(tempfile.gettempdir(), "symbiont-load-jobs"))
+    saved_model = os.path.join(BASE_DIR, "models", "saved_model_export")
+    if args.stub_model == "always" or (args.stub_model == "auto" and not os.path.exists(saved_model)):
+        os.environ["INFER_BACKEND"] = "stub"
+
+    mix = parse_mix(args.mix)
+    clips = [clip_path(args.video_dir, w, h, s, args.profile) for w, h, s in parse_clips(args.clips)]
+    rng = random.Random(args.seed)
+    names = list(mix)
+    plan = [(rng.choices(names, weights=[mix[n] for n in names])[0], rng.choice(clips))
+            for _ in range(args.requests)]
+
+    if args.target == "inprocess":
+        client, pid = InProcessClient(), os.getpid()
+    elif args.target == "gunicorn":
+        client = GunicornClient(args.workers, args.threads, args.port, args.startup_timeout)
+        pid = client.pid
+    else:
+        client, pid = HTTPClient(args.target), None
+
+    try:
+        print(f"🚀 {args.requests} requests, concurrency {args.concurrency}, target {args.target}")
+        if pid is not None:
+            with RSSMonitor(pid) as rss:
+                samples, wall = run_load(client, plan, args.concurrency)
+            peak_rss = rss.peak
+        else:
+            samples, wall = run_load(client, plan, args.concurrency)
+            peak_rss = None
+    finally:
+        client.close()
+
+    report = {
+        "config": {
+            "target": args.target,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "clips": args.clips,
+            "profile": args.profile,
+            "workers": args.workers if args.target == "gunicorn" else None,
+            "threads": args.threads if args.target == "gunicorn" else None,
+            "infer_backend": os.environ.get("INFER_BACKEND", "savedmodel"),
+        },
+        "wall_sec": round(wall, 3),
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1) if peak_rss else None,
+        "overall": summarize(samples, wall),
+        "endpoints": {name: summarize([s for s in samples if s[0] == name], wall)
+                      for name in names if any(s[0] == name for s in samples)},
+    }
+
+    print(f"\n📊 {report['overall']['requests']} requests in {report['wall_sec']}s")
+    print(f"   {'endpoint':16s} {'reqs':>6s} {'rps':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'errors':>7s}")
+    for name, summary in [("overall", report["overall"])] + list(report["endpoints"].items()):
+        print(f"   {name:16s} {summary['requests']:6d} {summary['throughput_rps']:8.2f} "
+              f"{summary['p50_ms']:9.1f} {summary['p95_ms']:9.1f} {summary['p99_ms']:9.1f} "
+              f"{summary['error_rate']:7.1%}")
+    if report["peak_rss_mb"] is not None:
+        print(f"   peak RSS: {report['peak_rss_mb']} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
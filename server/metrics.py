@@ -0,0 +1,107 @@
+"""
+Prometheus metrics for the analysis endpoints, served by GET /metrics.
+
+Histograms, labeled by endpoint and analysis method (position_classifier,
+improved_motion_detection, simple_analysis). Analyses run for the batch
+endpoints and by the async job queue are labeled detect_motion_batch /
+predict_video_batch and detect_motion_job / predict_video_job, so they
+don't mix with the single-request latencies:
+
+  symbiont_upload_bytes              request body size
+  symbiont_upload_save_seconds       parsing the upload into a file
+  symbiont_decode_seconds            VideoCapture read/grab/seek time
+  symbiont_frames_decoded            frames decoded per analysis (read, grabbed, or
+                                     decoded by the backend on its way to a seek target)
+  symbiont_frames_analyzed           frames that reached the analysis
+  symbiont_preprocess_seconds        preprocessing time per analysis
+  symbiont_inference_batch_seconds   one model call (by backend and batch size)
+  symbiont_request_seconds           whole request (plus status and cache hit)
+
+and, labeled by endpoint only, symbiont_admission_wait_seconds (time queued
+for admission) and the symbiont_admission_rejections_total counter (plus
+the reason: queue_full or timeout).
+
+Under gunicorn every worker is its own process. When PROMETHEUS_MULTIPROC_DIR
+is set (gunicorn.conf.py does this before the workers start) each worker
+writes its samples to files there and /metrics merges all of them, so a
+scrape sees the whole server no matter which worker answers it.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(2 ** n for n in range(16, 32, 2))  # 64KB .. 1GB
+FRAME_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+UPLOAD_BYTES = Histogram(
+    "symbiont_upload_bytes", "Size of uploaded request bodies.",
+    ["endpoint"], buckets=BYTES_BUCKETS)
+UPLOAD_SAVE_SECONDS = Histogram(
+    "symbiont_upload_save_seconds", "Time to parse an upload into a decoder-ready file.",
+    ["endpoint"], buckets=LATENCY_BUCKETS)
+DECODE_SECONDS = Histogram(
+    "symbiont_decode_seconds", "Time spent decoding video per analysis.",
+    ["endpoint", "method"], buckets=LATENCY_BUCKETS)
+FRAMES_DECODED = Histogram(
+    "symbiont_frames_decoded", "Frames decoded per analysis, including grabbed frames and a seek's run-in.",
+    ["endpoint", "method"], buckets=FRAME_BUCKETS)
+FRAMES_ANALYZED = Histogram(
+    "symbiont_frames_analyzed", "Frames analyzed per analysis.",
+    ["endpoint", "method"], buckets=FRAME_BUCKETS)
+PREPROCESS_SECONDS = Histogram(
+    "symbiont_preprocess_seconds", "Time spent preprocessing frames for the model per analysis.",
+    ["endpoint", "method"], buckets=LATENCY_BUCKETS)
+INFERENCE_BATCH_SECONDS = Histogram(
+    "symbiont_inference_batch_seconds", "Duration of one model call.",
+    ["backend", "batch_size"], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram(
+    "symbiont_request_seconds", "Request latency.",
+    ["endpoint", "method", "status", "cache"], buckets=LATENCY_BUCKETS)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "symbiont_admission_wait_seconds", "Time an analysis waited for admission.",
+    ["endpoint"], buckets=LATENCY_BUCKETS)
+ADMISSION_REJECTIONS = Counter(
+    "symbiont_admission_rejections", "Analyses rejected by admission control.",
+    ["endpoint", "reason"])
+
+
+def observe_upload(endpoint, size_bytes, save_sec):
+    UPLOAD_BYTES.labels(endpoint).observe(size_bytes)
+    UPLOAD_SAVE_SECONDS.labels(endpoint).observe(save_sec)
+
+
+def observe_analysis(endpoint, method, sampler, frames_analyzed, timings=None):
+    """Record one analysis from its FrameSampler and, for the model path, pipeline timings."""
+    DECODE_SECONDS.labels(endpoint, method).observe(sampler.decode_sec)
+    FRAMES_DECODED.labels(endpoint, method).observe(sampler.frames_decoded)
+    FRAMES_ANALYZED.labels(endpoint, method).observe(frames_analyzed)
+    if timings and "preprocess" in timings:
+        PREPROCESS_SECONDS.labels(endpoint, method).observe(timings["preprocess"]["busy_sec"])
+
+
+def observe_inference(backend, batch_size, seconds):
+    INFERENCE_BATCH_SECONDS.labels(backend, str(batch_size)).observe(seconds)
+
+
+def observe_request(endpoint, method, status, cache, seconds):
+    REQUEST_SECONDS.labels(endpoint, method, str(status), cache).observe(seconds)
+
+
+def observe_admission(endpoint, waited_sec):
+    ADMISSION_WAIT_SECONDS.labels(endpoint).observe(waited_sec)
+
+
+def count_rejection(endpoint, reason):
+    ADMISSION_REJECTIONS.labels(endpoint, reason).inc()
+
+
+def render():
+    """(body, content_type) of the /metrics response, merged across workers when multiprocess."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,183 @@
+"""
+Lifecycle of the position classifier model.
+
+TensorFlow is only imported when the model is actually loaded, so workers
+that never run the classifier (or start up before it is needed) don't pay
+for the import. ModelManager:
+
+- reads classes.json / preprocess_config.json eagerly (cheap, and needed by
+  preprocessing even before the model is ready),
+- loads the model through an inference backend (inference_backends.py:
+  TF SavedModel or TFLite) eagerly, in a background thread, or lazily on
+  first use (MODEL_LOAD=eager|background|lazy),
+- runs a warm-up batch for each configured batch size so graph tracing
+  happens before the first real request,
+- optionally records model-call latency per batch size (the padded bucket
+  sizes), so bucket sizes can be tuned for the hardware,
+- exposes its state for /health.
+
+States: "unavailable" (no model files), "not_loaded", "loading", "warming_up",
+"ready", "failed".
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+import numpy as np
+
+from inference_backends import SavedModelBackend
+
+LOAD_MODES = ("eager", "background", "lazy")
+# Recent model-call latencies kept per batch size for the percentiles.
+LATENCY_SAMPLES = 512
+
+
+class ModelManager:
+    """Load and run the position classifier through an inference backend.
+
+    backend defaults to the TF SavedModel in model_dir. With latency_stats,
+    run() times every call and status() reports latency per batch size.
+    """
+
+    def __init__(self, model_dir, classes_path, cfg_path, warmup_batch_sizes=(), load_mode="background",
+                 backend=None, latency_stats=False):
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"unknown model load mode: {load_mode}")
+        self.model_dir = model_dir
+        self.backend = backend if backend is not None else SavedModelBackend(model_dir)
+        self.load_mode = load_mode
+        self.warmup_batch_sizes = sorted(set(int(n) for n in warmup_batch_sizes if int(n) > 0))
+        self.classes = self._read_json(classes_path, [])
+        self.cfg = self._read_json(cfg_path, {})
+        if self.classes:
+            print(f"Loaded {len(self.classes)} classes")
+        if self.cfg:
+            print("Loaded preprocessing config")
+
+        self.state = "not_loaded" if self.backend.exists() else "unavailable"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = {}
+        self.latency_stats = latency_stats
+        self._latency = {}
+        self._latency_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @staticmethod
+    def _read_json(path, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, "r") as f:
+            return json.load(f)
+
+    # ------------------ loading ------------------
+
+    def start(self):
+        """Begin loading according to load_mode."""
+        if self.state != "not_loaded" or not self.classes or not self.cfg:
+            return
+        if self.load_mode == "eager":
+            self.load()
+        elif self.load_mode == "background":
+            threading.Thread(target=self.load, name="model-loader", daemon=True).start()
+
+    def load(self):
+        """Load the model through the backend and warm it up (idempotent)."""
+        with self._lock:
+            in_progress = self.state in ("loading", "warming_up")
+            if not in_progress and self.state != "not_loaded":
+                return self.state == "ready"
+            if not in_progress:
+                self.state = "loading"
+        if in_progress:
+            self._ready.wait()
+            return self.state == "ready"
+        try:
+            start = time.perf_counter()
+            self.backend.load()
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self.state = "warming_up"
+            self._warm_up()
+            self.state = "ready"
+            print(f"✅ Position Classifier Model loaded successfully! ({self.load_seconds}s)")
+        except Exception as e:
+            traceback.print_exc()
+            self.error = str(e)
+            self.state = "failed"
+            print(f"❌ Error loading Position Classifier Model: {e}")
+            print("⚠️ Will use fallback simple analysis")
+        finally:
+            self._ready.set()
+        return self.state == "ready"
+
+    def _warm_up(self):
+        crop = int(self.cfg.get("crop", 260))
+        for n in self.warmup_batch_sizes:
+            start = time.perf_counter()
+            self.backend.run(np.zeros((n, crop, crop, 3), dtype=np.float32))
+            self.warmup_seconds[str(n)] = round(time.perf_counter() - start, 3)
+
+    def ensure_loaded(self, timeout=None):
+        """Make sure a load has been attempted; True once the model is ready."""
+        if self.state == "not_loaded":
+            if self.load_mode == "lazy":
+                return self.load()
+            self.start()
+        if self.state in ("unavailable", "failed"):
+            return False
+        self._ready.wait(timeout)
+        return self.state == "ready"
+
+    # ------------------ inference ------------------
+
+    @property
+    def available(self):
+        """Model files and metadata are present and loading hasn't failed."""
+        return bool(self.classes and self.cfg) and self.state not in ("unavailable", "failed")
+
+    def run(self, batched_np):
+        """Run the model on a [N, H, W, C] float32 batch; returns [N, num_classes] outputs."""
+        if not self.latency_stats:
+            return self.backend.run(batched_np)
+        start = time.perf_counter()
+        out = self.backend.run(batched_np)
+        elapsed = time.perf_counter() - start
+        with self._latency_lock:
+            samples = self._latency.get(len(batched_np))
+            if samples is None:
+                samples = self._latency[len(batched_np)] = deque(maxlen=LATENCY_SAMPLES)
+            samples.append(elapsed)
+        return out
+
+    def latency_report(self):
+        """Per batch size: calls sampled and p50/p95/mean latency, total and per frame, in ms."""
+        with self._latency_lock:
+            latency = {n: np.asarray(samples) * 1000.0 for n, samples in self._latency.items()}
+        report = {}
+        for n in sorted(latency):
+            ms = latency[n]
+            report[str(n)] = {
+                "calls": int(len(ms)),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "mean_ms": round(float(ms.mean()), 3),
+                "mean_ms_per_frame": round(float(ms.mean()) / n, 3),
+            }
+        return report
+
+    def status(self):
+        info = {
+            "state": self.state,
+            "load_mode": self.load_mode,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+        info.update(self.backend.describe())
+        if self.latency_stats:
+            info["bucket_latency"] = self.latency_report()
+        return info
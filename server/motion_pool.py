@@ -0,0 +1,228 @@
+"""
+Frame-difference motion analysis, optionally spread over a process pool.
+
+The motion analyzers blur each sampled grayscale frame and count the pixels
+that changed against the previous one (GaussianBlur -> absdiff -> threshold ->
+count). That is pure CPU work, so with MOTION_PROCESSES > 0 it runs in worker
+processes instead of competing with the request threads for the GIL.
+
+FrameDiffer collects frames into fixed-size windows (time chunks). With a
+pool, each window lives in multiprocessing.shared_memory, so workers read the
+frames in place instead of receiving pickled arrays, and the window is split
+into contiguous ranges analyzed in parallel. Two windows are double-buffered
+so the caller keeps decoding into one while the other is being analyzed.
+
+Each range starts one frame early so every consecutive pair is compared
+exactly once, and the last frame of a window is carried over as the first
+frame of the next. The merged result is the same per-pair count list the
+sequential loop would produce.
+
+MotionGate reuses the same differencing to decide whether a sampled frame
+changed enough since the last classified one to be worth a model call.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# Worker processes for motion analysis; 0 runs everything in the calling thread.
+MOTION_PROCESSES = int(os.environ.get("MOTION_PROCESSES", "0"))
+# Upper bound on the size of one window of frames (two are allocated).
+MOTION_WINDOW_BYTES = int(os.environ.get("MOTION_WINDOW_BYTES", str(32 * 1024 * 1024)))
+MOTION_WINDOW_MAX_FRAMES = 512
+
+_pool = None
+_pool_size = 0
+
+
+def get_pool(processes):
+    """Shared ProcessPoolExecutor, started lazily with forkserver (safe from a threaded server)."""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != processes:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _pool = ProcessPoolExecutor(max_workers=processes, mp_context=ctx)
+        _pool_size = processes
+    return _pool
+
+
+def count_changed_pixels(frames, start, stop, blur_ksize, threshold):
+    """Changed-pixel counts between frames[i-1] and frames[i] for i in [start, stop).
+
+    Frames are Gaussian-blurred with a blur_ksize x blur_ksize kernel first and a
+    pixel counts as changed when the absolute difference exceeds threshold.
+    """
+    ksize = (blur_ksize, blur_ksize)
+    prev = cv2.GaussianBlur(frames[start - 1], ksize, 0)
+    counts = []
+    for i in range(start, stop):
+        cur = cv2.GaussianBlur(frames[i], ksize, 0)
+        frame_delta = cv2.absdiff(prev, cur)
+        thresh = cv2.threshold(frame_delta, threshold, 255, cv2.THRESH_BINARY)[1]
+        counts.append(cv2.countNonZero(thresh))
+        prev = cur
+    return counts
+
+
+def _count_in_shared_memory(shm_name, shape, start, stop, blur_ksize, threshold):
+    """Pool task: count_changed_pixels over a window held in shared memory."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        return count_changed_pixels(frames, start, stop, blur_ksize, threshold)
+    finally:
+        del frames
+        shm.close()
+
+
+class _Window:
+    def __init__(self, shape, shared):
+        self.shm = None
+        if shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+            self.frames = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+        else:
+            self.frames = np.empty(shape, dtype=np.uint8)
+
+    def release(self):
+        if self.shm is not None:
+            self.frames = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class FrameDiffer:
+    """Accumulate grayscale frames and return the changed-pixel count of every consecutive pair.
+
+    push() frames in order, then call finish() once to get the counts
+    (len(frames) - 1 values) and release the buffers. With `sink`, counts are
+    instead handed to sink(counts_list) in order, one window at a time, as
+    they become available, so nothing accumulates (finish() then returns []).
+    """
+
+    def __init__(self, frame_shape, blur_ksize, threshold, processes=None, sink=None):
+        self.frame_shape = tuple(frame_shape)
+        self.blur_ksize = blur_ksize
+        self.threshold = threshold
+        self.processes = MOTION_PROCESSES if processes is None else processes
+        frame_bytes = int(np.prod(self.frame_shape))
+        self.window = int(max(2, min(MOTION_WINDOW_BYTES // max(frame_bytes, 1), MOTION_WINDOW_MAX_FRAMES)))
+        shape = (self.window,) + self.frame_shape
+        shared = self.processes > 0
+        self._windows = [_Window(shape, shared), _Window(shape, shared)]
+        self._current = 0
+        self._filled = 0
+        self._pending = None
+        self._sink = sink
+        self.counts = []
+
+    def push(self, gray):
+        self._windows[self._current].frames[self._filled] = gray
+        self._filled += 1
+        if self._filled == self.window:
+            self._dispatch()
+
+    def finish(self):
+        try:
+            self._dispatch()
+            self._collect()
+        finally:
+            for window in self._windows:
+                window.release()
+        return self.counts
+
+    def _dispatch(self):
+        n = self._filled
+        if n < 2:
+            return
+        window = self._windows[self._current]
+        # The other window's results must be in before we start overwriting it.
+        self._collect()
+        if self.processes > 0:
+            self._pending = self._submit(window, n)
+        else:
+            self._emit(count_changed_pixels(
+                window.frames, 1, n, self.blur_ksize, self.threshold))
+        # Carry the last frame over so the pair spanning the two windows is counted.
+        self._current = 1 - self._current
+        self._windows[self._current].frames[0] = window.frames[n - 1]
+        self._filled = 1
+
+    def _submit(self, window, n):
+        pool = get_pool(self.processes)
+        pairs = n - 1
+        chunks = min(self.processes, pairs)
+        bounds = [1 + pairs * i // chunks for i in range(chunks + 1)]
+        shape = window.frames.shape
+        return [
+            pool.submit(_count_in_shared_memory, window.shm.name, shape,
+                        bounds[i], bounds[i + 1], self.blur_ksize, self.threshold)
+            for i in range(chunks)
+        ]
+
+    def _collect(self):
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        for future in pending:
+            self._emit(future.result())
+
+    def _emit(self, counts):
+        if self._sink is not None:
+            self._sink(counts)
+        else:
+            self.counts.extend(counts)
+
+
+class MotionGate:
+    """Skip model calls for frames that look like the last one the model saw.
+
+    Frames are compared like in the motion analyzers (grayscale, resized,
+    blurred, absdiff, threshold) against the last frame that was sent to the
+    model, not the previous one, so slow drift still adds up to a change.
+    needs_inference() is True when the changed-pixel ratio exceeds
+    min_changed_ratio, for the first frame, and after max_reuse consecutive
+    skipped frames (0 = no limit).
+    """
+
+    def __init__(self, min_changed_ratio, max_reuse=0, frame_size=(320, 240), blur_ksize=15, threshold=20):
+        self.min_changed_ratio = min_changed_ratio
+        self.max_reuse = max_reuse
+        self.frame_size = tuple(frame_size)
+        self.blur_ksize = blur_ksize
+        self.threshold = threshold
+        self.frames = 0
+        self.skipped = 0
+        self._reference = None
+        self._reused = 0
+        self._pixels = self.frame_size[0] * self.frame_size[1]
+
+    def needs_inference(self, frame_bgr):
+        self.frames += 1
+        # Shrink before converting so the color conversion only sees the small frame.
+        small = cv2.resize(frame_bgr, self.frame_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (self.blur_ksize, self.blur_ksize), 0)
+        if self._reference is not None and not (self.max_reuse and self._reused >= self.max_reuse):
+            frame_delta = cv2.absdiff(self._reference, blurred)
+            thresh = cv2.threshold(frame_delta, self.threshold, 255, cv2.THRESH_BINARY)[1]
+            if cv2.countNonZero(thresh) / self._pixels <= self.min_changed_ratio:
+                self.skipped += 1
+                self._reused += 1
+                return False
+        self._reference = blurred
+        self._reused = 0
+        return True
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "inferences_run": self.frames - self.skipped,
+            "inferences_skipped": self.skipped,
+        }
@@ -0,0 +1,122 @@
+"""
+Constant-memory statistics over a stream of per-frame motion ratios.
+
+RunningStats keeps count, mean and variance with Welford's online algorithm
+plus a running min/max, so a summary of any number of frames costs the same
+few floats as a summary of ten. MotionSummary adds two optional fixed-size
+summaries of the distribution: a reservoir sample (for percentiles) and a
+histogram.
+"""
+import math
+import random
+
+import numpy as np
+
+
+class RunningStats:
+    """Welford mean/variance (population, like np.var) and min/max of pushed values.
+
+    push() takes an optional weight (West's weighted variant), e.g. the number
+    of frames an unevenly spaced sample stands for.
+    """
+
+    __slots__ = ("count", "weight", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.weight = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def push(self, x, w=1.0):
+        self.count += 1
+        self.weight += w
+        delta = x - self.mean
+        self.mean += delta * w / self.weight
+        self._m2 += w * delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def variance(self):
+        return self._m2 / self.weight if self.weight else 0.0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "variance": self.variance,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+        }
+
+
+class Reservoir:
+    """Uniform random sample of at most `size` pushed values (Algorithm R), for percentiles."""
+
+    def __init__(self, size, seed=0):
+        self.size = int(size)
+        self.seen = 0
+        self.sample = []
+        self._rng = random.Random(seed)
+
+    def push(self, x):
+        self.seen += 1
+        if len(self.sample) < self.size:
+            self.sample.append(x)
+            return
+        j = self._rng.randrange(self.seen)
+        if j < self.size:
+            self.sample[j] = x
+
+    def percentiles(self, qs=(50, 90, 99)):
+        if not self.sample:
+            return {}
+        values = np.percentile(self.sample, qs)
+        return {f"p{q:g}": float(v) for q, v in zip(qs, values)}
+
+
+class Histogram:
+    """(Weighted) counts in fixed-width bins over [0, upper); values at or above upper land in the last bin."""
+
+    def __init__(self, bins, upper):
+        self.bins = int(bins)
+        self.upper = float(upper)
+        self.counts = [0] * self.bins
+        self._width = self.upper / self.bins
+
+    def push(self, x, w=1):
+        self.counts[min(max(int(x / self._width), 0), self.bins - 1)] += w
+
+    def as_dict(self):
+        return {"bin_width": self._width, "upper": self.upper, "counts": list(self.counts)}
+
+
+class MotionSummary:
+    """RunningStats plus an optional reservoir sample and histogram; memory is fixed at construction."""
+
+    def __init__(self, reservoir_size=0, histogram_bins=0, histogram_upper=0.1, seed=0):
+        self.stats = RunningStats()
+        self.reservoir = Reservoir(reservoir_size, seed) if reservoir_size > 0 else None
+        self.histogram = Histogram(histogram_bins, histogram_upper) if histogram_bins > 0 else None
+
+    def push(self, x, w=1.0):
+        """Add a value; w weights the mean/variance and histogram (the reservoir is unweighted)."""
+        self.stats.push(x, w)
+        if self.reservoir is not None:
+            self.reservoir.push(x)
+        if self.histogram is not None:
+            self.histogram.push(x, w)
+
+    def extra(self):
+        """Reservoir percentiles / histogram, for whichever are enabled."""
+        extra = {}
+        if self.reservoir is not None:
+            extra["percentiles"] = {k: round(v, 4) for k, v in self.reservoir.percentiles().items()}
+        if self.histogram is not None:
+            extra["histogram"] = self.histogram.as_dict()
+        return extra
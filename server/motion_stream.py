@@ -0,0 +1,353 @@
+"""
+Incremental motion detection over live camera streams.
+
+A camera opens a stream and then POSTs its footage as MJPEG, in as many
+(optionally chunked-transfer) requests as it likes. Each request body is a
+sequence of JPEG frames, either concatenated or wrapped in a
+multipart/x-mixed-replace body; MJPEGParser splits it on the JPEG start/end
+markers, carrying a partial frame over to the next request.
+
+MotionStream applies the same grayscale -> resize -> blur -> frame difference
+analysis as the /detect_motion fallback to every frame as it arrives, against
+the frame `frame_gap` frames earlier (the fallback's thresholds are
+calibrated for frames 3 apart), so nothing is ever re-decoded and memory
+stays constant however long the stream runs: the last frame_gap blurred
+frames, a partial JPEG, and running statistics (motion_stats.RunningStats)
+overall and for the current update window. Every `update_every` frame
+differences it emits a snapshot of the window's statistics for the caller to
+turn into an activity update.
+
+A stream may be opened with a region of interest (a camera's doorway, a
+bed); frames are cropped to it before resizing. Once the first frame shows
+the camera's resolution, later frames are decoded straight to grayscale at
+1/2, 1/4 or 1/8 scale (IMREAD_REDUCED_GRAYSCALE_*, done in the JPEG decoder's
+DCT) whenever the cropped region still covers frame_size at that scale.
+
+MotionStreamStore holds the open streams, evicting ones idle for longer than
+idle_ttl_sec and refusing new ones beyond max_streams. By default they live
+in this process's memory, so with several server processes a stream only
+exists in the one that opened it. Given a state_dir, every stream is pickled
+there instead and each request loads it under an exclusive file lock and
+writes it back, so any process on the host can serve any stream.
+"""
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-memory streams only
+    fcntl = None
+
+import cv2
+import numpy as np
+
+from frame_sampler import FrameTransform
+from motion_stats import RunningStats
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+# Decoder-side downscaling factor -> imdecode flag.
+REDUCED_GRAYSCALE = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                     (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+
+class StreamLimitReached(Exception):
+    """Too many open streams."""
+
+
+class MJPEGParser:
+    """Split concatenated / multipart MJPEG bytes into complete JPEG frames.
+
+    Frames are delimited by the SOI and EOI markers. A frame that grows past
+    max_frame_bytes without an EOI is dropped (and counted in dropped).
+    """
+
+    def __init__(self, max_frame_bytes):
+        self.max_frame_bytes = max_frame_bytes
+        self.dropped = 0
+        self._buf = bytearray()
+
+    def feed(self, data):
+        """Append bytes; return the list of JPEG frames completed by them."""
+        buf = self._buf
+        buf += data
+        frames = []
+        while True:
+            start = buf.find(JPEG_SOI)
+            if start < 0:
+                # Keep a trailing 0xFF: it may be the first half of the next SOI.
+                del buf[:max(len(buf) - 1, 0)]
+                break
+            if start:
+                del buf[:start]
+            end = buf.find(JPEG_EOI, 2)
+            if end < 0:
+                if len(buf) > self.max_frame_bytes:
+                    self.dropped += 1
+                    del buf[:]
+                break
+            frames.append(bytes(buf[:end + 2]))
+            del buf[:end + 2]
+        return frames
+
+
+class MotionStream:
+    """Running motion statistics for one camera stream."""
+
+    def __init__(self, stream_id, frame_size, blur_ksize, threshold, update_every, max_frame_bytes, roi=None,
+                 frame_gap=3):
+        self.stream_id = stream_id
+        self.frame_size = tuple(frame_size)  # (width, height)
+        self.roi = roi
+        self.transform = FrameTransform(roi, size=self.frame_size)
+        self.decode_reduction = 1
+        self._decode_flag = cv2.IMREAD_GRAYSCALE
+        self.blur_ksize = blur_ksize
+        self.threshold = threshold
+        self.update_every = max(1, int(update_every))
+        self.parser = MJPEGParser(max_frame_bytes)
+        self.stats = RunningStats()
+        self.window = RunningStats()
+        self.frames_received = 0
+        self.bad_frames = 0
+        self.created = time.time()
+        self.last_seen = self.created
+        self.lock = threading.Lock()
+        self.frame_gap = max(1, int(frame_gap))
+        self._recent = deque(maxlen=self.frame_gap)
+        self._pixels = self.frame_size[0] * self.frame_size[1]
+
+    def feed(self, data):
+        """Analyze the frames completed by `data`; returns the update snapshots they produced.
+
+        Each snapshot is {"frame": frames_received, "window": RunningStats.as_dict()}
+        for the last update_every frame differences. Callers hold the stream
+        (see MotionStreamStore.checkout).
+        """
+        self.last_seen = time.time()
+        updates = []
+        for jpeg in self.parser.feed(data):
+            gray = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), self._decode_flag)
+            if gray is None:
+                self.bad_frames += 1
+                continue
+            if self.frames_received == 0:
+                self._choose_reduction(gray.shape)
+            self.frames_received += 1
+            if self._push(gray):
+                updates.append({"frame": self.frames_received, "window": self.window.as_dict()})
+                self.window = RunningStats()
+        return updates
+
+    def _choose_reduction(self, shape):
+        """Pick the largest decoder downscale that keeps the cropped region at least frame_size."""
+        h, w = shape[:2]
+        rw, rh = (self.roi[2], self.roi[3]) if self.roi else (1.0, 1.0)
+        for factor, flag in REDUCED_GRAYSCALE:
+            if w * rw / factor >= self.frame_size[0] and h * rh / factor >= self.frame_size[1]:
+                self.decode_reduction, self._decode_flag = factor, flag
+                return
+
+    def _push(self, gray):
+        """Add one grayscale frame; True when it completes an update window."""
+        gray = self.transform.apply(gray)
+        blurred = cv2.GaussianBlur(gray, (self.blur_ksize, self.blur_ksize), 0)
+        recent = self._recent
+        prev = recent[0] if len(recent) == self.frame_gap else None
+        recent.append(blurred)
+        if prev is None:
+            return False
+        frame_delta = cv2.absdiff(prev, blurred)
+        thresh = cv2.threshold(frame_delta, self.threshold, 255, cv2.THRESH_BINARY)[1]
+        ratio = cv2.countNonZero(thresh) / self._pixels
+        self.stats.push(ratio)
+        self.window.push(ratio)
+        return self.window.count >= self.update_every
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def info(self):
+        return {
+            "stream_id": self.stream_id,
+            "frames_received": self.frames_received,
+            "bad_frames": self.bad_frames,
+            "dropped_frames": self.parser.dropped,
+            "roi": list(self.roi) if self.roi else None,
+            "decode_reduction": self.decode_reduction,
+            "age_sec": round(time.time() - self.created, 1),
+        }
+
+
+class MotionStreamStore:
+    """Open MotionStreams by ID, with idle expiry and a cap on their number.
+
+    With state_dir the streams are kept there, shared by every process that
+    uses the same directory (see the module docstring).
+    """
+
+    def __init__(self, max_streams, idle_ttl_sec, state_dir=None, **stream_kwargs):
+        if state_dir and fcntl is None:
+            raise RuntimeError("shared motion streams need fcntl file locks (POSIX)")
+        self.max_streams = max_streams
+        self.idle_ttl_sec = idle_ttl_sec
+        self.state_dir = state_dir
+        self.stream_kwargs = stream_kwargs
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._expired = 0
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    # ------------------ shared state files ------------------
+
+    def _path(self, stream_id, ext):
+        return os.path.join(self.state_dir, f"{stream_id}.{ext}")
+
+    @contextmanager
+    def _file_lock(self, path):
+        with open(path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stored_ids(self):
+        return [name[:-len(".pkl")] for name in os.listdir(self.state_dir) if name.endswith(".pkl")]
+
+    def _load(self, stream_id):
+        try:
+            with open(self._path(stream_id, "pkl"), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, stream):
+        tmp = self._path(stream.stream_id, f"{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(stream, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(stream.stream_id, "pkl"))
+
+    def _remove(self, stream_id):
+        for ext in ("pkl", "lock"):
+            try:
+                os.remove(self._path(stream_id, ext))
+            except FileNotFoundError:
+                pass
+
+    # ------------------ streams ------------------
+
+    def _evict_idle(self):
+        cutoff = time.time() - self.idle_ttl_sec
+        if self.state_dir:
+            stored = set(self._stored_ids())
+            for stream_id in stored:
+                try:
+                    idle = os.path.getmtime(self._path(stream_id, "pkl")) < cutoff
+                except FileNotFoundError:
+                    continue
+                if idle:
+                    self._remove(stream_id)
+                    self._expired += 1
+            # Lock files left behind by requests for streams that were already gone
+            for name in os.listdir(self.state_dir):
+                stream_id, _, ext = name.partition(".")
+                path = os.path.join(self.state_dir, name)
+                if ext == "lock" and stream_id not in stored and stream_id != "store":
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            return
+        for stream_id in [sid for sid, s in self._streams.items() if s.last_seen < cutoff]:
+            del self._streams[stream_id]
+            self._expired += 1
+
+    def _count(self):
+        return len(self._stored_ids()) if self.state_dir else len(self._streams)
+
+    @contextmanager
+    def _store_lock(self):
+        with self._lock:
+            if not self.state_dir:
+                yield
+                return
+            with self._file_lock(os.path.join(self.state_dir, "store.lock")):
+                yield
+
+    def create(self, roi=None):
+        with self._store_lock():
+            self._evict_idle()
+            if self._count() >= self.max_streams:
+                raise StreamLimitReached(f"{self.max_streams} streams already open")
+            stream = MotionStream(uuid.uuid4().hex, roi=roi, **self.stream_kwargs)
+            if self.state_dir:
+                self._save(stream)
+            else:
+                self._streams[stream.stream_id] = stream
+            return stream
+
+    @contextmanager
+    def checkout(self, stream_id, save=True):
+        """Hold a stream exclusively for the block; yields None if it is unknown or expired.
+
+        With state_dir the stream is loaded for the block and, if `save`,
+        written back after it.
+        """
+        if not self.state_dir:
+            with self._lock:
+                self._evict_idle()
+                stream = self._streams.get(stream_id)
+            if stream is None:
+                yield None
+                return
+            with stream.lock:
+                yield stream
+            return
+        if not os.path.exists(self._path(stream_id, "pkl")):
+            yield None
+            return
+        with self._file_lock(self._path(stream_id, "lock")):
+            stream = self._load(stream_id)
+            if stream is not None and stream.last_seen < time.time() - self.idle_ttl_sec:
+                self._remove(stream_id)
+                stream = None
+            yield stream
+            if stream is not None and save:
+                self._save(stream)
+
+    def close(self, stream_id):
+        """Remove a stream and return it (None if unknown)."""
+        if not self.state_dir:
+            with self._lock:
+                return self._streams.pop(stream_id, None)
+        if not os.path.exists(self._path(stream_id, "pkl")):
+            return None
+        with self._file_lock(self._path(stream_id, "lock")):
+            stream = self._load(stream_id)
+            self._remove(stream_id)
+            return stream
+
+    def stats(self):
+        with self._store_lock():
+            self._evict_idle()
+            return {
+                "open_streams": self._count(),
+                "max_streams": self.max_streams,
+                "idle_ttl_sec": self.idle_ttl_sec,
+                "shared": bool(self.state_dir),
+                "expired": self._expired,
+            }
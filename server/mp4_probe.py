@@ -0,0 +1,141 @@
+"""
+Minimal ISO BMFF (MP4 / MOV) header reader.
+
+Only box headers (and the few small boxes asked for) are read and everything
+else is seeked over, so probing an upload costs a handful of small reads even
+when the moov box sits at the end of a large file. Anything that is not a
+well-formed MP4 yields None, and the caller falls back to cruder estimates.
+"""
+import os
+import struct
+
+
+def iter_boxes(f, start, end):
+    """Yield (type, payload_start, box_end) for the boxes in [start, end) of a seekable file."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        payload = pos + 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            size = struct.unpack(">Q", large)[0]
+            payload += 8
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos or pos + size > end:
+            return
+        yield box_type.decode("latin-1"), payload, pos + size
+        pos += size
+
+
+def find_box(f, path, start=0, end=None):
+    """(payload_start, box_end) of the first box at `path` (e.g. ("moov", "mvhd")), or None."""
+    if end is None:
+        end = f.seek(0, os.SEEK_END)
+    for box_type, payload, box_end in iter_boxes(f, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            found = find_box(f, path[1:], payload, box_end)
+            if found is not None:
+                return found
+    return None
+
+
+def duration_sec(stream):
+    """Movie duration from the mvhd box of a seekable MP4/MOV stream, or None.
+
+    The stream position is restored afterwards.
+    """
+    try:
+        pos = stream.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    try:
+        found = find_box(stream, ("moov", "mvhd"))
+        if found is None:
+            return None
+        stream.seek(found[0])
+        version = stream.read(4)[:1]
+        if version == b"\x01":
+            data = stream.read(28)
+            if len(data) < 28:
+                return None
+            timescale, duration = struct.unpack(">16xIQ", data)
+        else:
+            data = stream.read(16)
+            if len(data) < 16:
+                return None
+            timescale, duration = struct.unpack(">8xII", data)
+        if not timescale or duration in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+            return None
+        return duration / timescale
+    except (OSError, ValueError, struct.error):
+        return None
+    finally:
+        stream.seek(pos)
+
+
+def _read_full_box(stream, payload, box_end, size):
+    """`size` bytes of a full box's payload after its version/flags, or None if the box is shorter."""
+    if payload + 4 + size > box_end:
+        return None
+    stream.seek(payload + 4)
+    data = stream.read(size)
+    return data if len(data) == size else None
+
+
+def _video_sample_table(stream):
+    """(payload_start, box_end) of the stbl box of the first video track, or None."""
+    moov = find_box(stream, ("moov",))
+    if moov is None:
+        return None
+    for box_type, payload, box_end in iter_boxes(stream, *moov):
+        if box_type != "trak":
+            continue
+        hdlr = find_box(stream, ("mdia", "hdlr"), payload, box_end)
+        handler = hdlr and _read_full_box(stream, hdlr[0], hdlr[1], 8)
+        if not handler or handler[4:] != b"vide":
+            continue
+        return find_box(stream, ("mdia", "minf", "stbl"), payload, box_end)
+    return None
+
+
+def keyframe_indices(stream):
+    """Sorted 0-based sample numbers of the keyframes (sync samples) of the first video track, or None.
+
+    Read from the track's stss box; a track without one consists of keyframes
+    only. Sample numbers are in decode order, which matches display order at
+    keyframes in the usual closed-GOP encodings. The stream position is
+    restored afterwards.
+    """
+    try:
+        pos = stream.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    try:
+        stbl = _video_sample_table(stream)
+        if stbl is None:
+            return None
+        stss = find_box(stream, ("stss",), *stbl)
+        if stss is None:
+            stsz = find_box(stream, ("stsz",), *stbl)
+            data = stsz and _read_full_box(stream, stsz[0], stsz[1], 8)
+            return list(range(struct.unpack(">4xI", data)[0])) if data else None
+        header = _read_full_box(stream, stss[0], stss[1], 4)
+        if header is None:
+            return None
+        count = min(struct.unpack(">I", header)[0], (stss[1] - stss[0] - 8) // 4)
+        data = stream.read(4 * count)
+        count = len(data) // 4
+        return sorted(n - 1 for n in struct.unpack(f">{count}I", data[:4 * count]) if n > 0)
+    except (OSError, ValueError, struct.error):
+        return None
+    finally:
+        stream.seek(pos)
@@ -0,0 +1,142 @@
+"""
+Threaded stage pipeline with bounded queues.
+
+Pipeline runs a source iterable and a chain of stages on their own threads,
+connected by bounded queues, so e.g. decoding, preprocessing and inference
+overlap instead of taking turns. A full queue blocks the stage feeding it,
+which keeps memory bounded when a downstream stage is the bottleneck.
+
+Each stage is a function taking an iterator of inputs and returning an
+iterator of outputs, so a stage may drop, split or group items (e.g. frames
+into batches). Items keep their order. An exception in any stage is re-raised
+in the thread iterating over the pipeline.
+
+timings() reports per stage: items produced, busy time (time spent in the
+stage itself), and time spent waiting on the input and output queues.
+"""
+import queue
+import threading
+import time
+
+_DONE = object()
+_POLL_SEC = 0.1
+
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class _StageTiming:
+    __slots__ = ("items", "total", "wait_in", "wait_out")
+
+    def __init__(self):
+        self.items = 0
+        self.total = 0.0
+        self.wait_in = 0.0
+        self.wait_out = 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "busy_sec": round(max(self.total - self.wait_in - self.wait_out, 0.0), 4),
+            "wait_input_sec": round(self.wait_in, 4),
+            "wait_output_sec": round(self.wait_out, 4),
+        }
+
+
+class Pipeline:
+    """Iterate over `source` through `stages`, one thread per stage.
+
+    stages is a list of (name, fn) where fn(iterator) -> iterator. The source
+    is iterated on its own thread, reported as `source_name`.
+    """
+
+    def __init__(self, source, stages, queue_size=4, source_name="decode"):
+        self.source = source
+        self.source_name = source_name
+        self.stages = list(stages)
+        self.queue_size = max(1, int(queue_size))
+        names = [source_name] + [name for name, _ in self.stages]
+        self._timings = {name: _StageTiming() for name in names}
+        self._stop = threading.Event()
+        self._wall = 0.0
+
+    def __iter__(self):
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(
+            target=self._run_stage, args=(self.source_name, None, None, queues[0]),
+            name=f"pipeline-{self.source_name}", daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(name, fn, queues[i], queues[i + 1]),
+                name=f"pipeline-{name}", daemon=True))
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+            self._wall = time.perf_counter() - start
+
+    def timings(self):
+        """Per-stage timing plus the pipeline's wall-clock time."""
+        report = {name: timing.as_dict() for name, timing in self._timings.items()}
+        report["wall_sec"] = round(self._wall, 4)
+        return report
+
+    # ------------------ internals ------------------
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SEC)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _inputs(self, q, timing):
+        while True:
+            t = time.perf_counter()
+            while True:
+                try:
+                    item = q.get(timeout=_POLL_SEC)
+                    break
+                except queue.Empty:
+                    if self._stop.is_set():
+                        timing.wait_in += time.perf_counter() - t
+                        return
+            timing.wait_in += time.perf_counter() - t
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+
+    def _run_stage(self, name, fn, q_in, q_out):
+        timing = self._timings[name]
+        start = time.perf_counter()
+        try:
+            outputs = self.source if fn is None else fn(self._inputs(q_in, timing))
+            for item in outputs:
+                t = time.perf_counter()
+                delivered = self._put(q_out, item)
+                timing.wait_out += time.perf_counter() - t
+                if not delivered:
+                    break
+                timing.items += 1
+        except BaseException as e:
+            self._put(q_out, _Failure(e))
+        finally:
+            timing.total = time.perf_counter() - start
+            self._put(q_out, _DONE)
@@ -0,0 +1,126 @@
+"""
+Frame preprocessing for the position classifier.
+
+Preprocessor is built once from models/preprocess_config.json. Resize and
+center crop are done in OpenCV, and the BGR->RGB swap, 1/255 scaling and
+mean/std normalization are folded into a single float32 multiply-add per
+channel:
+
+    (x * scale - mean) / std  ==  x * (scale / std) + (-mean / std)
+
+Output is written into per-thread buffers, or batch buffers recycled through
+a free list, so steady-state preprocessing does not allocate.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+DEFAULT_MEAN = [0.485, 0.456, 0.406]
+DEFAULT_STD = [0.229, 0.224, 0.225]
+
+# Batch buffers kept for reuse per batch size by acquire_batch()/release_batch().
+MAX_FREE_BATCHES = 4
+
+INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "area": cv2.INTER_AREA,
+}
+
+
+class Preprocessor:
+    """BGR uint8 frames -> normalized NHWC float32 RGB batches."""
+
+    def __init__(self, cfg):
+        self.resize = int(cfg.get("resize", 260))
+        self.crop = int(cfg.get("crop", 260))
+        if self.crop > self.resize:
+            raise ValueError(f"crop ({self.crop}) larger than resize ({self.resize})")
+        self.offset = (self.resize - self.crop) // 2
+        # Config may pin the interpolation; otherwise use INTER_AREA for
+        # shrinking (closest to PIL's antialiased resize) and cubic for growing.
+        self.interpolation = INTERPOLATIONS.get(cfg.get("interpolation"))
+
+        scale = 1.0 / 255.0 if cfg.get("to_scale", True) else 1.0
+        mean = np.asarray(cfg.get("mean", DEFAULT_MEAN), dtype=np.float64)
+        std = np.asarray(cfg.get("std", DEFAULT_STD), dtype=np.float64)
+        # Coefficients are in RGB order; frames arrive as BGR and are read
+        # through a reversed channel view, so no cvtColor is needed.
+        self.alpha = (scale / std).astype(np.float32)
+        self.beta = (-mean / std).astype(np.float32)
+
+        self._local = threading.local()
+        self._free_batches = {}
+        self._free_lock = threading.Lock()
+
+    @property
+    def output_shape(self):
+        return (self.crop, self.crop, 3)
+
+    def batch_buffer(self, n):
+        """This thread's reusable [n, H, W, 3] float32 output buffer.
+
+        The buffer grows as needed and is shared by every call made on the
+        current thread, so its contents are only valid until the next call.
+        """
+        buf = getattr(self._local, "out", None)
+        if buf is None or buf.shape[0] < n:
+            buf = np.empty((max(n, 1),) + self.output_shape, dtype=np.float32)
+            self._local.out = buf
+        return buf[:n]
+
+    def acquire_batch(self, n):
+        """A [n, H, W, 3] float32 buffer from the shared free list (or a new one).
+
+        Unlike batch_buffer(), the buffer belongs to the caller until it is
+        handed back with release_batch(), so it can cross threads (e.g.
+        between pipeline stages).
+        """
+        with self._free_lock:
+            free = self._free_batches.get(n)
+            if free:
+                return free.pop()
+        return np.empty((n,) + self.output_shape, dtype=np.float32)
+
+    def release_batch(self, buf):
+        """Return a buffer obtained from acquire_batch() to the free list."""
+        with self._free_lock:
+            free = self._free_batches.setdefault(len(buf), [])
+            if len(free) < MAX_FREE_BATCHES:
+                free.append(buf)
+
+    def _resize_buffer(self):
+        buf = getattr(self._local, "resized", None)
+        if buf is None:
+            buf = np.empty((self.resize, self.resize, 3), dtype=np.uint8)
+            self._local.resized = buf
+        return buf
+
+    def preprocess_into(self, frame_bgr, out):
+        """Preprocess one BGR frame into `out`, a [H, W, 3] float32 array."""
+        h, w = frame_bgr.shape[:2]
+        interpolation = self.interpolation
+        if interpolation is None:
+            interpolation = cv2.INTER_AREA if min(h, w) >= self.resize else cv2.INTER_CUBIC
+        resized = cv2.resize(frame_bgr, (self.resize, self.resize),
+                             dst=self._resize_buffer(), interpolation=interpolation)
+        o, c = self.offset, self.crop
+        rgb = resized[o:o + c, o:o + c, ::-1]
+        np.multiply(rgb, self.alpha, out=out)
+        out += self.beta
+        return out
+
+    def preprocess_batch(self, frames, out=None):
+        """Preprocess a sequence (or [N, h, w, 3] stack) of BGR frames.
+
+        Writes into `out` when given, otherwise into this thread's reusable
+        buffer (see batch_buffer), and returns the filled [N, H, W, 3] view.
+        """
+        n = len(frames)
+        if out is None:
+            out = self.batch_buffer(n)
+        for i in range(n):
+            self.preprocess_into(frames[i], out[i])
+        return out[:n]
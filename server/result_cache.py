@@ -0,0 +1,172 @@
+"""
+Content-addressed cache for video analysis results.
+
+Uploads are identified by a streaming SHA-256 of their bytes, combined with the
+endpoint, the analysis method and the model/config version, so re-uploads of
+the same clip are answered without decoding it again.
+
+Two tiers:
+- memory: LRU bounded by the size of the serialized results (max_bytes)
+- disk (optional): one JSON file per key under disk_dir, expired after ttl_sec
+
+Only JSON-serializable results are cached; entries are stored serialized so a
+caller can never mutate a cached value.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_stream(stream, chunk_size=HASH_CHUNK_SIZE):
+    """SHA-256 hex digest of a seekable binary stream, rewound afterwards."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def make_key(content_digest, endpoint, method, version):
+    """Cache key for one (upload, endpoint, analysis method, model version) combination."""
+    raw = "\0".join([content_digest, endpoint, method, version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """In-memory LRU with a byte budget, backed by an optional on-disk TTL tier."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, disk_dir=None, ttl_sec=24 * 3600):
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = disk_dir
+        self.ttl_sec = float(ttl_sec)
+        self._entries = OrderedDict()  # key -> serialized JSON bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._last_sweep = 0.0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ------------------ public API ------------------
+
+    def get(self, key):
+        """Return the cached result for key, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+        if data is None and self.disk_dir:
+            data = self._disk_get(key)
+            if data is not None:
+                self._count("disk_hits")
+                self._memory_put(key, data)
+        if data is None:
+            self._count("misses")
+            return None
+        return json.loads(data)
+
+    def put(self, key, value):
+        """Cache a JSON-serializable result."""
+        try:
+            data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError):
+            self._count("unserializable")
+            return
+        self._memory_put(key, data)
+        if self.disk_dir:
+            self._disk_put(key, data)
+            self._maybe_sweep()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            entries, used = len(self._entries), self._bytes
+        lookups = counters.get("memory_hits", 0) + counters.get("disk_hits", 0) + counters.get("misses", 0)
+        hits = lookups - counters.get("misses", 0)
+        return {
+            "memory_entries": entries,
+            "memory_bytes": used,
+            "memory_max_bytes": self.max_bytes,
+            "disk_dir": self.disk_dir,
+            "ttl_sec": self.ttl_sec,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            **{name: counters.get(name, 0) for name in (
+                "memory_hits", "disk_hits", "misses", "memory_evictions",
+                "disk_evictions", "disk_expired", "unserializable")},
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # ------------------ memory tier ------------------
+
+    def _memory_put(self, key, data):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters["memory_evictions"] += 1
+
+    # ------------------ disk tier ------------------
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_sec:
+                os.remove(path)
+                self._count("disk_expired")
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_put(self, key, data):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("result cache disk write failed:", e)
+
+    def _maybe_sweep(self):
+        """Remove expired disk entries, at most once per ttl/10."""
+        now = time.time()
+        if now - self._last_sweep < max(self.ttl_sec / 10.0, 1.0):
+            return
+        self._last_sweep = now
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl_sec:
+                        os.remove(path)
+                        self._count("disk_evictions")
+                except OSError:
+                    pass
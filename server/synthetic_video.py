@@ -0,0 +1,42 @@
+"""
+Deterministic synthetic clips for benchmarks and load tests.
+
+make_video() writes a textured background with a moving blob through
+cv2.VideoWriter; the same arguments always produce the same frames.
+"""
+import os
+
+import cv2
+import numpy as np
+
+FPS = 30
+# Blob speed in pixels per frame, as a fraction of the frame width.
+MOTION_PROFILES = {"static": 0.0, "slow": 0.002, "fast": 0.02}
+
+
+def make_video(path, width, height, seconds, profile, seed=0):
+    """Write a deterministic synthetic clip: a textured background and a moving blob."""
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    speed = MOTION_PROFILES[profile] * width
+    radius = max(4, min(width, height) // 8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, (width, height))
+    try:
+        for i in range(int(seconds * FPS)):
+            frame = background.copy()
+            span = max(width - 2 * radius, 1)
+            x = radius + int(i * speed) % span
+            y = height // 2 + int(radius * np.sin(i * speed / max(radius, 1)))
+            cv2.circle(frame, (x, y), radius, (40, 180, 220), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+def clip_path(video_dir, width, height, seconds, profile):
+    """Path of a generated clip in video_dir, creating it on first use."""
+    path = os.path.join(video_dir, f"{width}x{height}_{seconds:g}s_{profile}.mp4")
+    if not os.path.exists(path):
+        os.makedirs(video_dir, exist_ok=True)
+        make_video(path, width, height, seconds, profile)
+    return path
@@ -0,0 +1,35 @@
+"""Motion estimates under adaptive sampling (run with pytest)."""
+import pytest
+
+import app
+import frame_sampler
+from synthetic_video import make_video
+
+
+@pytest.fixture(scope="module")
+def constant_motion_clip(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("clips") / "constant_motion.mp4")
+    make_video(path, 320, 240, 10, "fast")
+    return path
+
+
+def run(monkeypatch, analyze, path, adaptive):
+    monkeypatch.setattr(frame_sampler, "SAMPLER_ADAPTIVE", adaptive)
+    # Nothing counts as a change, so the adaptive sampler goes as sparse as it can
+    monkeypatch.setattr(frame_sampler, "ADAPTIVE_CHANGE_THRESHOLD", 1.0)
+    return analyze(path)
+
+
+def test_detect_motion_adaptive_agrees_with_uniform(monkeypatch, constant_motion_clip):
+    uniform = run(monkeypatch, app.analyze_motion_simple, constant_motion_clip, False)
+    adaptive = run(monkeypatch, app.analyze_motion_simple, constant_motion_clip, True)
+    assert adaptive["decode_stats"]["frames_retrieved"] < uniform["decode_stats"]["frames_retrieved"] / 2
+    assert adaptive["movement_stats"]["average"] == pytest.approx(uniform["movement_stats"]["average"], rel=0.1)
+    assert adaptive["detected_activity"] == uniform["detected_activity"]
+
+
+def test_analyze_adaptive_agrees_with_uniform(monkeypatch, constant_motion_clip):
+    uniform = run(monkeypatch, app.analyze_video_simple, constant_motion_clip, False)
+    adaptive = run(monkeypatch, app.analyze_video_simple, constant_motion_clip, True)
+    assert adaptive["movement_score"] == pytest.approx(uniform["movement_score"], abs=5)
+    assert adaptive["workout_type"] == uniform["workout_type"]
@@ -0,0 +1,94 @@
+"""Batch endpoints: releasing detached uploads and admission (run with pytest)."""
+import io
+import json
+import threading
+import time
+
+import pytest
+
+import app
+from admission import AdmissionController
+
+
+@pytest.fixture
+def detached(monkeypatch):
+    uploads = []
+
+    def detach(upload):
+        detached_upload = real_detach(upload)
+        uploads.append(detached_upload)
+        return detached_upload
+
+    real_detach = app.detach_upload
+    monkeypatch.setattr(app, "detach_upload", detach)
+    return uploads
+
+
+@pytest.mark.parametrize("route,field", [("/detect_motion_batch", "videos"), ("/predict_video_batch", "files")])
+def test_rejected_batch_closes_its_uploads(monkeypatch, detached, route, field):
+    monkeypatch.setattr(app, "BATCH_MAX_FILES", 1)
+    data = {field: [(io.BytesIO(b"x" * 1024), "a.mp4"), (io.BytesIO(b"y" * 1024), "b.mp4")]}
+    response = app.app.test_client().post(route, data=data, content_type="multipart/form-data")
+    assert response.status_code == 400
+    assert len(detached) == 2
+    assert all(upload.stream.closed for upload in detached)
+
+
+@pytest.mark.parametrize("route,field", [("/detect_motion_batch", "videos"), ("/predict_video_batch", "files")])
+def test_bad_roi_is_rejected_before_detaching(detached, route, field):
+    data = {field: (io.BytesIO(b"x" * 1024), "a.mp4"), "roi": "2,2,2,2"}
+    response = app.app.test_client().post(route, data=data, content_type="multipart/form-data")
+    assert response.status_code == 400
+    assert detached == []
+
+
+class ConcurrencyProbe:
+    """Stand-in analyzer recording how many analyses run at once."""
+
+    def __init__(self, seconds=0.2):
+        self.seconds = seconds
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, video_path, **kwargs):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return {"detected_activity": "idle"}
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    probe = ConcurrencyProbe()
+    monkeypatch.setattr(app.MODEL, "state", "unavailable")
+    monkeypatch.setattr(app, "RESULT_CACHE", None)
+    monkeypatch.setattr(app, "BATCH_WORKERS", 4)
+    monkeypatch.setattr(app, "ADMISSION", AdmissionController({"detect_motion": 2}, max_active=2, max_queue=1))
+    monkeypatch.setattr(app, "analyze_motion_simple", probe)
+    return probe
+
+
+def post_batch(files):
+    data = {"videos": [(io.BytesIO(b"x" * 1024), f"{i}.mp4") for i in range(files)]}
+    response = app.app.test_client().post("/detect_motion_batch", data=data, content_type="multipart/form-data")
+    return response.status_code, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_runs_no_more_clips_at_once_than_admission_allows(probe):
+    status, lines = post_batch(6)
+    assert status == 200
+    assert lines[-1] == {"done": True, "files": 6, "errors": 0}
+    assert probe.peak == 2
+
+
+def test_batch_runs_in_its_own_slot_when_the_others_are_taken(probe):
+    with app.ADMISSION.admit("detect_motion"):
+        status, lines = post_batch(4)
+    assert status == 200
+    assert lines[-1]["errors"] == 0
+    assert probe.peak == 1
+    assert app.ADMISSION.stats()["rejected"] == {}
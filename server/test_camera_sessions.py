@@ -0,0 +1,91 @@
+"""Camera sessions: one segment per camera at a time, in upload order (run with pytest)."""
+import io
+import threading
+import time
+
+import pytest
+
+import app
+from camera_sessions import CameraSessionStore
+from job_queue import JobQueue
+
+
+class SegmentRecorder:
+    """Stand-in analyze_motion_simple recording when each camera segment runs."""
+
+    def __init__(self, seconds=0.3):
+        self.seconds = seconds
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def __call__(self, video_path, session=None, **kwargs):
+        start = time.monotonic()
+        session.segments += 1
+        segment = session.segments
+        time.sleep(self.seconds)
+        with self._lock:
+            self.runs.append((session.camera_id, segment, start, time.monotonic()))
+        return {"detected_activity": "idle", "segment": segment}
+
+
+def wait_for(job_ids, timeout=10):
+    deadline = time.time() + timeout
+    jobs = []
+    while time.time() < deadline:
+        jobs = [app.JOB_QUEUE.get(job_id) for job_id in job_ids]
+        if all(job["status"] in ("done", "failed") for job in jobs):
+            return jobs
+        time.sleep(0.05)
+    raise AssertionError(f"jobs still running: {jobs}")
+
+
+def test_two_queued_jobs_for_one_camera_run_one_after_another(monkeypatch):
+    recorder = SegmentRecorder()
+    monkeypatch.setattr(app.MODEL, "state", "unavailable")
+    monkeypatch.setattr(app, "analyze_motion_simple", recorder)
+    client = app.app.test_client()
+    job_ids = []
+    for camera_id in ("cam-1", "cam-1", "cam-2"):
+        response = client.post("/detect_motion?async=1",
+                               data={"video": (io.BytesIO(b"x" * 1024), "segment.mp4"), "camera_id": camera_id},
+                               content_type="multipart/form-data")
+        assert response.status_code == 202
+        job_ids.append(response.get_json()["job_id"])
+
+    jobs = wait_for(job_ids)
+    assert [job["result"]["segment"] for job in jobs[:2]] == [1, 2]
+    (_, _, _, first_end), (_, _, second_start, _) = sorted(
+        (run for run in recorder.runs if run[0] == "cam-1"), key=lambda run: run[1])
+    assert second_start >= first_end
+    # Other cameras still run alongside
+    cam2 = next(run for run in recorder.runs if run[0] == "cam-2")
+    assert cam2[2] < first_end
+
+
+def test_serial_jobs_keep_submission_order(tmp_path):
+    order = []
+
+    def handler(video_path, params, progress):
+        order.append(params["n"])
+        time.sleep(0.05)
+        return {"n": params["n"]}
+
+    queue = JobQueue(str(tmp_path), {"detect_motion": handler}, max_workers=4,
+                     serial_key=lambda kind, params: params.get("camera_id"))
+    job_ids = [queue.submit("detect_motion", io.BytesIO(b"v"), {"camera_id": "cam", "n": n}) for n in range(5)]
+    deadline = time.time() + 10
+    while any(queue.get(job_id)["status"] != "done" for job_id in job_ids) and time.time() < deadline:
+        time.sleep(0.05)
+    assert order == [0, 1, 2, 3, 4]
+    assert queue._serial == {}
+
+
+def test_checked_out_session_is_never_evicted():
+    store = CameraSessionStore(max_sessions=1, ttl_sec=0, max_bytes=1 << 30)
+    with store.checkout("busy") as busy:
+        store.get("other")
+        store.get("third")
+        assert store.get("busy") is busy
+    # Once released it is evicted like any other
+    store.get("other")
+    assert store.get("busy") is not busy
@@ -0,0 +1,34 @@
+"""Keyframe fast scan on clips whose GOPs are longer than the interval (run with pytest)."""
+import cv2
+import pytest
+
+import frame_sampler
+from synthetic_video import make_video
+
+
+@pytest.fixture(scope="module")
+def long_gop_clip(tmp_path_factory):
+    # OpenCV's mp4v writer puts a keyframe every 12 frames
+    path = str(tmp_path_factory.mktemp("clips") / "long_gop.mp4")
+    make_video(path, 160, 120, 10, "fast")
+    return path
+
+
+def test_long_gops_sample_every_keyframe(long_gop_clip):
+    keyframes = frame_sampler.video_keyframes(long_gop_clip)
+    assert keyframes[1] - keyframes[0] > 5
+
+    cap = cv2.VideoCapture(long_gop_clip)
+    try:
+        sampler, fallback = frame_sampler.keyframe_sampler(cap, 5, keyframes)
+        assert fallback is None
+        positions = [pos for pos, _ in sampler]
+    finally:
+        cap.release()
+
+    assert positions == sorted(positions)
+    assert len(positions) >= len(keyframes) - 1
+    report = sampler.scan_report()
+    assert report["frames_decoded"] == sampler.frames_decoded
+    # Each sample decodes at most its keyframe plus the preroll, never the whole clip
+    assert len(positions) <= report["frames_decoded"] <= len(positions) * (frame_sampler.KEYFRAME_PREROLL + 1)
@@ -0,0 +1,31 @@
+"""Padding of merged scheduler batches (run with pytest)."""
+import numpy as np
+
+import app
+
+
+def _record_model_calls(monkeypatch):
+    calls = []
+
+    def fake_model(batch):
+        calls.append(len(batch))
+        return np.zeros((len(batch), 3), dtype=np.float32)
+
+    monkeypatch.setattr(app, "run_model_on_batch", fake_model)
+    return calls
+
+
+def test_small_merged_batch_is_not_padded_to_max(monkeypatch):
+    calls = _record_model_calls(monkeypatch)
+    out = app.INFER_SCHEDULER.run(np.zeros((3, 8, 8, 3), dtype=np.float32))
+    assert out.shape == (3, 3)
+    assert calls == [4]
+    assert calls[0] < app.INFER_SCHEDULER_MAX_BATCH
+
+
+def test_scheduler_buckets_pick_smallest_fit():
+    buckets = app.INFER_SCHEDULER_BUCKETS
+    assert buckets[-1] == app.INFER_SCHEDULER_MAX_BATCH
+    assert app.padded_batch_size(1, app.INFER_SCHEDULER_MAX_BATCH, buckets) == 1
+    assert app.padded_batch_size(5, app.INFER_SCHEDULER_MAX_BATCH, buckets) == 8
+    assert app.padded_batch_size(17, app.INFER_SCHEDULER_MAX_BATCH, buckets) == 32
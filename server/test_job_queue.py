@@ -0,0 +1,58 @@
+"""Orphaned-job recovery in job_queue.py (run with pytest)."""
+import io
+import os
+import time
+
+from job_queue import JobQueue, JobStore
+
+
+def _running_job(store, job_id, heartbeat_age):
+    store.create(job_id, "detect_motion", {}, video_path=None)
+    # This test's own PID stands in for a dead owner whose PID was reused.
+    assert store.claim(job_id, os.getpid(), "old-owner")
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at=? WHERE id=?", (time.time() - heartbeat_age, job_id))
+
+
+def test_stale_heartbeat_requeues_job_despite_live_pid(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    _running_job(store, "stale", heartbeat_age=120)
+    _running_job(store, "fresh", heartbeat_age=1)
+
+    queued = [row["id"] for row in store.requeue_orphans(stale_after=60)]
+
+    assert queued == ["stale"]
+    assert store.get("stale")["owner_token"] is None
+    assert store.get("fresh")["status"] == "running"
+
+
+def test_requeued_job_is_not_finished_by_its_old_owner(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    _running_job(store, "job", heartbeat_age=120)
+    store.requeue_orphans(stale_after=60)
+    assert store.claim("job", os.getpid(), "new-owner")
+
+    assert not store.finish("job", result={"late": True}, token="old-owner")
+    assert store.get("job")["status"] == "running"
+    assert store.finish("job", result={"ok": True}, token="new-owner")
+    assert store.get("job")["status"] == "done"
+
+
+def test_job_runs_and_heartbeats(tmp_path):
+    def handler(video_path, params, progress):
+        time.sleep(0.3)
+        return {"ok": True}
+
+    queue = JobQueue(str(tmp_path), {"detect_motion": handler}, heartbeat_interval=0.05)
+    job_id = queue.submit("detect_motion", io.BytesIO(b"video"))
+    time.sleep(0.15)
+    row = queue.store.get(job_id)
+    assert row["status"] == "running"
+    assert row["owner_token"].startswith(f"{os.getpid()}-")
+    assert row["heartbeat_at"] > row["updated_at"]
+
+    deadline = time.time() + 5
+    while queue.get(job_id)["status"] != "done" and time.time() < deadline:
+        time.sleep(0.05)
+    assert queue.get(job_id)["result"] == {"ok": True}
+    assert not os.path.exists(row["video_path"])
@@ -0,0 +1,52 @@
+"""Requests arriving while the classifier is still loading (run with pytest)."""
+import io
+import time
+
+import pytest
+
+import app
+from admission import AdmissionController
+from synthetic_video import make_video
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("clips") / "clip.mp4")
+    make_video(path, 160, 120, 1, "slow")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def loading_model(monkeypatch):
+    monkeypatch.setattr(app.MODEL, "state", "loading")
+    monkeypatch.setattr(app, "MODEL_WAIT_SEC", 0.1)
+    monkeypatch.setattr(app, "RESULT_CACHE", None)
+
+
+def post_video(route, field, clip):
+    client = app.app.test_client()
+    return client.post(route, data={field: (io.BytesIO(clip), "clip.mp4")},
+                       content_type="multipart/form-data")
+
+
+@pytest.mark.parametrize("route,field", [("/predict_video", "file"), ("/detect_motion", "video")])
+def test_loading_model_answers_503_with_retry_after(loading_model, clip, route, field):
+    start = time.perf_counter()
+    response = post_video(route, field, clip)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(app.MODEL_RETRY_AFTER_SEC)
+    assert time.perf_counter() - start < 5
+
+
+def test_admission_is_checked_before_waiting_for_the_model(loading_model, monkeypatch, clip):
+    admission = AdmissionController({"predict_video": 1}, max_queue=0)
+    monkeypatch.setattr(app, "ADMISSION", admission)
+
+    def no_wait(timeout=None):
+        raise AssertionError("waited for the model before admission")
+
+    monkeypatch.setattr(app, "model_ready", no_wait)
+    with admission.admit("predict_video"):
+        response = post_video("/predict_video", "file", clip)
+    assert response.status_code == 429
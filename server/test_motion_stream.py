@@ -0,0 +1,53 @@
+"""Live motion streams in motion_stream.py (run with pytest)."""
+import cv2
+import numpy as np
+
+from motion_stream import MotionStreamStore
+
+STREAM_KWARGS = dict(frame_size=(64, 48), blur_ksize=5, threshold=20, update_every=100,
+                     max_frame_bytes=1 << 20, frame_gap=3)
+
+
+def jpeg(value, blob_x=None):
+    frame = np.full((48, 64, 3), value, dtype=np.uint8)
+    if blob_x is not None:
+        cv2.circle(frame, (blob_x, 24), 8, (255, 255, 255), -1)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+def test_frames_are_diffed_three_apart():
+    store = MotionStreamStore(max_streams=4, idle_ttl_sec=60, **STREAM_KWARGS)
+    stream = store.create()
+    # A change between frames 2 and 3 shows up in the three differences 3 apart
+    # (0-3, 1-4, 2-5), where consecutive differences would only see it once.
+    with store.checkout(stream.stream_id) as s:
+        s.feed(b"".join([jpeg(0)] * 3 + [jpeg(200)] * 3))
+    assert stream.stats.count == 3
+    assert stream.stats.min > 0.5
+
+
+def test_stream_state_is_shared_between_processes_through_state_dir(tmp_path):
+    frames = [jpeg(40, blob_x=10 + 4 * i) for i in range(12)]
+    # Two stores on one directory stand in for two gunicorn workers.
+    worker_a = MotionStreamStore(max_streams=4, idle_ttl_sec=60, state_dir=str(tmp_path), **STREAM_KWARGS)
+    worker_b = MotionStreamStore(max_streams=4, idle_ttl_sec=60, state_dir=str(tmp_path), **STREAM_KWARGS)
+    local = MotionStreamStore(max_streams=4, idle_ttl_sec=60, **STREAM_KWARGS)
+
+    stream_id = worker_a.create().stream_id
+    for i, frame in enumerate(frames):
+        # Split one frame across requests too
+        for part in (frame[:100], frame[100:]):
+            with (worker_a if i % 2 else worker_b).checkout(stream_id) as stream:
+                stream.feed(part)
+    reference = local.create()
+    with local.checkout(reference.stream_id) as stream:
+        stream.feed(b"".join(frames))
+
+    with worker_b.checkout(stream_id, save=False) as shared:
+        assert shared.frames_received == len(frames)
+        assert shared.stats.count == len(frames) - 3
+        assert shared.stats.mean == reference.stats.mean
+    assert worker_a.stats()["open_streams"] == 1
+    assert worker_b.close(stream_id) is not None
+    with worker_a.checkout(stream_id) as stream:
+        assert stream is None
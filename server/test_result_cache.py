@@ -0,0 +1,68 @@
+"""Which /detect_motion results are cached (run with pytest)."""
+import io
+import itertools
+import time
+
+import pytest
+
+import app
+from result_cache import ResultCache
+from synthetic_video import make_video
+
+
+@pytest.fixture
+def motion_only(monkeypatch, tmp_path):
+    monkeypatch.setattr(app.MODEL, "state", "unavailable")
+    monkeypatch.setattr(app, "RESULT_CACHE", ResultCache(max_bytes=1 << 20))
+    path = str(tmp_path / "clip.mp4")
+    make_video(path, 160, 120, 2, "fast")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def detect_motion(clip):
+    return app.app.test_client().post("/detect_motion", data={"video": (io.BytesIO(clip), "clip.mp4")},
+                                      content_type="multipart/form-data")
+
+
+def test_complete_result_is_cached(motion_only):
+    first = detect_motion(motion_only)
+    assert first.status_code == 200 and not first.get_json()["truncated"]
+    assert detect_motion(motion_only).headers.get("X-Result-Cache") == "hit"
+
+
+class TickingClock:
+    """time module whose perf_counter advances one second per call."""
+
+    def __init__(self):
+        self._ticks = itertools.count()
+
+    def perf_counter(self):
+        return float(next(self._ticks))
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def test_truncated_result_is_not_cached(motion_only, monkeypatch):
+    # The budget runs out a few frames into the clip
+    monkeypatch.setattr(app, "time", TickingClock())
+    monkeypatch.setattr(app, "MOTION_TIME_BUDGET_SEC", 10)
+    first = detect_motion(motion_only)
+    assert first.status_code == 200 and first.get_json()["truncated"]
+    second = detect_motion(motion_only)
+    assert second.headers.get("X-Result-Cache") != "hit"
+    assert second.get_json()["truncated"]
+
+
+@pytest.mark.parametrize("module,name,value", [
+    (app.frame_sampler, "SAMPLER_ADAPTIVE", True),
+    (app.frame_sampler, "SAMPLER_FRAME_BUDGET", 50),
+    (app.frame_sampler, "KEYFRAME_PREROLL", 0),
+    (app, "ANALYZE_MAX_SIDE", 320),
+    (app, "MOTION_TIME_BUDGET_SEC", 5),
+])
+def test_analysis_settings_change_the_cache_key(monkeypatch, module, name, value):
+    before = app.model_version()
+    monkeypatch.setattr(module, name, value)
+    assert app.model_version() != before
@@ -0,0 +1,112 @@
+"""
+Upload ingest for the video endpoints.
+
+Werkzeug normally parses an upload into a temporary file (or BytesIO), and
+the endpoints then copied it again into uploads/ so cv2.VideoCapture could
+open it by path. IngestRequest instead asks the multipart parser to write
+each uploaded file straight into a file the decoder can open directly:
+
+- uploads up to INGEST_MEMORY_MAX_BYTES go into an anonymous memfd
+  (RAM-backed, never touches the disk)
+- bigger uploads, or requests without a Content-Length, are spilled to an
+  unnamed temporary file in SPILL_DIR
+
+Both are real file descriptors, so upload_path() hands the decoder
+/proc/self/fd/<n> without another copy. They have no name on disk and are
+released when Werkzeug closes the request's files, so nothing is left behind
+whichever way the request ends. Where /proc or memfd are not available
+upload_path() falls back to a named temp file that it always deletes.
+
+Streamed responses run after the request (and its files) are closed;
+detach_upload() gives them a handle of their own on the same file.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+
+INGEST_MEMORY_MAX_BYTES = int(os.environ.get("INGEST_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+# Where large uploads are spilled (relative to the working directory, like uploads/ always was).
+SPILL_DIR = os.environ.get("INGEST_SPILL_DIR", "uploads")
+
+_HAS_MEMFD = hasattr(os, "memfd_create")
+_HAS_PROC_FD = os.path.isdir("/proc/self/fd")
+
+
+def _memfd_file(name):
+    fd = os.memfd_create(name, getattr(os, "MFD_CLOEXEC", 0))
+    return open(fd, "w+b")
+
+
+def _spill_dir():
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    return SPILL_DIR
+
+
+class IngestRequest(Request):
+    """Flask request class that parses uploaded files into decoder-ready file descriptors."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        size = content_length or total_content_length
+        if _HAS_MEMFD and size is not None and size <= INGEST_MEMORY_MAX_BYTES:
+            try:
+                return _memfd_file("upload")
+            except OSError:
+                pass
+        return tempfile.TemporaryFile("w+b", dir=_spill_dir())
+
+
+def _stream_fileno(stream):
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+@contextmanager
+def upload_path(upload, suffix=".mp4"):
+    """Yield a filesystem path cv2.VideoCapture can open for a FileStorage upload.
+
+    Zero-copy when the upload already lives in a file descriptor; otherwise the
+    bytes are copied to a temp file that is removed when the block exits,
+    including when analysis raises.
+    """
+    stream = upload.stream
+    fileno = _stream_fileno(stream)
+    if fileno is not None and _HAS_PROC_FD:
+        stream.flush()
+        stream.seek(0)
+        yield f"/proc/self/fd/{fileno}"
+        return
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=_spill_dir())
+    try:
+        with tmp:
+            stream.seek(0)
+            shutil.copyfileobj(stream, tmp, 1 << 20)
+        yield tmp.name
+    finally:
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
+
+
+def detach_upload(upload):
+    """A FileStorage for the same upload that stays open after the request is closed.
+
+    Shares the file through a dup()-ed descriptor when there is one, otherwise
+    copies the bytes into an unnamed temp file. The caller closes it.
+    """
+    fileno = _stream_fileno(upload.stream)
+    if fileno is not None:
+        stream = os.fdopen(os.dup(fileno), "w+b")
+    else:
+        stream = tempfile.TemporaryFile("w+b", dir=_spill_dir())
+        upload.stream.seek(0)
+        shutil.copyfileobj(upload.stream, stream, 1 << 20)
+    stream.seek(0)
+    return FileStorage(stream, filename=upload.filename, name=upload.name, content_type=upload.content_type)
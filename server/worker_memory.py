@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Memory per gunicorn worker: RSS and PSS of the master and every worker.
+
+RSS counts every page a process maps, including pages it shares with the
+master and the other workers, so summing RSS over workers overstates the
+real footprint. PSS divides each shared page between the processes sharing
+it; the PSS total is what the server actually costs, and
+private_mb (private clean + dirty) is what one more worker would add.
+
+Either measure a running server by its master PID, or let the script start
+gunicorn with gunicorn.conf.py, load the model in each worker with a few
+/predict_video requests, and measure it:
+
+    python worker_memory.py --pid 12345
+    python worker_memory.py --workers 4
+    python worker_memory.py --workers 4 --preload both    # with and without preload_app
+
+Reads /proc/<pid>/smaps_rollup (Linux 4.14+).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import BASE_DIR, GunicornClient, child_pids
+from synthetic_video import clip_path
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def smaps_rollup(pid):
+    """{field: bytes} from /proc/<pid>/smaps_rollup, or None if the process is gone."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    values[name] = int(rest.split()[0]) * 1024
+    except OSError:
+        return None
+    return values
+
+
+def _mb(n):
+    return round(n / (1024 * 1024), 1)
+
+
+def measure(master_pid):
+    """Per-process and total memory of a gunicorn master and its workers."""
+    processes = []
+    for role, pid in [("master", master_pid)] + [("worker", p) for p in child_pids(master_pid)]:
+        values = smaps_rollup(pid)
+        if values is None:
+            continue
+        processes.append({
+            "pid": pid,
+            "role": role,
+            "rss_mb": _mb(values.get("Rss", 0)),
+            "pss_mb": _mb(values.get("Pss", 0)),
+            "shared_mb": _mb(values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0)),
+            "private_mb": _mb(values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)),
+        })
+    workers = [p for p in processes if p["role"] == "worker"]
+    return {
+        "processes": processes,
+        "workers": len(workers),
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+        "mean_worker_pss_mb": round(sum(p["pss_mb"] for p in workers) / len(workers), 1) if workers else None,
+        "mean_worker_private_mb": round(sum(p["private_mb"] for p in workers) / len(workers), 1) if workers else None,
+    }
+
+
+def warm_up(client, clip, requests_count, settle_sec):
+    """Send enough concurrent requests that every worker has loaded the model and run it."""
+    with ThreadPoolExecutor(max_workers=requests_count) as pool:
+        statuses = list(pool.map(lambda _: client.post("predict_video", "file", clip), range(requests_count)))
+    time.sleep(settle_sec)
+    return statuses
+
+
+def run_server(args, preload):
+    os.environ["GUNICORN_PRELOAD"] = "1" if preload else "0"
+    client = GunicornClient(args.workers, args.threads, args.port, args.startup_timeout)
+    try:
+        clip = clip_path(args.video_dir, 640, 480, 2, "slow")
+        statuses = warm_up(client, clip, args.requests or 2 * args.workers, args.settle)
+        report = measure(client.pid)
+        report["preload"] = preload
+        report["warmup_statuses"] = {str(s): statuses.count(s) for s in set(statuses)}
+        return report
+    finally:
+        client.close()
+
+
+def print_report(report, title):
+    print(f"\n📊 {title}")
+    print(f"   {'pid':>8s} {'role':8s} {'rss_mb':>9s} {'pss_mb':>9s} {'shared_mb':>10s} {'private_mb':>11s}")
+    for p in report["processes"]:
+        print(f"   {p['pid']:8d} {p['role']:8s} {p['rss_mb']:9.1f} {p['pss_mb']:9.1f} "
+              f"{p['shared_mb']:10.1f} {p['private_mb']:11.1f}")
+    print(f"   total RSS {report['total_rss_mb']} MB, total PSS {report['total_pss_mb']} MB, "
+          f"per worker PSS {report['mean_worker_pss_mb']} MB / private {report['mean_worker_private_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pid", type=int, help="measure the running gunicorn master with this PID")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--preload", choices=("on", "off", "both"), default="on")
+    parser.add_argument("--requests", type=int, default=0, help="warm-up requests (default 2 per worker)")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait after warm-up")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--video-dir", default=os.path.join(tempfile.gettempdir(), "symbiont-bench-videos"))
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.pid:
+        reports = {"running": measure(args.pid)}
+        print_report(reports["running"], f"gunicorn master {args.pid}")
+    else:
+        os.environ.setdefault("MODEL_LOAD", "eager")
+        os.environ.setdefault("RESULT_CACHE", "0")
+        if not os.path.exists(os.path.join(BASE_DIR, "models", "saved_model_export")):
+            os.environ.setdefault("INFER_BACKEND", "stub")
+        modes = {"on": [True], "off": [False], "both": [True, False]}[args.preload]
+        reports = {}
+        for preload in modes:
+            name = "preload" if preload else "no_preload"
+            reports[name] = run_server(args, preload)
+            print_report(reports[name], f"{args.workers} workers, preload_app {'on' if preload else 'off'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())